@@ -0,0 +1,230 @@
+import asyncio
+import socket
+import threading
+import time
+
+from retransmission import TelemetryRetransmission
+from telemetry_codec import read_first_frame
+
+
+class AsyncTelemetryRetransmission(TelemetryRetransmission):
+    """
+    Single-threaded asyncio backend for the telemetry relay.
+
+    Takes the same constructor arguments as TelemetryRetransmission and exposes
+    the same start/stop/get_link_status API, but runs reception and
+    retransmission as coroutines on one event loop instead of two threads.
+    Each readable input socket is drained up to recv_batch_size datagrams at a
+    time into the relay's preallocated buffers and decoded as one batch, like
+    the threaded receiver. Earth output uses a stream writer and waits on
+    drain() so a slow uplink applies backpressure instead of growing an
+    unbounded write buffer.
+
+    Decoding and encoding share the one thread with the event loop, so under
+    sustained unpaced load this backend keeps up less well than the threaded
+    one; compare them with relay_benchmark before choosing it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        self.loop_thread = None
+        self.data_ready = None
+        self.stopping = None
+
+    def start(self):
+        """Start the relay event loop in a background thread."""
+        print("Starting telemetry retransmission system (asyncio)...")
+        if self.telemetry_log is not None:
+            self.telemetry_log.start()
+        if self.subscriber_hub is not None:
+            self.subscriber_hub.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_until_complete, args=(self.run(),), daemon=True)
+        self.loop_thread.start()
+
+    def stop(self):
+        """Stop the relay and wait for the event loop to finish."""
+        print("Stopping telemetry retransmission system...")
+        self.stop_event.set()
+        if self.loop is not None and self.stopping is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+        if self.loop_thread is not None:
+            self.loop_thread.join(timeout=5)
+        for _, sock in self.input_sockets:
+            sock.close()
+        if self.subscriber_hub is not None:
+            self.subscriber_hub.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.unregister_metrics()
+        self.close_earth_socket()
+        if self.spill is not None:
+            self.spill.close()
+        if self.telemetry_log is not None:
+            self.telemetry_log.stop()
+
+    async def run(self):
+        """Run reception and retransmission until stop() is called."""
+        loop = asyncio.get_running_loop()
+        self.data_ready = asyncio.Event()
+        self.stopping = asyncio.Event()
+        if self.stop_event.is_set():
+            return
+
+        print("Listening for telemetry from the rover...")
+        for name, sock in self.input_sockets:
+            sock.setblocking(False)
+            loop.add_reader(sock, self.receive_ready, name, sock)
+
+        sender = asyncio.ensure_future(self.retransmit_telemetry_async())
+        stopping = asyncio.ensure_future(self.stopping.wait())
+        try:
+            await asyncio.wait((sender, stopping), return_when=asyncio.FIRST_COMPLETED)
+            if sender.done() and not sender.cancelled() and sender.exception() is not None:
+                # Nothing would reach Earth any more, so stop instead of relaying into the buffer forever
+                print(f"Retransmission to Earth failed, stopping the relay: {sender.exception()!r}")
+                self.link_status["to_earth"] = False
+                self.stop_event.set()
+        finally:
+            for task in (sender, stopping):
+                task.cancel()
+            await asyncio.gather(sender, stopping, return_exceptions=True)
+            for _, sock in self.input_sockets:
+                loop.remove_reader(sock)
+
+    def receive_ready(self, source, sock):
+        """Drain, decode and publish a batch of datagrams from a readable input socket."""
+        try:
+            self.process_batch(source, self.receive_batch(sock, block=False))
+        except (socket.error, ValueError) as e:
+            print(f"Error receiving telemetry: {e}")
+            self.link_status["to_rover"] = False
+
+    def enqueue(self, telemetry, source="rover"):
+        super().enqueue(telemetry, source)
+        self.data_ready.set()  # Wake the sender only when there is something new to send
+
+    async def retransmit_telemetry_async(self):
+        """Send queued telemetry to Earth, waiting on new data and on writer drain."""
+        print("Retransmitting telemetry to Earth...")
+        reader = writer = ack_reader = None
+        batch = []
+        try:
+            while True:
+                if writer is None:
+                    reader, writer = await self.connect_earth_async()
+                    self.link_status["to_earth"] = True
+                    self.last_earth_send = time.monotonic()
+                    if self.uplink is not None and self.uplink.acks:
+                        ack_reader = asyncio.ensure_future(self.read_acks_async(reader))
+                acking = self.uplink is not None and self.uplink.acks
+
+                if not batch:
+                    if not self.has_pending() or self.window_full():
+                        self.data_ready.clear()
+                        timeout = self.heartbeat_interval
+                        if self.buffer_backend == "priority":
+                            # Wake up when a rate-limited lane may send again
+                            ready_in = self.telemetry_buffer.ready_in()
+                            if ready_in is not None:
+                                timeout = ready_in if timeout is None else min(timeout, ready_in)
+                        try:
+                            await asyncio.wait_for(self.data_ready.wait(), timeout=timeout)
+                        except asyncio.TimeoutError:
+                            pass
+                    batch = self.next_window_batch(timeout=0) if acking else self.take_resend() or self.next_batch(timeout=0)
+                    if not batch and (not self.heartbeat_interval or
+                                      time.monotonic() - self.last_earth_send < self.heartbeat_interval):
+                        continue
+                try:
+                    if reader.at_eof():
+                        raise ConnectionResetError("closed by peer")
+                    buffers = self.encode_batch(batch) if batch else self.heartbeat_buffers()  # Idle heartbeat
+                    writer.writelines(buffers)
+                    await writer.drain()
+                    self.last_earth_send = time.monotonic()
+                    self.log_sent(batch, sum(len(buffer) for buffer in buffers))
+                    batch = []
+                except (socket.error, OSError) as e:
+                    # Keep the batch and resend it first after reconnecting
+                    print(f"Error sending telemetry to Earth: {e}")
+                    if batch:
+                        self.send_retries.inc()
+                    if acking:
+                        batch = []  # Still in the window; resent after reconnecting
+                    self.link_status["to_earth"] = False
+                    self.earth_link.mark_disconnected(e)
+                    writer.close()
+                    if ack_reader is not None:
+                        ack_reader.cancel()
+                    reader = writer = ack_reader = None
+                    self.earth_socket = None
+        finally:
+            if ack_reader is not None:
+                ack_reader.cancel()
+
+    async def read_acks_async(self, reader):
+        """Apply acknowledgements from Earth as they arrive, waking the sender when the window frees up."""
+        while True:
+            try:
+                data = await reader.read(65536)
+            except (socket.error, OSError):
+                return
+            if not data:
+                self.data_ready.set()  # Let the sender notice the closed connection
+                return
+            self.read_ack_data(data)
+            self.data_ready.set()
+
+    def read_acks(self, timeout):
+        pass  # Acknowledgements are read by read_acks_async on the event loop
+
+    async def connect_earth_async(self):
+        """Connect to Earth, retrying with jittered exponential backoff until it succeeds."""
+        loop = asyncio.get_running_loop()
+        link = self.earth_link
+        link.begin_attempt()
+        while True:
+            sock = link.create_socket()
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (self.earth_ip, self.earth_port)), link.connect_timeout)
+                reader, writer = await asyncio.open_connection(sock=sock)
+                if self.uplink is not None:
+                    await self.negotiate_uplink_async(reader, writer)
+            except (socket.error, OSError, asyncio.TimeoutError) as e:
+                sock.close()
+                link.last_error = str(e)
+                delay = link.next_delay()
+                print(f"Error connecting to Earth socket: {e} (retrying in {delay:.1f}s)")
+                await asyncio.sleep(delay)
+                continue
+            link.mark_connected()
+            self.earth_socket = sock
+            print(f"Connected to Earth at {self.earth_ip}:{self.earth_port}")
+            return reader, writer
+
+    async def negotiate_uplink_async(self, reader, writer):
+        """Offer uplink encodings to Earth, wait for the answer and confirm the choice."""
+        writer.writelines(self.uplink.hello())
+        await writer.drain()
+        answer, buffer = None, b""
+        deadline = asyncio.get_running_loop().time() + self.negotiate_timeout
+        try:
+            while answer is None:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                data = await asyncio.wait_for(reader.read(4096), remaining)
+                if not data:
+                    raise ConnectionResetError("closed by peer during negotiation")
+                answer, buffer = read_first_frame(buffer + data, self.framing)
+        except asyncio.TimeoutError:
+            pass
+        writer.writelines(self.uplink.accept(answer))
+        await writer.drain()
+        print(f"Earth uplink: encoding={self.uplink.encoding}, compression={self.uplink.compression}")
+        self.start_window(buffer)
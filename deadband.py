@@ -0,0 +1,134 @@
+import math
+import time
+
+from telemetry_log import lookup_field
+
+# Example dead-bands for the README schema: degrees, percent and metres
+DEFAULT_DEADBANDS = {"heading": 1.0, "battery_level": 0.5, "position": 0.05}
+# Fields compared on a circle of 360 degrees, so 359 -> 1 is a change of 2
+ANGULAR_FIELDS = ("heading",)
+
+
+def field_change(path, old, new):
+    """
+    Return how far a field moved between two packets.
+
+    Numbers compare by absolute difference (angular fields wrap at 360), dicts
+    of numbers such as position by Euclidean distance, and anything else is
+    either unchanged (0) or changed beyond any dead-band (inf).
+    """
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        change = abs(new - old)
+        if path in ANGULAR_FIELDS:
+            change = abs((new - old + 180) % 360 - 180)
+        return change
+    if isinstance(old, dict) and isinstance(new, dict) and old.keys() == new.keys():
+        try:
+            return math.sqrt(sum((new[key] - old[key]) ** 2 for key in new))
+        except TypeError:
+            pass
+    return 0.0 if old == new else math.inf
+
+
+class DeadbandFilter:
+    """
+    Suppresses telemetry that has not changed meaningfully since the last packet forwarded.
+
+    A packet is forwarded when any configured field has moved beyond its
+    dead-band relative to the last forwarded value of that field from the same
+    source, when it carries a configured field that has not been forwarded
+    before, or when max_interval has passed since the last forward (a
+    heartbeat, so Mission Control keeps seeing fresh timestamps). Fields
+    without a dead-band do not trigger a forward. Packets that carry none of
+    the configured fields (e.g. vision detections) are always forwarded, since
+    there is nothing to compare them by.
+
+    In adaptive mode the dead-bands widen while the uplink is backed up: below
+    low_water buffer fill they are used as configured, then they scale
+    linearly up to max_scale times at a full buffer.
+    """
+
+    def __init__(self, deadbands=DEFAULT_DEADBANDS, max_interval=1.0, adaptive=False, low_water=0.25, max_scale=8.0):
+        """
+        :param deadbands: Dict of dotted field path -> minimum change worth forwarding.
+        :param max_interval: Forward at least one packet per source this often, in seconds (None to disable).
+        :param adaptive: Widen the dead-bands as the send buffer fills.
+        :param low_water: Buffer fill fraction (0-1) above which adaptive widening starts.
+        :param max_scale: Dead-band multiplier at a full buffer.
+        """
+        self.deadbands = dict(deadbands)
+        self.max_interval = max_interval
+        self.adaptive = adaptive
+        self.low_water = low_water
+        self.max_scale = max_scale
+        self.last = {}  # source -> (time forwarded, {path: value})
+        self.scale = 1.0
+        self.stats = {"packets": 0, "forwarded": 0, "suppressed": 0, "heartbeats": 0,
+                      "bytes_in": 0, "bytes_saved": 0}
+
+    def update_pressure(self, fill):
+        """
+        Set the current send buffer fill fraction (0 = empty, 1 = full).
+
+        Only affects the dead-bands in adaptive mode.
+        """
+        if not self.adaptive or fill <= self.low_water:
+            self.scale = 1.0
+        else:
+            excess = min(1.0, (fill - self.low_water) / (1.0 - self.low_water))
+            self.scale = 1.0 + excess * (self.max_scale - 1.0)
+
+    def allow(self, telemetry, nbytes=0, source=None):
+        """
+        Decide whether a packet should go to the uplink.
+
+        :param telemetry: Telemetry item (dict or an object with .get, e.g. RawTelemetry).
+        :param nbytes: Encoded size of the packet, counted as saved if it is suppressed.
+        :param source: Input name; each source is filtered against its own last packet.
+        :return: True to forward the packet, False to drop it.
+        """
+        stats = self.stats
+        stats["packets"] += 1
+        stats["bytes_in"] += nbytes
+        if not hasattr(telemetry, "get"):
+            stats["forwarded"] += 1
+            return True  # Not a record with fields (e.g. a list of detections)
+
+        try:
+            values = {path: lookup_field(telemetry, path) for path in self.deadbands}
+        except ValueError:
+            stats["forwarded"] += 1
+            return True  # Undecodable passthrough packet; let the sender deal with it
+        values = {path: value for path, value in values.items() if value is not None}
+        if not values:
+            stats["forwarded"] += 1
+            return True  # No dead-banded fields (e.g. a list of detections), so nothing to suppress by
+
+        now = time.monotonic()
+        previous = self.last.get(source)
+        forward = previous is None
+        if not forward and self.max_interval is not None and now - previous[0] >= self.max_interval:
+            forward = True
+            stats["heartbeats"] += 1
+        if not forward:
+            last_values = previous[1]
+            for path, value in values.items():
+                # A field missing from this packet is not a change; one never forwarded before is
+                if path not in last_values or \
+                        field_change(path, last_values[path], value) > self.deadbands[path] * self.scale:
+                    forward = True
+                    break
+
+        if forward:
+            # Keep the last forwarded value of fields this packet lacks, so they still compare against it
+            self.last[source] = (now, dict(previous[1], **values) if previous is not None else values)
+            stats["forwarded"] += 1
+        else:
+            stats["suppressed"] += 1
+            stats["bytes_saved"] += nbytes
+        return forward
+
+    def get_stats(self):
+        """Return packet and byte counters, the fraction of bytes saved and the current dead-band scale."""
+        saved = self.stats["bytes_saved"] / self.stats["bytes_in"] if self.stats["bytes_in"] else 0.0
+        return dict(self.stats, saved_fraction=saved, scale=self.scale)
@@ -0,0 +1,160 @@
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # Decoding (relay, Mission Control) only needs struct
+    np = None
+
+# Binary detection datagrams start with MAGIC, which can never begin a JSON document
+MAGIC = b"CD"
+WIRE_VERSION = 1
+DEFAULT_MTU = 1400  # Fits one Ethernet frame with room for IP/UDP (and VPN) headers
+
+# Datagram: magic, version, number of frame records
+DATAGRAM_HEADER = struct.Struct("<2sBB")
+# Frame record: frame_id, capture time (Unix seconds), flags, number of detections
+FRAME_HEADER = struct.Struct("<IdBH")
+# Detection: class_id, score * 255, bbox [ymin, xmin, ymax, xmax] * 65535, then track_id if FLAG_TRACKS
+DETECTION = struct.Struct("<HB4H")
+TRACKED_DETECTION = struct.Struct("<HB4HI")
+FLAG_TRACKS = 0x01
+MAX_FRAMES = 255
+
+if np is not None:
+    WIRE_DTYPE = np.dtype([("class_id", "<u2"), ("score", "u1"), ("bbox", "<u2", (4,))])
+    TRACKED_WIRE_DTYPE = np.dtype(WIRE_DTYPE.descr + [("track_id", "<u4")])
+
+
+def is_detection_datagram(data):
+    """Return True if data starts like a binary detection datagram."""
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+class DetectionEncoder:
+    """
+    Packs per-frame detections into compact binary datagrams.
+
+    Each detection takes 11 bytes (15 with a track ID): class ID, score
+    quantized to 1/255 and the normalized bbox quantized to 1/65535. Frame
+    records are batched into one datagram until the next would exceed the
+    MTU or max_frames are pending; a frame with too many detections for one
+    datagram is split into several records with the same frame_id.
+    """
+
+    def __init__(self, mtu=DEFAULT_MTU, max_frames=1):
+        """
+        Args:
+            mtu (int): Maximum datagram size in bytes.
+            max_frames (int): Frames batched per datagram (1 sends every frame at once; more trades latency
+                for fewer packets).
+        """
+        if np is None:
+            raise ImportError("numpy is required to encode detections")
+        self.mtu = mtu
+        self.max_frames = min(max_frames, MAX_FRAMES)
+        self.pending = []  # Encoded frame records waiting for the next datagram
+        self.pending_bytes = DATAGRAM_HEADER.size
+        self.pending_frames = 0
+
+    def encode_frame(self, frame_id, timestamp, detections):
+        """
+        Add one frame's detections.
+
+        Args:
+            frame_id (int): Frame number.
+            timestamp (float): Capture time in Unix seconds.
+            detections: DETECTION_DTYPE (or TRACK_DTYPE) structured array.
+
+        Returns:
+            List of datagrams that are ready to send (possibly empty while batching).
+        """
+        tracked = "track_id" in detections.dtype.names
+        wire = np.empty(len(detections), TRACKED_WIRE_DTYPE if tracked else WIRE_DTYPE)
+        wire["class_id"] = detections["class_id"]
+        wire["score"] = np.rint(np.clip(detections["score"], 0.0, 1.0) * 255)
+        wire["bbox"] = np.rint(np.clip(detections["bbox"], 0.0, 1.0) * 65535)
+        if tracked:
+            wire["track_id"] = detections["track_id"]
+        flags = FLAG_TRACKS if tracked else 0
+
+        per_record = (self.mtu - DATAGRAM_HEADER.size - FRAME_HEADER.size) // wire.dtype.itemsize
+        if per_record < 1:
+            raise ValueError(f"MTU {self.mtu} is too small for a detection")
+        datagrams = []
+        start = 0
+        while True:
+            chunk = wire[start:start + per_record]
+            record = FRAME_HEADER.pack(frame_id & 0xFFFFFFFF, timestamp, flags, len(chunk)) + chunk.tobytes()
+            if self.pending_bytes + len(record) > self.mtu or len(self.pending) >= MAX_FRAMES:
+                datagrams.extend(self.flush())
+            self.pending.append(record)
+            self.pending_bytes += len(record)
+            self.pending_frames += 1
+            start += per_record
+            if start >= len(wire):
+                break
+        if self.pending_frames >= self.max_frames:
+            datagrams.extend(self.flush())
+        return datagrams
+
+    def flush(self):
+        """Return the pending frames as a datagram (an empty list if nothing is pending)."""
+        if not self.pending:
+            return []
+        datagram = DATAGRAM_HEADER.pack(MAGIC, WIRE_VERSION, len(self.pending)) + b"".join(self.pending)
+        self.pending = []
+        self.pending_bytes = DATAGRAM_HEADER.size
+        self.pending_frames = 0
+        return [datagram]
+
+
+def decode_datagram(data, labels=None):
+    """
+    Decode a binary detection datagram.
+
+    Args:
+        data: Datagram bytes.
+        labels (dict): Optional class ID -> label, to add a "label" to each detection.
+
+    Returns:
+        List of frames, each {"frame_id", "timestamp", "detections": [{"class_id", "score", "bbox"[, "track_id"]
+        [, "label"]}]}, in the order they were encoded.
+
+    Raises:
+        ValueError: If data is not a valid detection datagram of a supported version.
+    """
+    data = bytes(data)
+    if len(data) < DATAGRAM_HEADER.size:
+        raise ValueError("detection datagram too short")
+    magic, version, count = DATAGRAM_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a detection datagram")
+    if version != WIRE_VERSION:
+        raise ValueError(f"unsupported detection wire version {version}")
+
+    frames = []
+    offset = DATAGRAM_HEADER.size
+    for _ in range(count):
+        if offset + FRAME_HEADER.size > len(data):
+            raise ValueError("truncated detection datagram")
+        frame_id, timestamp, flags, n = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+        layout = TRACKED_DETECTION if flags & FLAG_TRACKS else DETECTION
+        end = offset + n * layout.size
+        if end > len(data):
+            raise ValueError("truncated detection datagram")
+        detections = []
+        for fields in layout.iter_unpack(data[offset:end]):
+            detection = {
+                "class_id": fields[0],
+                "score": round(fields[1] / 255, 3),
+                "bbox": [round(v / 65535, 5) for v in fields[2:6]],
+            }
+            if flags & FLAG_TRACKS:
+                detection["track_id"] = fields[6]
+            if labels is not None:
+                detection["label"] = labels.get(fields[0], "Unknown")
+            detections.append(detection)
+        offset = end
+        frames.append({"frame_id": frame_id, "timestamp": timestamp, "detections": detections})
+    return frames
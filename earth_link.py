@@ -0,0 +1,136 @@
+import random
+import socket
+import time
+
+
+class EarthConnection:
+    """
+    Manages the TCP connection to Earth (Mission Control).
+
+    Reconnects with jittered exponential backoff, enables TCP keepalive so dead
+    peers are noticed even when no telemetry is flowing, and keeps connection
+    statistics for link status reporting.
+    """
+
+    def __init__(self, earth_ip, earth_port, backoff_initial=1.0, backoff_max=30.0, connect_timeout=5.0,
+                 keepalive_idle=10, keepalive_interval=5, keepalive_count=3):
+        """
+        Initialize the connection manager.
+
+        :param earth_ip: IP address of Mission Control.
+        :param earth_port: TCP port of Mission Control.
+        :param backoff_initial: Upper bound in seconds of the first reconnect delay.
+        :param backoff_max: Cap in seconds on the reconnect delay.
+        :param connect_timeout: Timeout in seconds for a single connect attempt.
+        :param keepalive_idle: Idle seconds before the kernel starts keepalive probes.
+        :param keepalive_interval: Seconds between keepalive probes.
+        :param keepalive_count: Unanswered probes before the connection is declared dead.
+        """
+        self.earth_ip = earth_ip
+        self.earth_port = earth_port
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+
+        self.attempt = 0
+        self.connected_since = None
+        self.connects = 0
+        self.disconnects = 0
+        self.last_connect_duration = None
+        self.total_uptime = 0.0
+        self.last_error = None
+        self.attempt_started = None
+
+    def create_socket(self):
+        """Return a new TCP socket with keepalive configured."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (("TCP_KEEPIDLE", self.keepalive_idle),
+                              ("TCP_KEEPINTVL", self.keepalive_interval),
+                              ("TCP_KEEPCNT", self.keepalive_count)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def next_delay(self):
+        """Return the next reconnect delay using full-jitter exponential backoff."""
+        ceiling = min(self.backoff_max, self.backoff_initial * (2 ** self.attempt))
+        self.attempt += 1
+        return random.uniform(0, ceiling)
+
+    def begin_attempt(self):
+        self.attempt_started = time.monotonic()
+
+    def mark_connected(self):
+        """Record a successful connect and reset the backoff."""
+        now = time.monotonic()
+        self.attempt = 0
+        self.connects += 1
+        self.connected_since = now
+        if self.attempt_started is not None:
+            self.last_connect_duration = now - self.attempt_started
+        self.attempt_started = None
+
+    def mark_disconnected(self, error=None):
+        """Record the loss of the connection."""
+        if self.connected_since is not None:
+            self.total_uptime += time.monotonic() - self.connected_since
+            self.disconnects += 1
+        self.connected_since = None
+        if error is not None:
+            self.last_error = str(error)
+
+    def connect(self, stop_event):
+        """
+        Connect to Earth, retrying with backoff until connected or stopped.
+
+        :param stop_event: threading.Event that aborts the retry loop.
+        :return: Connected socket, or None if stop_event was set first.
+        """
+        self.begin_attempt()
+        while not stop_event.is_set():
+            sock = self.create_socket()
+            sock.settimeout(self.connect_timeout)
+            try:
+                sock.connect((self.earth_ip, self.earth_port))
+            except socket.error as e:
+                sock.close()
+                self.last_error = str(e)
+                delay = self.next_delay()
+                print(f"Error connecting to Earth socket: {e} (retrying in {delay:.1f}s)")
+                stop_event.wait(delay)
+                continue
+            sock.settimeout(None)
+            self.mark_connected()
+            print(f"Connected to Earth at {self.earth_ip}:{self.earth_port}")
+            return sock
+        return None
+
+    @staticmethod
+    def peer_closed(sock):
+        """Return True if the peer has closed the connection (non-blocking check)."""
+        try:
+            data = sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return False
+        except socket.error:
+            return True
+        return data == b""
+
+    def status(self):
+        """Return connection statistics for get_link_status."""
+        now = time.monotonic()
+        uptime = now - self.connected_since if self.connected_since is not None else 0.0
+        return {
+            "earth_connected": self.connected_since is not None,
+            "earth_uptime": uptime,
+            "earth_total_uptime": self.total_uptime + uptime,
+            "earth_connects": self.connects,
+            "earth_disconnects": self.disconnects,
+            "earth_last_connect_duration": self.last_connect_duration,
+            "earth_last_error": self.last_error,
+        }
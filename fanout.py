@@ -0,0 +1,163 @@
+import collections
+import socket
+import threading
+
+from framing import send_buffers
+
+# What to do when a subscriber's queue is full
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_DISCONNECT = "disconnect"
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DROP_NEWEST, POLICY_DISCONNECT)
+
+
+class Subscriber:
+    """One TCP subscriber with its own bounded queue and writer thread."""
+
+    def __init__(self, hub, sock, addr):
+        self.hub = hub
+        self.sock = sock
+        self.addr = addr
+        self.queue = collections.deque()
+        self.queued_bytes = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.closed = False
+        self.stats = {"sent_bytes": 0, "sent_blocks": 0, "dropped_blocks": 0}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def offer(self, block):
+        """Queue a shared block for this subscriber, applying the hub's policy if the queue is full."""
+        with self.lock:
+            if self.closed:
+                return
+            if self.queued_bytes + len(block) > self.hub.max_queue_bytes:
+                if self.hub.policy == POLICY_DROP_NEWEST:
+                    self.stats["dropped_blocks"] += 1
+                    return
+                if self.hub.policy == POLICY_DISCONNECT:
+                    print(f"Subscriber {self.addr} too slow, disconnecting")
+                    self.closed = True
+                    self.ready.notify()
+                    # The writer is most likely blocked sending to the stalled client; shutting
+                    # the socket down makes that send fail so the thread exits and cleans up
+                    self.shutdown()
+                    return
+                while self.queue and self.queued_bytes + len(block) > self.hub.max_queue_bytes:
+                    self.queued_bytes -= len(self.queue.popleft())
+                    self.stats["dropped_blocks"] += 1
+            self.queue.append(block)
+            self.queued_bytes += len(block)
+            self.ready.notify()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.queue and not self.closed:
+                    self.ready.wait()
+                if self.closed:
+                    break
+                blocks = list(self.queue)
+                self.queue.clear()
+                self.queued_bytes = 0
+            try:
+                send_buffers(self.sock, blocks)
+            except socket.error as e:
+                print(f"Subscriber {self.addr} disconnected: {e}")
+                break
+            self.stats["sent_bytes"] += sum(len(block) for block in blocks)
+            self.stats["sent_blocks"] += len(blocks)
+        self.close()
+
+    def shutdown(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Already disconnected
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.ready.notify()
+        self.shutdown()
+        self.sock.close()
+        self.hub.remove(self)
+
+
+class SubscriberHub:
+    """
+    Fans relay output out to any number of TCP subscribers.
+
+    Each published block (a batch of already-framed messages) is a single bytes
+    object shared by every subscriber's queue, so messages are serialized once
+    no matter how many clients are connected. Every subscriber has its own
+    bounded queue and writer thread, so a slow client only ever loses its own
+    data (or its connection) and never stalls the relay or other clients.
+    """
+
+    def __init__(self, host, port, policy=POLICY_DROP_OLDEST, max_queue_bytes=4 * 1024 * 1024):
+        """
+        :param host: Address to listen on for subscribers.
+        :param port: TCP port to listen on.
+        :param policy: Full-queue policy: "drop_oldest", "drop_newest" or "disconnect".
+        :param max_queue_bytes: Per-subscriber queue limit in bytes.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown subscriber policy: {policy}")
+        self.policy = policy
+        self.max_queue_bytes = max_queue_bytes
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((host, port))
+        self.server_socket.listen()
+        self.server_socket.settimeout(0.5)
+
+    def start(self):
+        threading.Thread(target=self.accept_subscribers, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.server_socket.close()
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+
+    def accept_subscribers(self):
+        print(f"Accepting telemetry subscribers on {self.server_socket.getsockname()}")
+        while not self.stop_event.is_set():
+            try:
+                sock, addr = self.server_socket.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            subscriber = Subscriber(self, sock, addr)
+            with self.lock:
+                self.subscribers.append(subscriber)
+            subscriber.thread.start()
+            print(f"Subscriber connected: {addr}")
+
+    def remove(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def publish(self, block):
+        """
+        Share one block of framed messages with every subscriber.
+
+        :param block: Bytes to send; the same object is queued for all subscribers.
+        """
+        for subscriber in list(self.subscribers):
+            subscriber.offer(block)
+
+    def get_stats(self):
+        """Return per-subscriber queue depth and sent/dropped counters."""
+        return [dict(s.stats, addr=s.addr, queued_bytes=s.queued_bytes) for s in list(self.subscribers)]
@@ -1,15 +1,24 @@
-from flask import Flask, Response
+from flask import Flask, Response, request
 import threading
-import cv2
 import time
 
+from frame_hub import DEFAULT_QUALITY, FrameBroadcaster, JpegCache, StreamQuality
+from metrics import CONTENT_TYPE, REGISTRY
+
+FRAMES_STREAMED = REGISTRY.counter("coralcom_stream_frames", "MJPEG frames sent to stream clients.")
+BYTES_STREAMED = REGISTRY.counter("coralcom_stream_bytes", "JPEG bytes sent to stream clients.")
+
 class FlaskMJPEGStreamer:
     def __init__(self, vision_system, host="0.0.0.0", port=8081):
         """
         Initialize the Flask-based MJPEG streamer.
 
+        Frames reach the stream through publish(), which the vision loop calls
+        once per annotated frame. Viewers only read the shared latest frame, so
+        they never pull camera frames or run inference themselves.
+
         Args:
-            vision_system: An instance of VisionSystem to get annotated frames.
+            vision_system: The VisionSystem publishing annotated frames.
             host (str): The host address to bind the Flask server. Default is "0.0.0.0".
             port (int): The port to serve the Flask application. Default is 8081.
         """
@@ -17,13 +26,30 @@ class FlaskMJPEGStreamer:
         self.host = host
         self.port = port
         self.app = Flask(__name__)
-        self.current_frame = None
+        self.broadcaster = FrameBroadcaster()
+        self.jpeg_cache = JpegCache()
         self.stop_thread = False
 
-        # Define the video stream route
+        REGISTRY.gauge("coralcom_stream_clients", "Connected MJPEG stream viewers.",
+                       fn=lambda: self.broadcaster.clients)
+        REGISTRY.counter("coralcom_stream_frames_skipped", "Frames slow viewers skipped to stay on the latest frame.",
+                         fn=lambda: self.broadcaster.stats["skipped"])
+
+        # Define the video stream route, e.g. /stream?width=320&quality=60&fps=10&adaptive=0
         @self.app.route('/stream')
         def stream():
-            return Response(self.generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+            frames = self.generate_frames(
+                width=request.args.get('width', type=int),
+                quality=max(1, min(100, request.args.get('quality', DEFAULT_QUALITY, type=int))),
+                max_fps=request.args.get('fps', type=float),
+                adaptive=request.args.get('adaptive', '1') != '0',
+            )
+            return Response(frames, mimetype='multipart/x-mixed-replace; boundary=frame')
+
+        # Prometheus metrics for the whole process (vision pipeline and streamer)
+        @self.app.route('/metrics')
+        def metrics():
+            return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
     def start_stream(self):
         """
@@ -37,28 +63,76 @@ class FlaskMJPEGStreamer:
         """
         self.app.run(host=self.host, port=self.port, threaded=True)
 
-    def generate_frames(self):
+    def publish(self, frame, detections=None, frame_id=None):
+        """
+        Hand an annotated frame to all connected viewers.
+
+        Args:
+            frame: Annotated frame; it must not be modified afterwards.
+            detections: Detections drawn on the frame.
+            frame_id (int): Increasing frame number (assigned automatically if None).
+        """
+        self.broadcaster.publish(frame, detections, frame_id)
+
+    def generate_frames(self, width=None, quality=DEFAULT_QUALITY, max_fps=None, adaptive=True):
         """
         Generate annotated frames to serve as an MJPEG stream.
+
+        The generator is resumed only once the previous frame has been written
+        to the client's socket, so each viewer is paced by how fast its link
+        drains. Each frame is JPEG-encoded once per size and quality and the
+        bytes are shared by all viewers.
+
+        Args:
+            width (int): Preview width in pixels, or None for full size.
+            quality (int): JPEG quality the viewer asks for (1-100).
+            max_fps (float): Optional cap on frames per second for this viewer.
+            adaptive (bool): Lower quality and resolution while the viewer cannot keep up.
         """
-        while not self.stop_thread:
-            # Get the next frame and detections
-            frame, detections = self.vision_system.run_inference()
+        controller = StreamQuality(quality, width, adaptive)
+        self.broadcaster.connect()
+        try:
+            last_sequence = None
+            next_due = 0.0
+            slow_write = False
+            while not self.stop_thread:
+                if max_fps:
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_due = time.monotonic() + 1.0 / max_fps
 
-            # Annotate the frame
-            annotated_frame = self.vision_system.annotate_frame(frame, detections)
+                # Wait for a frame newer than the last one sent; a slow viewer skips straight to the latest
+                frame = self.broadcaster.wait_for(last_sequence, timeout=1.0)
+                if frame is None:
+                    continue
+                # A viewer is behind when it had to skip published frames or, with an fps cap
+                # (where skipping is intended), when writing a frame took longer than its slot.
+                # Frame IDs come from the camera and have gaps of their own, so count publishes.
+                if last_sequence is not None:
+                    controller.update(slow_write if max_fps else frame.sequence - last_sequence > 1)
+                last_sequence = frame.sequence
 
-            # Convert to JPEG format
-            _, jpeg = cv2.imencode('.jpg', annotated_frame)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
+                jpeg = self.jpeg_cache.get(frame, *controller.settings(frame))
+                FRAMES_STREAMED.inc()
+                BYTES_STREAMED.inc(len(jpeg))
+                written = time.monotonic()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+                slow_write = bool(max_fps) and time.monotonic() - written > 1.0 / max_fps
+        finally:
+            self.broadcaster.disconnect()
 
-            # Limit frame rate
-            time.sleep(0.05)
+    def get_stats(self):
+        """
+        Return viewer and frame counters for the stream, including JPEG encodes and cache hits.
+        """
+        return dict(self.broadcaster.get_stats(), **self.jpeg_cache.stats)
 
     def stop(self):
         """
         Stop the Flask streamer.
         """
         self.stop_thread = True
+        self.broadcaster.close()
         print("Stopping Flask MJPEG streamer...")
\ No newline at end of file
@@ -0,0 +1,251 @@
+import threading
+import time
+
+import cv2
+
+from metrics import REGISTRY, stage_histogram
+
+ENCODE_SECONDS = stage_histogram("encode")
+JPEG_ENCODES = REGISTRY.counter("coralcom_stream_jpeg_encodes", "JPEG encodes performed for stream viewers.")
+JPEG_CACHE_HITS = REGISTRY.counter("coralcom_stream_jpeg_cache_hits", "Stream frames served from an existing encode.")
+
+DEFAULT_QUALITY = 80
+MIN_QUALITY = 30
+QUALITY_STEP = 10  # Coarse steps so viewers at similar levels share encodes
+SCALE_STEPS = (1.0, 0.75, 0.5)
+
+
+class BroadcastFrame:
+    """
+    One published frame, shared read-only by every viewer.
+
+    frame_id is the caller's frame number (e.g. the camera frame it came
+    from) and may have gaps; sequence counts publishes without gaps, so
+    viewers measure how far they fell behind against it.
+    """
+
+    __slots__ = ("sequence", "frame_id", "published_at", "image", "detections")
+
+    def __init__(self, sequence, frame_id, published_at, image, detections):
+        self.sequence = sequence
+        self.frame_id = frame_id
+        self.published_at = published_at
+        self.image = image
+        self.detections = detections
+
+
+class FrameBroadcaster:
+    """
+    Latest-frame broadcast hub between the vision loop and stream viewers.
+
+    The vision loop publishes each annotated frame once; any number of
+    viewers wait for a frame newer than the one they last sent. A viewer
+    that falls behind simply gets the newest frame next and skips the ones
+    in between, so neither the number of viewers nor their speed has any
+    effect on the vision loop.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.latest = None
+        self.next_id = 0
+        self.sequence = 0  # Publishes so far
+        self.closed = False
+        self.clients = 0
+        self.stats = {"published": 0, "delivered": 0, "skipped": 0}
+
+    def publish(self, image, detections=None, frame_id=None):
+        """
+        Make image the current frame and wake all waiting viewers.
+
+        Args:
+            image: Annotated frame. It must not be modified after publishing.
+            detections: Detections drawn on the frame, for viewers that want them.
+            frame_id (int): Increasing frame number; assigned automatically if None.
+        """
+        with self.condition:
+            if frame_id is None:
+                frame_id = self.next_id
+            self.next_id = frame_id + 1
+            self.sequence += 1
+            self.latest = BroadcastFrame(self.sequence, frame_id, time.time(), image, detections)
+            self.stats["published"] += 1
+            self.condition.notify_all()
+
+    def wait_for(self, last_sequence=None, timeout=None):
+        """
+        Return the newest frame after last_sequence, waiting up to timeout seconds for one.
+
+        Args:
+            last_sequence (int): sequence of the frame the viewer sent last, or None for any frame.
+            timeout (float): Seconds to wait; None waits until a frame arrives or the hub closes.
+
+        Returns:
+            The newest BroadcastFrame, or None on timeout or once closed.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.closed or self.is_newer(last_sequence), timeout):
+                return None
+            if self.closed:
+                return None
+            frame = self.latest
+            self.stats["delivered"] += 1
+            if last_sequence is not None:
+                self.stats["skipped"] += frame.sequence - last_sequence - 1
+            return frame
+
+    def is_newer(self, last_sequence):
+        return self.latest is not None and (last_sequence is None or self.latest.sequence > last_sequence)
+
+    def connect(self):
+        """Count a viewer in; pair with disconnect()."""
+        with self.condition:
+            self.clients += 1
+
+    def disconnect(self):
+        with self.condition:
+            self.clients -= 1
+
+    def close(self):
+        """Wake every waiting viewer so its stream can end."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def get_stats(self):
+        """Return the number of viewers and frames published, delivered and skipped by slow viewers."""
+        with self.condition:
+            return dict(self.stats, clients=self.clients)
+
+
+class JpegCache:
+    """
+    Encodes each published frame at most once per size and quality.
+
+    Viewers ask for (frame, width, quality); the first one encodes and every
+    other viewer at the same settings reuses the bytes, even while the encode
+    is still running. Only the most recent frames are kept.
+    """
+
+    def __init__(self, keep_frames=2):
+        """
+        Args:
+            keep_frames (int): Number of most recent published frames whose encodes are kept.
+        """
+        self.keep_frames = keep_frames
+        self.lock = threading.Lock()
+        self.entries = {}  # (sequence, width, quality) -> bytes, or an Event while the first viewer encodes
+        self.newest = -1
+        self.stats = {"encodes": 0, "hits": 0}
+
+    def get(self, frame, width=None, quality=DEFAULT_QUALITY):
+        """
+        Return the JPEG bytes of a BroadcastFrame.
+
+        Args:
+            frame: BroadcastFrame to encode.
+            width (int): Output width in pixels (height keeps the aspect ratio); None for full size.
+            quality (int): JPEG quality, 1-100.
+        """
+        full_width = frame.image.shape[1]
+        if width is None or width >= full_width:
+            width = full_width
+        key = (frame.sequence, width, quality)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                pending = self.entries[key] = threading.Event()
+                self.evict(frame.sequence)
+        if entry is not None:
+            if isinstance(entry, threading.Event):
+                entry.wait()
+                entry = self.entries.get(key)
+                if entry is None:
+                    return self.get(frame, width, quality)  # Encode failed or was evicted; try again
+            self.stats["hits"] += 1
+            JPEG_CACHE_HITS.inc()
+            return entry
+
+        try:
+            with ENCODE_SECONDS.time():
+                image = frame.image
+                if width != full_width:
+                    height = max(1, round(image.shape[0] * width / full_width))
+                    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            data = jpeg.tobytes()
+            with self.lock:
+                self.entries[key] = data
+            self.stats["encodes"] += 1
+            JPEG_ENCODES.inc()
+            return data
+        except Exception:
+            with self.lock:
+                self.entries.pop(key, None)
+            raise
+        finally:
+            pending.set()
+
+    def evict(self, sequence):
+        self.newest = max(self.newest, sequence)
+        oldest_kept = self.newest - self.keep_frames + 1
+        for key in [key for key in self.entries if key[0] < oldest_kept]:
+            del self.entries[key]
+
+
+class StreamQuality:
+    """
+    Per-viewer quality controller for the MJPEG stream.
+
+    A viewer that skips frames degrade_after times in a row is being held
+    back by its link or by encoding CPU, so it steps down: JPEG quality
+    first, then resolution. After recover_after frames in a row without
+    skipping it steps back up towards the quality and width it asked for.
+    Fewer frames are sent while it is behind because it always jumps to the
+    latest frame.
+    """
+
+    def __init__(self, quality=DEFAULT_QUALITY, width=None, adaptive=True, degrade_after=3, recover_after=30):
+        """
+        Args:
+            quality (int): Highest JPEG quality the viewer wants.
+            width (int): Preferred preview width in pixels, or None for the full frame.
+            adaptive (bool): Adjust quality and resolution to what the viewer keeps up with.
+            degrade_after (int): Consecutive late frames before stepping down.
+            recover_after (int): Consecutive on-time frames before stepping back up.
+        """
+        # Requested quality, then shared steps down to MIN_QUALITY, then smaller frames at the lowest quality
+        lowest = min(quality, MIN_QUALITY)
+        steps = [q for q in range(quality // QUALITY_STEP * QUALITY_STEP, lowest - 1, -QUALITY_STEP) if q < quality]
+        self.levels = [(1.0, quality)] + [(1.0, q) for q in steps]
+        self.levels += [(scale, lowest) for scale in SCALE_STEPS[1:]]
+        self.width = width
+        self.adaptive = adaptive
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.level = 0
+        self.late = 0
+        self.on_time = 0
+
+    def update(self, behind):
+        """Record whether the viewer fell behind (e.g. skipped frames) on the frame it is about to get."""
+        if not self.adaptive:
+            return
+        if behind:
+            self.on_time = 0
+            self.late += 1
+            if self.late >= self.degrade_after:
+                self.level = min(self.level + 1, len(self.levels) - 1)
+                self.late = 0
+        else:
+            self.late = 0
+            self.on_time += 1
+            if self.on_time >= self.recover_after and self.level > 0:
+                self.level -= 1
+                self.on_time = 0
+
+    def settings(self, frame):
+        """Return the (width, quality) to send a frame at."""
+        scale, quality = self.levels[self.level]
+        width = self.width or frame.image.shape[1]
+        return (int(width * scale) if scale != 1.0 else self.width), quality
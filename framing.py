@@ -0,0 +1,77 @@
+import struct
+
+# Uplink framing: newline-delimited JSON, or a 4-byte big-endian length prefix
+FRAMING_NEWLINE = "newline"
+FRAMING_LENGTH = "length"
+LENGTH_PREFIX = struct.Struct("!I")
+
+# Largest number of buffers handed to a single sendmsg call (POSIX IOV_MAX)
+IOV_MAX = 1024
+
+
+def frame_message(payload, framing=FRAMING_NEWLINE):
+    """
+    Return the list of buffers that make up one framed message.
+
+    :param payload: Encoded message bytes.
+    :param framing: FRAMING_NEWLINE or FRAMING_LENGTH.
+    """
+    if framing == FRAMING_LENGTH:
+        return [LENGTH_PREFIX.pack(len(payload)), payload]
+    return [payload, b"\n"]
+
+
+def send_buffers(sock, buffers):
+    """
+    Write a list of buffers to a stream socket with vectored sends.
+
+    Handles partial writes by advancing through the buffer list, falling back
+    to a single joined sendall where sendmsg is unavailable.
+    """
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(buffers))
+        return
+
+    views = [memoryview(b) for b in buffers if len(b)]
+    while views:
+        sent = sock.sendmsg(views[:IOV_MAX])
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
+class TelemetryFrameDecoder:
+    """Split a framed uplink byte stream back into message payloads (for Mission Control)."""
+
+    def __init__(self, framing=FRAMING_NEWLINE):
+        self.framing = framing
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Add received bytes and return the list of complete payloads.
+
+        :param data: Bytes read from the TCP stream.
+        """
+        self.buffer += data
+        payloads = []
+        if self.framing == FRAMING_LENGTH:
+            offset = 0
+            while len(self.buffer) - offset >= LENGTH_PREFIX.size:
+                (length,) = LENGTH_PREFIX.unpack_from(self.buffer, offset)
+                end = offset + LENGTH_PREFIX.size + length
+                if end > len(self.buffer):
+                    break
+                if length:  # Zero-length frames are heartbeats
+                    payloads.append(bytes(self.buffer[offset + LENGTH_PREFIX.size:end]))
+                offset = end
+            del self.buffer[:offset]
+        else:
+            *lines, rest = self.buffer.split(b"\n")
+            payloads = [bytes(line) for line in lines if line]
+            self.buffer = bytearray(rest)
+        return payloads
@@ -0,0 +1,210 @@
+import os
+import random
+import time
+
+import numpy as np
+
+from inference_edgetpu import (
+    INFERENCE_SECONDS,
+    POSTPROCESS_SECONDS,
+    DetectionPostprocessor,
+    Preprocessor,
+    initialize_interpreter,
+    invoke_detector,
+    select_detections,
+)
+from metrics import stage_histogram
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    Interpreter = None
+
+PREPROCESS_SECONDS = stage_histogram("preprocess")
+
+BACKEND_AUTO = "auto"
+BACKEND_EDGETPU = "edgetpu"
+BACKEND_CPU = "cpu"
+BACKEND_FAKE = "fake"
+BACKENDS = (BACKEND_AUTO, BACKEND_EDGETPU, BACKEND_CPU, BACKEND_FAKE)
+
+
+class InferenceBackend:
+    """
+    Runs the object detector on camera frames.
+
+    Implementations take a BGR frame of any size and return a DETECTION_DTYPE
+    array. They record their own preprocess, inference and postprocess
+    latencies in the shared stage histograms.
+    """
+
+    name = None
+
+    def __init__(self, input_size):
+        self.input_size = input_size  # (width, height) the model runs at
+
+    def detect(self, frame):
+        """
+        Args:
+            frame: BGR camera frame.
+
+        Returns:
+            Structured array of DETECTION_DTYPE.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InterpreterBackend(InferenceBackend):
+    """Backend around an allocated TFLite interpreter, shared by the Edge TPU and CPU implementations."""
+
+    def __init__(self, interpreter, threshold=0.5, class_ids=None, nms_iou=None):
+        self.interpreter = interpreter
+        self.preprocessor = Preprocessor(interpreter)
+        self.postprocessor = DetectionPostprocessor(interpreter, threshold, class_ids, nms_iou)
+        super().__init__(self.preprocessor.size)
+
+    def detect(self, frame):
+        with PREPROCESS_SECONDS.time():
+            self.preprocessor(frame)
+        return invoke_detector(self.interpreter, self.postprocessor)
+
+
+class EdgeTpuBackend(InterpreterBackend):
+    """Runs an Edge TPU compiled model through pycoral."""
+
+    name = BACKEND_EDGETPU
+
+    def __init__(self, model_path, threshold=0.5, class_ids=None, nms_iou=None):
+        """
+        Args:
+            model_path (str): Edge TPU compiled .tflite model.
+            threshold (float): Confidence threshold for keeping a detection.
+            class_ids: Class IDs to keep, or None for all.
+            nms_iou (float): IoU for per-class non-maximum suppression, or None to skip it.
+        """
+        super().__init__(initialize_interpreter(model_path), threshold, class_ids, nms_iou)
+
+
+class CpuTfliteBackend(InterpreterBackend):
+    """Runs a regular (not Edge TPU compiled) .tflite model on the CPU with tflite_runtime."""
+
+    name = BACKEND_CPU
+
+    def __init__(self, model_path, num_threads=4, threshold=0.5, class_ids=None, nms_iou=None):
+        """
+        Args:
+            model_path (str): CPU .tflite model.
+            num_threads (int): Interpreter threads.
+            threshold (float): Confidence threshold for keeping a detection.
+            class_ids: Class IDs to keep, or None for all.
+            nms_iou (float): IoU for per-class non-maximum suppression, or None to skip it.
+        """
+        if Interpreter is None:
+            raise ImportError("tflite_runtime is required for the CPU backend (pip install tflite-runtime)")
+        interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        interpreter.allocate_tensors()
+        super().__init__(interpreter, threshold, class_ids, nms_iou)
+
+
+class FakeBackend(InferenceBackend):
+    """
+    Deterministic stand-in for the detector, for load tests and CI without a TPU.
+
+    Every call sleeps for the configured latency (plus seeded jitter) and
+    returns the next entry of a script of detections, cycling through it. The
+    scripted candidates go through the same threshold, class allow-list and
+    NMS as a real detector's output, so filtering options behave the same.
+    The default script is one object sliding across the frame.
+    """
+
+    name = BACKEND_FAKE
+
+    def __init__(self, script=None, latency=0.02, jitter=0.0, input_size=(300, 300), seed=0, threshold=0.5,
+                 class_ids=None, nms_iou=None):
+        """
+        Args:
+            script: List with one entry per frame, each a list of (class_id, score, (ymin, xmin, ymax, xmax))
+                    tuples. None uses the default moving object.
+            latency (float): Seconds each inference takes.
+            jitter (float): Up to this many extra seconds per inference, drawn from a seeded generator.
+            input_size: (width, height) reported as the model input size.
+            seed (int): Seed for the jitter, so runs are repeatable.
+            threshold (float): Confidence threshold for keeping a detection.
+            class_ids: Class IDs to keep, or None for all.
+            nms_iou (float): IoU for per-class non-maximum suppression, or None to skip it.
+        """
+        super().__init__(tuple(input_size))
+        if script is None:
+            script = [[(0, 0.9, (0.3, 0.1 + 0.006 * i, 0.7, 0.3 + 0.006 * i))] for i in range(100)]
+        self.script = [self.to_candidates(entry) for entry in script]
+        self.threshold = threshold
+        self.class_ids = np.array(sorted(class_ids), dtype=np.float32) if class_ids is not None else None
+        self.nms_iou = nms_iou
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    @staticmethod
+    def to_candidates(entry):
+        """Return one script entry as (scores, boxes, classes) arrays, like the detector's output tensors."""
+        scores = np.array([score for _, score, _ in entry], np.float32)
+        boxes = np.array([bbox for _, _, bbox in entry], np.float32).reshape(-1, 4)
+        classes = np.array([class_id for class_id, _, _ in entry], np.float32)
+        return scores, boxes, classes
+
+    def detect(self, frame):
+        with INFERENCE_SECONDS.time():
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay > 0:
+                time.sleep(delay)
+        with POSTPROCESS_SECONDS.time():
+            scores, boxes, classes = self.script[self.calls % len(self.script)]
+            detections = select_detections(scores, boxes, classes, self.threshold, self.class_ids, self.nms_iou)
+        self.calls += 1
+        return detections
+
+
+def cpu_model_for(model_path):
+    """Return the CPU model that pycoral's naming convention pairs with an Edge TPU model (x_edgetpu.tflite -> x.tflite)."""
+    root, ext = os.path.splitext(model_path)
+    if root.endswith("_edgetpu"):
+        return root[:-len("_edgetpu")] + ext
+    return model_path
+
+
+def create_backend(backend=BACKEND_AUTO, model_path=None, cpu_model_path=None, cpu_threads=4, threshold=0.5,
+                   class_ids=None, nms_iou=None, fake_options=None):
+    """
+    Create the inference backend to use.
+
+    Args:
+        backend (str): "edgetpu", "cpu", "fake", or "auto" to use the Edge TPU and fall back to the CPU when
+            pycoral or the TPU is missing.
+        model_path (str): Edge TPU compiled model.
+        cpu_model_path (str): CPU model (default: model_path without the "_edgetpu" suffix).
+        cpu_threads (int): Interpreter threads for the CPU backend.
+        threshold (float): Confidence threshold for keeping a detection.
+        class_ids: Class IDs to keep, or None for all.
+        nms_iou (float): IoU for per-class non-maximum suppression, or None to skip it.
+        fake_options (dict): Keyword arguments for FakeBackend.
+
+    Returns:
+        An InferenceBackend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend == BACKEND_FAKE:
+        return FakeBackend(**dict({"threshold": threshold, "class_ids": class_ids, "nms_iou": nms_iou},
+                                  **(fake_options or {})))
+    if backend in (BACKEND_AUTO, BACKEND_EDGETPU):
+        try:
+            return EdgeTpuBackend(model_path, threshold, class_ids, nms_iou)
+        except (ImportError, ValueError, RuntimeError, OSError) as e:
+            if backend == BACKEND_EDGETPU:
+                raise
+            print(f"Edge TPU unavailable ({e}); falling back to CPU inference")
+    return CpuTfliteBackend(cpu_model_path or cpu_model_for(model_path), cpu_threads, threshold, class_ids, nms_iou)
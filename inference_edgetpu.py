@@ -1,71 +1,252 @@
+import re
 import time
-from pycoral.adapters.common import input_size
-from pycoral.adapters.detect import get_objects
-from pycoral.utils.dataset import read_label_file
-from pycoral.utils.edgetpu import make_interpreter, run_inference
+import cv2
 import numpy as np
 
+try:
+    from pycoral.utils.edgetpu import make_interpreter
+except ImportError:  # CPU and fake backends (see inference_backends.py) work without pycoral
+    make_interpreter = None
+
+from metrics import stage_histogram
+
+INFERENCE_SECONDS = stage_histogram("inference")
+POSTPROCESS_SECONDS = stage_histogram("postprocess")
+
 
 def load_labels(label_path):
-    """Load labels from a file."""
-    return read_label_file(label_path)
+    """Load labels from a file ("id label" per line, or one label per line), like pycoral's read_label_file."""
+    labels = {}
+    with open(label_path, "r", encoding="utf-8") as f:
+        for row_number, content in enumerate(f):
+            pair = re.split(r"[:\s]+", content.strip(), maxsplit=1)
+            if len(pair) == 2 and pair[0].strip().isdigit():
+                labels[int(pair[0])] = pair[1].strip()
+            else:
+                labels[row_number] = content.strip()
+    return labels
 
 
 def initialize_interpreter(model_path):
     """Initialize and allocate tensors for the model."""
+    if make_interpreter is None:
+        raise ImportError("pycoral is required for the Edge TPU; install it or use the CPU backend")
     interpreter = make_interpreter(model_path)
     interpreter.allocate_tensors()
     return interpreter
 
 
-def run_inference_on_frame(interpreter, input_frame, labels, threshold=0.5):
+class Preprocessor:
+    """
+    Writes camera frames straight into the interpreter's input tensor.
+
+    The input size comes from the model. Resizing goes into one reusable
+    buffer and the BGR -> RGB conversion writes directly into the input
+    tensor, so preparing a frame allocates nothing and copies the image
+    only as often as resize and colour conversion need to.
+
+    uint8 models (Edge TPU detectors) take the raw RGB pixels. For other
+    input types each pixel is normalized to (pixel - mean) / std, which is
+    what float models get, and int8 models then quantize that with their
+    input scale and zero point. Both go through a 256-entry lookup table, so
+    they cost one extra pass over the image.
+    """
+
+    def __init__(self, interpreter, mean=127.5, std=127.5):
+        """
+        Args:
+            interpreter: The TensorFlow Lite interpreter, with tensors allocated.
+            mean (float): Pixel value mapped to 0 for models that do not take uint8 input.
+            std (float): Pixel range mapped to 1 for models that do not take uint8 input.
+
+        Raises:
+            ValueError: If the model's input type is not supported.
+        """
+        self.interpreter = interpreter
+        details = interpreter.get_input_details()[0]
+        _, height, width, _ = details["shape"]
+        self.size = (int(width), int(height))
+        self.input_tensor = interpreter.tensor(details["index"])
+        self.resized = np.empty((height, width, 3), np.uint8)
+        self.lut = self.input_table(np.dtype(details["dtype"]), details.get("quantization", (0.0, 0)), mean, std)
+        self.rgb = None if self.lut is None else np.empty((height, width, 3), np.uint8)
+
+    @staticmethod
+    def input_table(dtype, quantization, mean, std):
+        """Return the pixel -> input value lookup table, or None if pixels are written as they are."""
+        if dtype == np.uint8:
+            return None
+        normalized = (np.arange(256, dtype=np.float64) - mean) / std
+        if dtype.kind == "f":
+            return normalized.astype(dtype)
+        scale, zero_point = quantization
+        if dtype == np.int8 and scale:
+            info = np.iinfo(dtype)
+            return np.clip(np.rint(normalized / scale + zero_point), info.min, info.max).astype(dtype)
+        raise ValueError(f"Unsupported model input type {dtype} (quantization {quantization})")
+
+    def __call__(self, frame):
+        """
+        Resize a BGR camera frame to the model input and store it as RGB in the input tensor.
+
+        Args:
+            frame: BGR image from the camera, any size.
+        """
+        if frame.shape[1::-1] != self.size:
+            frame = cv2.resize(frame, self.size, dst=self.resized)
+        # The tensor view must not outlive this call, or the interpreter refuses to invoke
+        view = self.input_tensor()[0]
+        if self.lut is None:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=view)
+        else:
+            np.take(self.lut, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb), out=view, mode="clip")
+        del view
+
+
+def invoke_detector(interpreter, postprocessor):
     """
-    Run inference on a single input frame.
+    Run inference on the frame already in the input tensor (see Preprocessor).
 
     Args:
         interpreter: The TensorFlow Lite interpreter.
-        input_frame: The frame resized to model's input size.
-        labels: Dictionary of labels.
-        threshold: Confidence threshold for filtering detections.
+        postprocessor: DetectionPostprocessor for this interpreter.
+
+    Returns:
+        Structured array of DETECTION_DTYPE.
+    """
+    with INFERENCE_SECONDS.time():
+        interpreter.invoke()
+    with POSTPROCESS_SECONDS.time():
+        return postprocessor()
+
+
+# Compact detection records: one row per detection, bbox as normalized [ymin, xmin, ymax, xmax]
+DETECTION_DTYPE = np.dtype([("class_id", np.int32), ("score", np.float32), ("bbox", np.float32, (4,))])
+
+
+class DetectionPostprocessor:
+    """
+    Turns an SSD detector's output tensors into a structured array of detections.
+
+    The output tensor indices are resolved once. Each call reads the tensors
+    in place and applies the score threshold, the class allow-list and the
+    optional non-maximum suppression as NumPy mask operations on the
+    candidates, so its cost does not depend on Python loops over the
+    detection head.
+    """
+
+    def __init__(self, interpreter, threshold=0.5, class_ids=None, nms_iou=None):
+        """
+        Args:
+            interpreter: The TensorFlow Lite interpreter, with tensors allocated.
+            threshold: Confidence threshold for keeping a detection.
+            class_ids: Iterable of class IDs to keep, or None to keep every class.
+            nms_iou: IoU above which overlapping boxes of the same class are suppressed, or None to skip NMS.
+        """
+        self.interpreter = interpreter
+        self.threshold = threshold
+        self.class_ids = np.array(sorted(class_ids), dtype=np.float32) if class_ids is not None else None
+        self.nms_iou = nms_iou
+
+        # Boxes are the only [1, N, 4] output and the count the only single-value one; scores and
+        # class IDs keep the order the model reports them in (scores first for our SSD models)
+        output_details = interpreter.get_output_details()
+        boxes = [d["index"] for d in output_details if len(d["shape"]) == 3]
+        vectors = [d["index"] for d in output_details if len(d["shape"]) == 2 and d["shape"][-1] > 1]
+        if len(boxes) != 1 or len(vectors) != 2:
+            # Fall back to the historical order: scores, boxes, class IDs
+            vectors = [output_details[0]["index"], output_details[2]["index"]]
+            boxes = [output_details[1]["index"]]
+        self.scores = interpreter.tensor(vectors[0])
+        self.boxes = interpreter.tensor(boxes[0])
+        self.classes = interpreter.tensor(vectors[1])
+
+    def __call__(self):
+        """
+        Read the detections of the last inference.
+
+        Returns:
+            Structured array of DETECTION_DTYPE, highest score first when NMS is enabled.
+        """
+        return select_detections(self.scores()[0], self.boxes()[0], self.classes()[0], self.threshold,
+                                 self.class_ids, self.nms_iou)
+
+
+def select_detections(scores, boxes, classes, threshold, class_ids=None, nms_iou=None):
+    """
+    Apply the score threshold, class allow-list and NMS to raw detector candidates.
+
+    Args:
+        scores: [N] candidate scores.
+        boxes: [N, 4] candidate boxes as [ymin, xmin, ymax, xmax].
+        classes: [N] candidate class IDs.
+        threshold: Confidence threshold for keeping a detection.
+        class_ids: Array of class IDs to keep, or None to keep every class.
+        nms_iou: IoU above which overlapping boxes of the same class are suppressed, or None to skip NMS.
 
     Returns:
-        List of detection dictionaries with class_id, bbox, and score.
+        Structured array of DETECTION_DTYPE, highest score first when NMS is enabled.
     """
-    input_tensor = input_frame.astype("uint8")
-    input_tensor = np.ascontiguousarray(input_tensor)
-
-    # Perform inference
-    run_inference(interpreter, input_tensor.tobytes())
-
-    # Extract output tensors
-    output_details = interpreter.get_output_details()
-    scores = np.ascontiguousarray(interpreter.tensor(output_details[0]['index'])()[0])  # Shape: [N]
-    boxes = np.ascontiguousarray(interpreter.tensor(output_details[1]['index'])()[0])   # Shape: [N, 4]
-    class_ids = np.ascontiguousarray(interpreter.tensor(output_details[2]['index'])()[0])  # Shape: [N]
-
-    # Debug tensor shapes and content
-    #print(f"Scores shape: {scores.shape}")
-    #print(f"Boxes shape: {boxes.shape}")
-    #print(f"Class IDs shape: {class_ids.shape}")
-    #print(f"Raw scores data: {scores}")
-    #print(f"Raw class_ids data: {class_ids}")
-
-    # Handle empty outputs (no detections)
-    if scores.size == 0 or boxes.size == 0 or class_ids.size == 0:
-        print("No detections found.")
-        return []
-
-    # Filter detections based on threshold and ensure index bounds
-    detections = []
-    for i in range(min(len(scores), len(class_ids), len(boxes))):
-        if scores[i] > threshold:
-            bbox = boxes[i].tolist()  # Convert bounding box to list
-            class_id = int(class_ids[i]) if i < len(class_ids) else -1  # Handle missing class IDs
-            detections.append({
-                "class_id": class_id,
-                "bbox": bbox,
-                "score": float(scores[i]),
-                "label": labels.get(class_id, "Unknown"),
-            })
+    count = min(len(scores), len(boxes), len(classes))
+    keep = np.flatnonzero(scores[:count] > threshold)
+    if class_ids is not None and keep.size:
+        keep = keep[np.isin(classes[keep], class_ids)]
+    if nms_iou is not None and keep.size > 1:
+        keep = non_max_suppression(boxes[keep], scores[keep], classes[keep], nms_iou, keep)
 
+    detections = np.empty(keep.size, DETECTION_DTYPE)
+    detections["class_id"] = classes[keep]
+    detections["score"] = scores[keep]
+    detections["bbox"] = boxes[keep]
     return detections
+
+
+def non_max_suppression(boxes, scores, classes, iou_threshold, indices):
+    """
+    Greedy per-class non-maximum suppression.
+
+    Args:
+        boxes: [K, 4] candidate boxes as [ymin, xmin, ymax, xmax].
+        scores: [K] candidate scores.
+        classes: [K] candidate class IDs.
+        iou_threshold: Overlap above which the lower-scoring box of the same class is dropped.
+        indices: [K] values to return for the kept candidates.
+
+    Returns:
+        The entries of indices that survive, highest score first.
+    """
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-scores, kind="stable")
+    kept = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        kept.append(best)
+        top_left = np.maximum(boxes[best, :2], boxes[rest, :2])
+        bottom_right = np.minimum(boxes[best, 2:], boxes[rest, 2:])
+        overlap = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+        iou = overlap / np.maximum(areas[best] + areas[rest] - overlap, 1e-9)
+        order = rest[(iou <= iou_threshold) | (classes[rest] != classes[best])]
+    return indices[np.array(kept, dtype=np.intp)]
+
+
+def detections_to_dicts(detections, labels):
+    """
+    Convert a DETECTION_DTYPE array to the detection dictionaries sent as JSON.
+
+    Args:
+        detections: Structured array from DetectionPostprocessor (or ObjectTracker, which adds track_id).
+        labels: Dictionary of labels.
+
+    Returns:
+        List of detection dictionaries with class_id, bbox, score, label and, when tracked, track_id.
+    """
+    dicts = [
+        {"class_id": class_id, "bbox": bbox, "score": score, "label": labels.get(class_id, "Unknown")}
+        for class_id, score, bbox in zip(detections["class_id"].tolist(), detections["score"].tolist(),
+                                         detections["bbox"].tolist())
+    ]
+    if "track_id" in detections.dtype.names:
+        for detection, track_id in zip(dicts, detections["track_id"].tolist()):
+            detection["track_id"] = track_id
+    return dicts
+
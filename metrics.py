@@ -0,0 +1,249 @@
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram resolution: each power of two is split into this many linear sub-buckets
+SUB_BUCKETS = 8
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count, optionally read from a callable at scrape time."""
+
+    kind = "counter"
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        return self.fn() if self.fn is not None else self.value
+
+    def samples(self, name, labels):
+        yield name + "_total", labels, self.get()
+
+
+class Gauge(Counter):
+    """Current value (e.g. a queue depth), set directly or read from a callable at scrape time."""
+
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.get()
+
+
+class Histogram:
+    """
+    Latency histogram with HDR-style log-linear buckets.
+
+    Every power of two is split into SUB_BUCKETS linear buckets, so any
+    recorded value lands in a bucket within about 6% of it, from microseconds
+    to minutes, without configuring bucket bounds up front. Only buckets that
+    have been hit are exported.
+    """
+
+    kind = "histogram"
+
+    def __init__(self):
+        self.buckets = {}  # Upper bound -> count
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def upper_bound(value):
+        if value <= 0:
+            return 0.0
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        sub = int((mantissa - 0.5) * 2 * SUB_BUCKETS) + 1
+        return math.ldexp(0.5 + sub / (2 * SUB_BUCKETS), exponent)
+
+    def observe(self, value):
+        """Record one measurement in seconds."""
+        bound = self.upper_bound(value)
+        with self.lock:
+            self.buckets[bound] = self.buckets.get(bound, 0) + 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager recording the duration of its block."""
+        return Timer(self)
+
+    def percentile(self, q):
+        """Return the bucket upper bound below which a fraction q of measurements fall (None if empty)."""
+        with self.lock:
+            if not self.count:
+                return None
+            target = q * self.count
+            seen = 0
+            for bound in sorted(self.buckets):
+                seen += self.buckets[bound]
+                if seen >= target:
+                    return bound
+            return max(self.buckets)
+
+    def samples(self, name, labels):
+        with self.lock:
+            buckets = sorted(self.buckets.items())
+            count, total = self.count, self.sum
+        cumulative = 0
+        for bound, hits in buckets:
+            cumulative += hits
+            yield name + "_bucket", labels + (("le", format_value(bound)),), cumulative
+        yield name + "_bucket", labels + (("le", "+Inf"),), count
+        yield name + "_sum", labels, total
+        yield name + "_count", labels, count
+
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of counters, gauges and histograms.
+
+    Metrics are identified by name plus labels; asking for the same
+    combination again returns the existing metric, so modules can look their
+    metrics up at import time or per instance without coordinating.
+    """
+
+    def __init__(self):
+        self.families = {}  # name -> (kind, help, {labels: metric})
+        self.lock = threading.Lock()
+
+    def get(self, cls, name, help, labels, **kwargs):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            kind, _, children = self.families.setdefault(name, (cls.kind, help, {}))
+            if kind != cls.kind:
+                raise ValueError(f"Metric {name} is already registered as a {kind}")
+            metric = children.get(key)
+            if metric is None:
+                metric = children[key] = cls(**kwargs)
+            elif kwargs.get("fn") is not None:
+                metric.fn = kwargs["fn"]  # Latest owner reports the value
+            return metric
+
+    def counter(self, name, help, fn=None, **labels):
+        return self.get(Counter, name, help, labels, fn=fn)
+
+    def gauge(self, name, help, fn=None, **labels):
+        return self.get(Gauge, name, help, labels, fn=fn)
+
+    def histogram(self, name, help, **labels):
+        return self.get(Histogram, name, help, labels)
+
+    def unregister(self, **labels):
+        """Remove every metric carrying all the given labels, e.g. those of one stopped relay."""
+        wanted = set(labels.items())
+        with self.lock:
+            for name, (_, _, children) in list(self.families.items()):
+                for key in [key for key in children if wanted <= set(key)]:
+                    del children[key]
+                if not children:
+                    del self.families[name]
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            families = [(name, kind, help, list(children.items()))
+                        for name, (kind, help, children) in sorted(self.families.items())]
+        for name, kind, help, children in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in children:
+                try:
+                    for sample, sample_labels, value in metric.samples(name, labels):
+                        lines.append(f"{sample}{format_labels(sample_labels)} {format_value(value)}")
+                except Exception as e:
+                    lines.append(f"# {name}{format_labels(labels)} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by the relay, the vision system and the MJPEG streamer in one process
+REGISTRY = MetricsRegistry()
+
+# Per-stage latency, in seconds, across the relay and vision pipelines
+STAGE_SECONDS = "coralcom_stage_seconds"
+
+
+def stage_histogram(stage, registry=REGISTRY, **labels):
+    return registry.histogram(STAGE_SECONDS, "Time spent in each pipeline stage.", stage=stage, **labels)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+class MetricsServer:
+    """Serves a registry at /metrics on a local HTTP port from a background thread."""
+
+    def __init__(self, host="127.0.0.1", port=9100, registry=REGISTRY):
+        """
+        :param host: Address to listen on.
+        :param port: TCP port for the endpoint.
+        :param registry: Registry to expose.
+        """
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.registry = registry
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"Metrics available at http://{host}:{port}/metrics")
+
+    def stop(self):
+        if self.thread is not None:
+            self.server.shutdown()
+        self.server.server_close()
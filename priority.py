@@ -0,0 +1,251 @@
+import collections
+import re
+import threading
+import time
+from queue import Empty, Full
+
+from telemetry_filter import conditions_match, parse_where
+
+# What a full lane does with new telemetry
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DROP_SPILL = "spill"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, DROP_SPILL)
+
+
+class PriorityClass:
+    """One priority lane: which telemetry belongs to it and how it is scheduled."""
+
+    def __init__(self, name, where=None, sources=None, weight=1, max_latency=None, rate=None, burst=None,
+                 capacity=None, drop=DROP_OLDEST):
+        """
+        :param name: Lane name used in stats.
+        :param where: Field rule, e.g. "battery_level < 20 or ultrasound_distance < 0.5" (same syntax as the
+                      archive's --where, with "or" between alternatives). None matches every packet.
+        :param sources: Input names (see the relay's inputs option) whose packets belong here, or None for any.
+        :param weight: Share of the uplink this lane gets relative to other weighted lanes.
+        :param max_latency: Seconds. Lanes with a deadline are served earliest-deadline-first, ahead of the
+                            weighted lanes.
+        :param rate: Maximum messages per second sent from this lane, or None for no limit.
+        :param burst: Messages the rate limiter lets through at once (default: one second's worth).
+        :param capacity: Maximum queued messages (default: the relay's buffer_size).
+        :param drop: When full, "drop_oldest", "drop_newest" or "spill" (hand overflow to the spill queue).
+        """
+        if drop not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy for {name}: {drop}")
+        self.name = name
+        self.rules = None
+        if where:
+            self.rules = [parse_where(part) for part in re.split(r"\s+or\s+", where.strip(), flags=re.IGNORECASE)]
+        self.sources = set(sources) if sources is not None else None
+        self.weight = weight
+        self.max_latency = max_latency
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate or 0, 1)
+        self.capacity = capacity
+        self.drop = drop
+
+        self.queue = collections.deque()  # (enqueue time, telemetry)
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.current = 0  # Smooth weighted round robin credit
+        self.stats = {"queued": 0, "sent": 0, "dropped": 0, "max_wait": 0.0}
+
+    def matches(self, telemetry, source):
+        if self.sources is not None and source not in self.sources:
+            return False
+        if self.rules is None:
+            return True
+        try:
+            return any(conditions_match(telemetry, conditions) for conditions in self.rules)
+        except ValueError:
+            return False  # Undecodable passthrough packet
+
+    def refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def ready(self):
+        return bool(self.queue) and (self.rate is None or self.tokens >= 1)
+
+    def ready_in(self):
+        """Seconds until the lane may send again, 0 if it may now, or None if it is empty."""
+        if not self.queue:
+            return None
+        if self.rate is None or self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class PriorityTelemetryBuffer:
+    """
+    Telemetry buffer with separate priority lanes and a link-aware scheduler.
+
+    A drop-in replacement for the relay's Queue. put() files each packet into
+    the first lane whose source and field rules match (the last lane is the
+    default), and get() returns the packet that should go out next:
+
+    - lanes with a max_latency are served earliest-deadline-first, so urgent
+      readings overtake any backlog in the other lanes;
+    - the remaining lanes share the link by weight (smooth weighted round
+      robin), so bulk data still makes progress;
+    - a lane with a rate limit is skipped while its token bucket is empty.
+
+    Each lane is bounded by its own capacity and drop policy, so a burst of
+    low-value data can only ever evict its own lane. Telemetry a "spill" lane
+    overflowed to disk is handed back to that same lane with requeue(), so it
+    is still scheduled by the lane's priority and rate limit. empty() reports
+    whether anything may be sent now; qsize() counts everything queued.
+    """
+
+    def __init__(self, classes, capacity):
+        """
+        :param classes: List of PriorityClass objects or their keyword dicts, highest priority first.
+        :param capacity: Default per-lane capacity.
+        """
+        if not classes:
+            raise ValueError("At least one priority class is required")
+        self.lanes = [c if isinstance(c, PriorityClass) else PriorityClass(**c) for c in classes]
+        for lane in self.lanes:
+            if lane.capacity is None:
+                lane.capacity = capacity
+        self.lock = threading.Lock()
+        self.ready_event = threading.Condition(self.lock)
+        self.wait_histogram = None  # Optional metrics Histogram for time spent queued
+
+    def classify(self, telemetry, source=None):
+        """Return the lane a telemetry item belongs to."""
+        for lane in self.lanes[:-1]:
+            if lane.matches(telemetry, source):
+                return lane
+        return self.lanes[-1]
+
+    def qsize(self):
+        return sum(len(lane.queue) for lane in self.lanes)
+
+    def empty(self):
+        with self.lock:
+            now = time.monotonic()
+            for lane in self.lanes:
+                lane.refill(now)
+            return not any(lane.ready() for lane in self.lanes)
+
+    def full(self):
+        return False  # Each lane applies its own drop policy instead
+
+    def put(self, telemetry, block=True, timeout=None, source=None):
+        """
+        Queue a telemetry item in its lane.
+
+        Never blocks. A full lane drops according to its policy; with the
+        "spill" policy it raises Full so the relay can hand the item to disk.
+
+        :param source: Name of the input the item arrived on.
+        """
+        self.put_lane(self.classify(telemetry, source), telemetry)
+
+    def put_lane(self, lane, telemetry):
+        """Queue a telemetry item in a given lane, applying its drop policy like put()."""
+        with self.lock:
+            if len(lane.queue) >= lane.capacity:
+                if lane.drop == DROP_SPILL:
+                    raise Full
+                lane.stats["dropped"] += 1
+                if lane.drop == DROP_NEWEST:
+                    return
+                lane.queue.popleft()
+            lane.queue.append((time.monotonic(), telemetry))
+            lane.stats["queued"] += 1
+            self.ready_event.notify()
+
+    def put_nowait(self, telemetry, source=None):
+        self.put(telemetry, block=False, source=source)
+
+    def lane_named(self, name):
+        """Return the lane with a given name, or the default (last) lane if there is none."""
+        for lane in self.lanes:
+            if lane.name == name:
+                return lane
+        return self.lanes[-1]
+
+    def spill_room(self):
+        """Return True if a "spill" lane has room for telemetry replayed from disk."""
+        with self.lock:
+            return any(lane.drop == DROP_SPILL and len(lane.queue) < lane.capacity for lane in self.lanes)
+
+    def requeue(self, lane, telemetry):
+        """
+        Put telemetry replayed from the spill queue back into its lane.
+
+        Ignores the capacity (a lane can go over it by the items replayed at
+        once) so replayed data is never dropped a second time.
+
+        :return: True if the lane still has room afterwards.
+        """
+        with self.lock:
+            lane.queue.append((time.monotonic(), telemetry))
+            self.ready_event.notify()
+            return len(lane.queue) < lane.capacity
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the next item to send, waiting for one like Queue.get."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.ready_event:
+            while True:
+                now = time.monotonic()
+                lane = self.pick(now)
+                if lane is not None:
+                    break
+                if not block:
+                    raise Empty
+                remaining = None if deadline is None else deadline - now
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                wake = self.ready_in()
+                if wake is not None and (remaining is None or wake < remaining):
+                    remaining = wake
+                self.ready_event.wait(remaining)
+
+            enqueued, telemetry = lane.queue.popleft()
+            if lane.rate is not None:
+                lane.tokens -= 1
+            lane.stats["sent"] += 1
+            lane.stats["max_wait"] = max(lane.stats["max_wait"], now - enqueued)
+            if self.wait_histogram is not None:
+                self.wait_histogram.observe(now - enqueued)
+            return telemetry
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def pick(self, now):
+        """Choose the lane to send from next, or None if no lane may send now."""
+        ready = []
+        for lane in self.lanes:
+            lane.refill(now)
+            if lane.ready():
+                ready.append(lane)
+        if not ready:
+            return None
+
+        deadlines = [lane for lane in ready if lane.max_latency is not None]
+        if deadlines:
+            return min(deadlines, key=lambda lane: lane.queue[0][0] + lane.max_latency)
+
+        total = 0
+        for lane in ready:
+            lane.current += lane.weight
+            total += lane.weight
+        best = max(ready, key=lambda lane: lane.current)
+        best.current -= total
+        return best
+
+    def ready_in(self):
+        """Seconds until some queued item may be sent, or None if nothing is queued."""
+        waits = [wait for wait in (lane.ready_in() for lane in self.lanes) if wait is not None]
+        return min(waits) if waits else None
+
+    def get_stats(self):
+        """Return per-lane counters, current depth and the longest time an item waited to be sent."""
+        return {lane.name: dict(lane.stats, depth=len(lane.queue)) for lane in self.lanes}
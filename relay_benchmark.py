@@ -0,0 +1,320 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from framing import FRAMING_LENGTH, FRAMING_NEWLINE
+from retransmission import TelemetryRetransmission
+from telemetry_codec import COMPRESSION_ZLIB, ENCODING_DELTA, SequenceTracker, TelemetryStreamDecoder
+
+# Relay configurations the runner can compare: name -> (backend, constructor overrides)
+MODES = {
+    "threaded": ("threaded", {}),
+    "asyncio": ("asyncio", {}),
+    "passthrough": ("threaded", {"passthrough": True}),
+    "length_framing": ("threaded", {"framing": FRAMING_LENGTH}),
+    "columnar": ("threaded", {"buffer_backend": "columnar"}),
+    "spill": ("threaded", {"spill_dir": "{tmp}/spill"}),
+    "delta_zlib": ("threaded", {"uplink_encodings": (ENCODING_DELTA,), "uplink_compressions": (COMPRESSION_ZLIB,)}),
+    "acks": ("threaded", {"acks": True}),
+}
+DEFAULT_MODES = ("threaded", "asyncio", "passthrough")
+
+
+def make_telemetry(seq, size=0):
+    """
+    Build one README-schema telemetry packet.
+
+    :param seq: Sequence number, used by the sink to detect loss and duplicates.
+    :param size: Pad the encoded packet to about this many bytes (0 for no padding).
+    :return: Encoded packet bytes.
+    """
+    telemetry = {
+        "seq": seq,
+        "sent_at": time.time(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "position": {"x": round(5.0 + seq * 0.01, 2), "y": round(10.0 - seq * 0.01, 2)},
+        "heading": seq % 360,
+        "battery_level": round(80.5 - (seq % 1000) * 0.01, 2),
+        "ultrasound_distance": round(random.uniform(0.2, 4.0), 2),
+        "system_state": {
+            "cpu_usage": round(random.uniform(20.0, 60.0), 1),
+            "memory_available": 2500,
+            "disk_usage": 70.0,
+        },
+    }
+    data = json.dumps(telemetry).encode("utf-8")
+    if size > len(data) + 12:
+        telemetry["padding"] = "x" * (size - len(data) - 14)
+        data = json.dumps(telemetry).encode("utf-8")
+    return data
+
+
+class SimulatedRover:
+    """Sends README-schema telemetry over UDP at a fixed rate."""
+
+    def __init__(self, host, port, rate=1000, count=10000, size=0):
+        """
+        :param host: Relay address.
+        :param port: Relay rover port.
+        :param rate: Packets per second, or 0 to send as fast as possible.
+        :param count: Number of packets to send.
+        :param size: Approximate packet size in bytes (0 for the plain schema).
+        """
+        self.address = (host, port)
+        self.rate = rate
+        self.count = count
+        self.size = size
+        self.sent = 0
+        self.send_errors = 0
+        self.started = None
+        self.finished = None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def run(self):
+        self.started = time.perf_counter()
+        for seq in range(self.count):
+            if self.rate:
+                # Pace against the schedule rather than sleeping a fixed interval, so jitter does not accumulate
+                delay = self.started + seq / self.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                self.sock.sendto(make_telemetry(seq, self.size), self.address)
+                self.sent += 1
+            except OSError:
+                self.send_errors += 1
+        self.finished = time.perf_counter()
+        self.sock.close()
+
+
+class MissionControlSink:
+    """Mock Mission Control: accepts the relay's TCP uplink and timestamps every packet that arrives."""
+
+    def __init__(self, host="127.0.0.1", port=0, framing=FRAMING_NEWLINE):
+        """
+        :param host: Address to listen on.
+        :param port: Port to listen on (0 picks a free port; see .port).
+        :param framing: Framing the relay uses.
+        """
+        self.framing = framing
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((host, port))
+        self.server_socket.listen()
+        self.server_socket.settimeout(0.2)
+        self.port = self.server_socket.getsockname()[1]
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.tracker = SequenceTracker()  # Acknowledges relays that negotiate acks, across reconnects
+
+        self.latencies = []
+        self.seen = set()
+        self.received = 0
+        self.duplicates = 0
+        self.bytes_received = 0
+        self.first_arrival = None
+        self.last_arrival = None
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.server_socket.close()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                conn, _ = self.server_socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.serve(conn)
+
+    def serve(self, conn):
+        """Read one relay connection until it closes or the sink is stopped."""
+        decoder = TelemetryStreamDecoder(self.framing, tracker=self.tracker)
+        conn.settimeout(0.2)
+        with conn:
+            while not self.stop_event.is_set():
+                try:
+                    data = conn.recv(1 << 20)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+                if not data:
+                    return
+                now = time.time()
+                self.bytes_received += len(data)
+                records, reply = decoder.feed(data)
+                if reply:
+                    conn.sendall(reply)
+                for record in records:
+                    self.record(record, now)
+
+    def record(self, telemetry, arrived):
+        seq = telemetry.get("seq")
+        if seq is None:
+            return
+        if seq in self.seen:
+            self.duplicates += 1
+            return
+        self.seen.add(seq)
+        self.received += 1
+        self.latencies.append(arrived - telemetry["sent_at"])
+        if self.first_arrival is None:
+            self.first_arrival = arrived
+        self.last_arrival = arrived
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def to_ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def run_benchmark(mode, rate=1000, count=10000, size=0, drain_timeout=5.0, quiet=True):
+    """
+    Run one relay configuration against the simulated rover and mock Mission Control.
+
+    :param mode: Name of a configuration in MODES.
+    :param rate: Rover send rate in packets per second (0 for unpaced).
+    :param count: Packets to send.
+    :param size: Approximate packet size in bytes.
+    :param drain_timeout: Seconds to wait for stragglers after the rover stops sending.
+    :param quiet: Hide the relay's console output during the run.
+    :return: Result dict with throughput, loss and latency percentiles.
+    """
+    backend, overrides = MODES[mode]
+    relay_class = TelemetryRetransmission
+    if backend == "asyncio":
+        from async_relay import AsyncTelemetryRetransmission
+        relay_class = AsyncTelemetryRetransmission
+
+    workdir = tempfile.mkdtemp(prefix="coralcom_bench_")
+    kwargs = {key: value.format(tmp=workdir) if isinstance(value, str) else value for key, value in overrides.items()}
+    kwargs.setdefault("log_dir", os.path.join(workdir, "logs"))
+    sink = MissionControlSink(framing=kwargs.get("framing", FRAMING_NEWLINE))
+    relay = relay_class("127.0.0.1", 0, "127.0.0.1", sink.port, **kwargs)
+    rover = SimulatedRover("127.0.0.1", relay.rover_socket.getsockname()[1], rate=rate, count=count, size=size)
+
+    output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    with output:
+        try:
+            sink.start()
+            relay.start()
+            drive(relay, rover, sink, drain_timeout)
+        finally:
+            relay.stop()
+            sink.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+    return summarize(mode, relay, rover, sink)
+
+
+def drive(relay, rover, sink, drain_timeout):
+    """Send the rover's packets once the relay is connected, then wait for them to arrive."""
+    # Give the relay time to connect (and negotiate) before the clock starts
+    deadline = time.monotonic() + 5
+    while not relay.earth_link.connected_since and time.monotonic() < deadline:
+        time.sleep(0.01)
+    rover.run()
+    deadline = time.monotonic() + drain_timeout
+    while sink.received < rover.sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def summarize(mode, relay, rover, sink):
+    """Compute throughput, loss and latency percentiles for one run."""
+    latencies = sorted(sink.latencies)
+    send_duration = rover.finished - rover.started
+    ingest = relay.get_ingest_stats()
+    elapsed = (sink.last_arrival - sink.first_arrival) if sink.received > 1 else 0.0
+    return {
+        "mode": mode,
+        "sent": rover.sent,
+        "received": sink.received,
+        "lost": rover.sent - sink.received,
+        "loss_pct": round(100.0 * (rover.sent - sink.received) / rover.sent, 3) if rover.sent else 0.0,
+        # Where the loss happened: overflowing the relay's UDP receive buffer, or its in-memory send buffer
+        "rx_lost": rover.sent - ingest["packets"],
+        "buffer_dropped": ingest["dropped"],
+        "duplicates": sink.duplicates,
+        "offered_pps": round(rover.sent / send_duration, 1) if send_duration else None,
+        "throughput_pps": round(sink.received / elapsed, 1) if elapsed else None,
+        "uplink_bytes": sink.bytes_received,
+        "latency_ms": {
+            "p50": to_ms(percentile(latencies, 0.50)),
+            "p99": to_ms(percentile(latencies, 0.99)),
+            "p999": to_ms(percentile(latencies, 0.999)),
+            "max": to_ms(latencies[-1] if latencies else None),
+        },
+        "ingest": ingest,
+    }
+
+
+def format_row(result):
+    latency = result["latency_ms"]
+    return (f"{result['mode']:<16} {result['sent']:>8} {result['received']:>8} {result['loss_pct']:>7}% "
+            f"{result['rx_lost']:>8} {result['buffer_dropped']:>8} {result['throughput_pps'] or 0:>10} {latency['p50'] or 0:>9} {latency['p99'] or 0:>9} "
+            f"{latency['p999'] or 0:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CoralCom telemetry relay on localhost.")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(DEFAULT_MODES),
+                        help=f"Relay configurations to compare (default: {' '.join(DEFAULT_MODES)}).")
+    parser.add_argument("--rate", type=int, nargs="+", default=[1000],
+                        help="Rover send rates in packets per second; 0 sends unpaced (default: 1000).")
+    parser.add_argument("--count", type=int, default=10000, help="Packets per run (default: 10000).")
+    parser.add_argument("--size", type=int, default=0, help="Approximate packet size in bytes (default: schema only).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per mode and rate (default: 1).")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':<16} {'sent':>8} {'received':>8} {'loss':>8} {'rx lost':>8} {'buf drop':>8} {'pkt/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'p999 ms':>9}")
+    results = []
+    for rate in args.rate:
+        for mode in args.modes:
+            for _ in range(args.repeat):
+                result = run_benchmark(mode, rate=rate, count=args.count, size=args.size)
+                result["rate"] = rate
+                results.append(result)
+                print(format_row(result))
+
+    if args.output:
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "params": {"count": args.count, "size": args.size, "rates": args.rate, "repeat": args.repeat},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,79 @@ import socket
 import threading
 import time
 import json
-import logging
-from queue import Queue
+import warnings
+import weakref
+import collections
+import selectors
+from queue import Queue, Empty, Full
+
+from deadband import DeadbandFilter
+from earth_link import EarthConnection
+from fanout import POLICY_DROP_OLDEST, SubscriberHub
+from metrics import REGISTRY, MetricsServer, stage_histogram
+from framing import (
+    FRAMING_LENGTH,
+    FRAMING_NEWLINE,
+    TelemetryFrameDecoder,
+    frame_message,
+    send_buffers,
+)
+from detection_codec import decode_datagram, is_detection_datagram
+from spill_queue import SpillQueue
+from telemetry_codec import (COMPRESSION_ZLIB, COMPRESSION_ZSTD, ENCODING_JSON, UplinkEncoder, is_acked,
+                             read_first_frame)
+from telemetry_buffer import ColumnarTelemetryBuffer, RawTelemetry
+from priority import DROP_SPILL, PriorityTelemetryBuffer
+from telemetry_log import TelemetryLogWriter
+
+# Flags for batched ingest; MSG_TRUNC makes recv_into report the full datagram
+# length on Linux so oversized packets can be detected instead of silently cut.
+MSG_TRUNC = getattr(socket, "MSG_TRUNC", 0)
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+def encode_telemetry(telemetry):
+    """Return the wire payload for a telemetry item (already-encoded bytes pass through)."""
+    if isinstance(telemetry, RawTelemetry):
+        return telemetry.data
+    if isinstance(telemetry, (bytes, bytearray)):
+        return telemetry
+    return json.dumps(telemetry).encode('utf-8')
+
+
+def tag_source(telemetry, source):
+    """
+    Return telemetry labelled with the name of the input it arrived on.
+
+    Objects get a leading "source" key; anything else (e.g. a list of vision
+    detections) is wrapped as {"source": ..., "data": ...}. Raw datagrams are
+    spliced at the byte level so they still do not need to be parsed.
+    """
+    if isinstance(telemetry, RawTelemetry):
+        prefix = b'{"source":%s' % json.dumps(source).encode('utf-8')
+        data = telemetry.data.lstrip()
+        if data.startswith(b"{"):
+            body = data[1:].lstrip()
+            return RawTelemetry(prefix + (b"}" if body.startswith(b"}") else b"," + body))
+        return RawTelemetry(prefix + b',"data":' + data + b"}")
+    if isinstance(telemetry, dict):
+        return {"source": source, **telemetry}
+    return {"source": source, "data": telemetry}
+
 
 class TelemetryRetransmission:
-    def __init__(self, rover_ip, rover_port, earth_ip, earth_port, log_file="telemetry_coral.log", buffer_size=500, resend_interval=1):
+    def __init__(self, rover_ip, rover_port, earth_ip, earth_port, log_file=None, buffer_size=500, resend_interval=1,
+                 max_datagram_size=4096, recv_batch_size=64, socket_rcvbuf=1 << 20,
+                 framing=FRAMING_NEWLINE, send_batch_size=256,
+                 spill_dir=None, spill_max_bytes=256 * 1024 * 1024, spill_max_age=None,
+                 reconnect_max_delay=30.0, heartbeat_interval=5.0,
+                 passthrough=False, validate_every=100,
+                 log_dir="logs", log_compression="gzip", buffer_backend="queue",
+                 uplink_encodings=None, uplink_compressions=(COMPRESSION_ZSTD, COMPRESSION_ZLIB), negotiate_timeout=2.0,
+                 priority_classes=None, inputs=None, subscriber_ip="0.0.0.0", subscriber_port=None,
+                 subscriber_policy=POLICY_DROP_OLDEST, subscriber_queue_bytes=4 * 1024 * 1024,
+                 metrics_host="127.0.0.1", metrics_port=None, metrics_instance=None,
+                 deadbands=None, deadband_max_interval=1.0, deadband_adaptive=False, acks=False, ack_window=10000):
         """
         Initializes the retransmission system.
 
@@ -14,37 +82,232 @@ class TelemetryRetransmission:
         :param rover_port: Port to listen to the rover's telemetry.
         :param earth_ip: IP address to send data to Earth (Mission Control).
         :param earth_port: Port to send data to Earth (Mission Control).
-        :param log_file: File to log telemetry data.
+        :param log_file: Deprecated and ignored. Status messages are printed and telemetry is logged to log_dir.
         :param buffer_size: Number of telemetry updates to keep in memory.
-        :param resend_interval: Time in seconds to retry sending failed data.
+        :param resend_interval: Initial delay bound in seconds before reconnecting to Earth; doubles (with jitter) on each failure.
+        :param max_datagram_size: Largest telemetry datagram accepted, in bytes. Larger packets are counted as truncated and dropped.
+        :param recv_batch_size: Maximum number of datagrams drained from the socket per wakeup.
+        :param socket_rcvbuf: Kernel receive buffer size in bytes for the rover socket, to absorb bursts.
+        :param framing: Uplink message framing, FRAMING_NEWLINE or FRAMING_LENGTH.
+        :param send_batch_size: Maximum number of queued messages coalesced into one write to Earth.
+        :param spill_dir: Directory for the disk-backed spill queue used when the in-memory buffer is full, or None to drop the oldest telemetry instead.
+        :param spill_max_bytes: Disk budget for spilled telemetry; the oldest data is dropped beyond it.
+        :param spill_max_age: Seconds after which spilled telemetry is discarded instead of replayed, or None to keep it.
+        :param reconnect_max_delay: Cap in seconds on the reconnect backoff.
+        :param heartbeat_interval: Idle seconds after which an empty heartbeat frame is sent to Earth to detect dead peers, or None to disable.
+        :param passthrough: Forward datagram bytes unchanged instead of decoding and re-encoding the JSON.
+        :param validate_every: In passthrough mode, fully parse one datagram in this many and drop it if invalid (0 disables, 1 checks all).
+        :param log_dir: Directory for rotated, compressed telemetry log segments, or None to disable telemetry logging.
+        :param log_compression: Telemetry log compression: "gzip", "zstd" or "none".
+        :param uplink_encodings: Encodings to offer Mission Control on connect, e.g. ("delta", "json"), or None to send plain JSON without negotiating.
+        :param uplink_compressions: Stream compressions to offer when negotiating.
+        :param negotiate_timeout: Seconds to wait for Mission Control's answer before falling back to plain JSON.
+        :param priority_classes: List of priority lane definitions (PriorityClass keyword dicts), highest priority first; the last one is the default lane. Replaces buffer_backend with a scheduled, per-lane buffer.
+        :param inputs: Extra named UDP inputs as {name: (ip, port)}, e.g. other rovers or the vision detection stream. When given, every packet is tagged with a "source" field ("rover" for the main input).
+        :param subscriber_ip: Address to accept TCP subscribers on.
+        :param subscriber_port: Port to accept TCP subscribers (recorders, dashboards) on, or None to disable fan-out.
+        :param subscriber_policy: What to do when a subscriber falls behind: "drop_oldest", "drop_newest" or "disconnect".
+        :param subscriber_queue_bytes: Per-subscriber queue limit in bytes.
+        :param deadbands: Per-field dead-bands as {dotted path: minimum change}, e.g. deadband.DEFAULT_DEADBANDS. Packets where no such field changed by more than its dead-band are not sent to Earth (they are still logged and published to subscribers). None disables filtering.
+        :param deadband_max_interval: With dead-bands, still send at least one packet per input this often, in seconds.
+        :param deadband_adaptive: Widen the dead-bands automatically while the send buffer backs up.
+        :param acks: Offer sequence numbers and acknowledgements to Mission Control (implies uplink negotiation). When accepted, sent telemetry is kept until acknowledged and only the unacknowledged messages are resent after a reconnect.
+        :param ack_window: Maximum number of sent but unacknowledged messages; sending pauses when it is reached.
+        :param metrics_host: Address for the Prometheus metrics endpoint.
+        :param metrics_port: Port to serve /metrics on, or None to disable the endpoint (metrics are still collected).
+        :param metrics_instance: Value of the "relay" label on this relay's metrics, so several relays in one process
+                                 report separately (default: the rover input address, e.g. "0.0.0.0:5005").
+        :param buffer_backend: "queue" for a Queue of dicts, or "columnar" for a compact typed ring buffer suited to large buffer_size values. The columnar buffer stores decoded fields, so passthrough packets are parsed on ingest and re-encoded on send.
         """
         self.rover_ip = rover_ip
         self.rover_port = rover_port
         self.earth_ip = earth_ip
         self.earth_port = earth_port
+        if log_file is not None:
+            warnings.warn("log_file is deprecated and ignored; telemetry is logged to log_dir and status is printed",
+                          DeprecationWarning, stacklevel=2)
         self.log_file = log_file
         self.buffer_size = buffer_size
         self.resend_interval = resend_interval
+        self.max_datagram_size = max_datagram_size
+        self.recv_batch_size = recv_batch_size
+        if framing not in (FRAMING_NEWLINE, FRAMING_LENGTH):
+            raise ValueError(f"Unknown framing: {framing}")
+        self.framing = framing
+        self.send_batch_size = send_batch_size
 
-        self.telemetry_buffer = Queue(maxsize=self.buffer_size)
+        if priority_classes is not None:
+            buffer_backend = "priority"
+            self.telemetry_buffer = PriorityTelemetryBuffer(priority_classes, self.buffer_size)
+            if spill_dir is None and any(lane.drop == DROP_SPILL for lane in self.telemetry_buffer.lanes):
+                raise ValueError("The spill drop policy requires spill_dir")
+        elif buffer_backend == "columnar":
+            self.telemetry_buffer = ColumnarTelemetryBuffer(self.buffer_size)
+        elif buffer_backend == "queue":
+            self.telemetry_buffer = Queue(maxsize=self.buffer_size)
+        else:
+            raise ValueError(f"Unknown buffer backend: {buffer_backend}")
+        self.buffer_backend = buffer_backend
+        self.spill = None
+        self.spill_lock = threading.Lock()
+        if spill_dir is not None:
+            self.spill = SpillQueue(spill_dir, max_bytes=spill_max_bytes, max_age=spill_max_age)
         self.link_status = {"to_rover": True, "to_earth": True}
         self.stop_event = threading.Event()
 
-        # Set up logging
-        logging.basicConfig(level=logging.INFO, filename=self.log_file, filemode='a',
-                            format='%(asctime)s - %(message)s')
+        # Preallocated receive slab, one slot per datagram in a batch
+        self.recv_buffer = bytearray(self.max_datagram_size * self.recv_batch_size)
+        self.recv_views = [
+            memoryview(self.recv_buffer)[i * self.max_datagram_size:(i + 1) * self.max_datagram_size]
+            for i in range(self.recv_batch_size)
+        ]
+        self.ingest_stats = {
+            "packets": 0,
+            "batches": 0,
+            "truncated": 0,
+            "decode_errors": 0,
+            "dropped": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+        }
+
+        self.telemetry_log = None
+        if log_dir is not None:
+            self.telemetry_log = TelemetryLogWriter(log_dir, compression=log_compression, encoder=encode_telemetry)
+
+        self.passthrough = passthrough
+        self.validate_every = validate_every
+        self.passthrough_count = 0  # Per-datagram counter for validation sampling
+        self.deadband = None
+        if deadbands is not None:
+            self.deadband = DeadbandFilter(deadbands, max_interval=deadband_max_interval, adaptive=deadband_adaptive)
+
+        # UDP Sockets for receiving telemetry from the rover and any extra inputs
+        self.rover_socket = self.create_input_socket(self.rover_ip, self.rover_port, socket_rcvbuf)
+        self.input_sockets = [("rover", self.rover_socket)]
+        for name, (ip, port) in (inputs or {}).items():
+            self.input_sockets.append((name, self.create_input_socket(ip, port, socket_rcvbuf)))
+        self.tag_sources = bool(inputs)
+
+        # TCP Subscribers receiving a copy of the relayed telemetry
+        self.subscriber_hub = None
+        if subscriber_port is not None:
+            self.subscriber_hub = SubscriberHub(subscriber_ip, subscriber_port, policy=subscriber_policy,
+                                                max_queue_bytes=subscriber_queue_bytes)
+
+        # TCP Connection for sending telemetry to Earth
+        self.heartbeat_interval = heartbeat_interval
+        self.uplink = None
+        if uplink_encodings is not None:
+            self.uplink = UplinkEncoder(framing, uplink_encodings, uplink_compressions, acks=acks)
+        elif acks:
+            self.uplink = UplinkEncoder(framing, (ENCODING_JSON,), (), acks=True)
+        self.negotiate_timeout = negotiate_timeout
 
-        # UDP Socket for receiving telemetry from the rover
-        self.rover_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.rover_socket.bind((self.rover_ip, self.rover_port))
+        # Sliding window of sent messages awaiting Mission Control's acknowledgement
+        self.ack_window = ack_window
+        self.unacked = collections.deque()  # (seq, telemetry), oldest first
+        self.resend = collections.deque()  # Unacknowledged messages to send again on this connection
+        self.next_seq = 1
+        self.acked_seq = 0
+        self.ack_frames = None
+        self.ack_stats = {"acked": 0, "resent": 0, "sacked": 0}
+        self.earth_link = EarthConnection(self.earth_ip, self.earth_port, backoff_initial=self.resend_interval,
+                                          backoff_max=reconnect_max_delay)
+        self.earth_socket = None
+        self.last_earth_send = 0.0
+        self.reception_thread = None
+        self.retransmission_thread = None
 
-        # TCP Socket for sending telemetry to Earth
-        self.earth_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.earth_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Metrics, served in Prometheus format when metrics_port is set
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = MetricsServer(metrics_host, metrics_port)
+        if metrics_instance is None:
+            metrics_instance = "%s:%d" % self.rover_socket.getsockname()[:2]
+        self.metrics_instance = metrics_instance
+        self.register_metrics()
+
+    def register_metrics(self, registry=REGISTRY):
+        """
+        Register the relay's counters, gauges and stage histograms, labelled relay=metrics_instance.
+
+        The scrape-time callbacks only hold a weak reference to the relay, and
+        unregister_metrics() removes them all when the relay stops.
+        """
+        self.metrics_registry = registry
+        label = {"relay": self.metrics_instance}
+        relay = weakref.proxy(self)
+        stats = self.ingest_stats
+        registry.counter("coralcom_relay_packets_received", "Datagrams received from all inputs.",
+                         fn=lambda: stats["packets"], **label)
+        registry.counter("coralcom_relay_packets_truncated", "Datagrams dropped for exceeding max_datagram_size.",
+                         fn=lambda: stats["truncated"], **label)
+        registry.counter("coralcom_relay_decode_errors", "Datagrams dropped because they were not valid JSON.",
+                         fn=lambda: stats["decode_errors"], **label)
+        registry.counter("coralcom_relay_packets_dropped", "Packets discarded because the buffer was full.",
+                         fn=lambda: stats["dropped"], **label)
+        self.sent_packets = registry.counter("coralcom_relay_packets_sent", "Packets delivered to Mission Control.",
+                                             **label)
+        self.sent_bytes = registry.counter("coralcom_relay_bytes_sent", "Bytes written to Mission Control.", **label)
+        self.send_retries = registry.counter("coralcom_relay_send_retries",
+                                             "Batches that had to be resent after a failed write.", **label)
+        registry.counter("coralcom_relay_earth_connects", "Successful connections to Mission Control.",
+                         fn=lambda: relay.earth_link.connects, **label)
+        registry.gauge("coralcom_relay_earth_connected", "1 while connected to Mission Control.",
+                       fn=lambda: int(relay.earth_link.connected_since is not None), **label)
+        registry.gauge("coralcom_relay_buffer_depth", "Packets waiting in the in-memory buffer.",
+                       fn=self.telemetry_buffer.qsize, **label)
+        if self.spill is not None:
+            registry.gauge("coralcom_relay_spill_depth", "Packets waiting in the disk spill queue.",
+                           fn=lambda: len(relay.spill), **label)
+            registry.counter("coralcom_relay_spill_dropped", "Spilled packets dropped for disk budget or age.",
+                             fn=lambda: relay.spill.stats["dropped"] + relay.spill.stats["expired"], **label)
+        if self.telemetry_log is not None:
+            registry.counter("coralcom_relay_log_dropped", "Records the log writer could not keep up with.",
+                             fn=lambda: relay.telemetry_log.stats["dropped"], **label)
+        if self.deadband is not None:
+            registry.counter("coralcom_relay_deadband_suppressed", "Packets not sent because nothing changed enough.",
+                             fn=lambda: relay.deadband.stats["suppressed"], **label)
+            registry.counter("coralcom_relay_deadband_bytes_saved", "Uplink bytes saved by the dead-band filter.",
+                             fn=lambda: relay.deadband.stats["bytes_saved"], **label)
+        if self.uplink is not None and self.uplink.offer_acks:
+            registry.gauge("coralcom_relay_unacked", "Messages sent to Mission Control and not yet acknowledged.",
+                           fn=lambda: len(relay.unacked), **label)
+            registry.counter("coralcom_relay_resent", "Unacknowledged messages resent after a reconnect.",
+                             fn=lambda: relay.ack_stats["resent"], **label)
+        if self.subscriber_hub is not None:
+            registry.gauge("coralcom_relay_subscribers", "Connected TCP subscribers.",
+                           fn=lambda: len(relay.subscriber_hub.subscribers), **label)
+
+        self.recv_enqueue_seconds = stage_histogram("recv_enqueue", registry, **label)
+        self.enqueue_send_seconds = stage_histogram("enqueue_send", registry, **label)
+        # Enqueue times of the packets in a FIFO buffer, oldest first
+        self.enqueue_times = collections.deque()
+        if self.buffer_backend == "priority":
+            self.telemetry_buffer.wait_histogram = self.enqueue_send_seconds
+
+    def unregister_metrics(self):
+        """Remove this relay's metrics from the registry."""
+        self.metrics_registry.unregister(relay=self.metrics_instance)
+
+    @staticmethod
+    def create_input_socket(ip, port, rcvbuf):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        sock.bind((ip, port))
+        return sock
 
     def start(self):
         """Start the telemetry retransmission system."""
         print("Starting telemetry retransmission system...")
+        if self.telemetry_log is not None:
+            self.telemetry_log.start()
+        if self.subscriber_hub is not None:
+            self.subscriber_hub.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
 
         self.reception_thread = threading.Thread(target=self.receive_telemetry, daemon=True)
         self.retransmission_thread = threading.Thread(target=self.retransmit_telemetry, daemon=True)
@@ -56,68 +319,549 @@ class TelemetryRetransmission:
         """Stop the telemetry retransmission system."""
         print("Stopping telemetry retransmission system...")
         self.stop_event.set()
-        self.rover_socket.close()
-        self.earth_socket.close()
+        for _, sock in self.input_sockets:
+            sock.close()
+        if self.subscriber_hub is not None:
+            self.subscriber_hub.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.unregister_metrics()
+        self.close_earth_socket()
+        # Let the workers finish their current batch before the spill is closed under them
+        for thread in (self.reception_thread, self.retransmission_thread):
+            if thread is not None:
+                thread.join(timeout=2)
+        if self.spill is not None:
+            self.spill.close()
+        if self.telemetry_log is not None:
+            self.telemetry_log.stop()
 
     def receive_telemetry(self):
-        """Receive telemetry data from the rover."""
+        """Receive telemetry data from the rover and any extra inputs."""
         print("Listening for telemetry from the rover...")
+        selector = None
+        if len(self.input_sockets) > 1:
+            selector = selectors.DefaultSelector()
+            for name, sock in self.input_sockets:
+                selector.register(sock, selectors.EVENT_READ, name)
+
         while not self.stop_event.is_set():
             try:
-                data, addr = self.rover_socket.recvfrom(1024)
-                telemetry = json.loads(data.decode('utf-8'))
+                if selector is None:
+                    self.process_batch("rover", self.receive_batch(self.rover_socket))
+                else:
+                    for key, _ in selector.select(timeout=0.5):
+                        self.process_batch(key.data, self.receive_batch(key.fileobj, block=False))
+            except (socket.error, ValueError) as e:
+                if self.stop_event.is_set():
+                    break
+                print(f"Error receiving telemetry: {e}")
+                self.link_status["to_rover"] = False
 
-                # Add telemetry to buffer
-                if self.telemetry_buffer.full():
-                    self.telemetry_buffer.get()  # Discard the oldest telemetry
+    def process_batch(self, source, lengths):
+        """Decode and enqueue a received batch, then share it with subscribers."""
+        received = []
+        received_at = time.perf_counter()
+        for view, nbytes in zip(self.recv_views, lengths):
+            if nbytes > self.max_datagram_size:
+                self.ingest_stats["truncated"] += 1
+                continue
+            telemetry = self.handle_datagram(view[:nbytes], source)
+            if telemetry is not None:
+                received.append(telemetry)
+                self.recv_enqueue_seconds.observe(time.perf_counter() - received_at)
+        if lengths:
+            self.link_status["to_rover"] = True
+        self.publish(received)
 
-                self.telemetry_buffer.put(telemetry)
+    def publish(self, batch):
+        """Serialize a batch once and hand the same bytes to every subscriber."""
+        if batch and self.subscriber_hub is not None and self.subscriber_hub.has_subscribers():
+            buffers = []
+            for telemetry in batch:
+                buffers.extend(frame_message(encode_telemetry(telemetry), self.framing))
+            self.subscriber_hub.publish(b"".join(buffers))
 
-                # Log the telemetry
-                logging.info(f"Received telemetry: {telemetry}")
+    def receive_batch(self, sock, block=True):
+        """
+        Drain up to recv_batch_size datagrams into the preallocated buffers.
 
-                self.link_status["to_rover"] = True
-            except (socket.error, json.JSONDecodeError) as e:
-                print(f"Error receiving telemetry: {e}")
-                self.link_status["to_rover"] = False
+        Reads the first datagram (blocking unless block is False), then reads
+        without blocking until the socket is empty or the batch is full.
+
+        :param sock: UDP socket to read from.
+        :param block: Whether to wait for the first datagram.
+        :return: List of datagram lengths, one per filled buffer slot. A length
+                 larger than max_datagram_size means the datagram was truncated.
+        """
+        lengths = []
+        flags = MSG_TRUNC if block else MSG_TRUNC | MSG_DONTWAIT
+        while len(lengths) < self.recv_batch_size:
+            try:
+                nbytes = sock.recv_into(self.recv_views[len(lengths)], 0, flags)
+            except (BlockingIOError, InterruptedError):
+                break
+            lengths.append(nbytes)
+            flags = MSG_TRUNC | MSG_DONTWAIT
+        if not lengths:
+            return lengths
+
+        if not MSG_TRUNC:
+            # Without MSG_TRUNC a full buffer is the only hint of truncation
+            lengths = [n + 1 if n == self.max_datagram_size else n for n in lengths]
+
+        stats = self.ingest_stats
+        stats["packets"] += len(lengths)
+        stats["batches"] += 1
+        stats["last_batch_size"] = len(lengths)
+        stats["max_batch_size"] = max(stats["max_batch_size"], len(lengths))
+        return lengths
+
+    def handle_datagram(self, data, source="rover"):
+        """
+        Decode a single datagram and add it to the telemetry buffer.
+
+        :param data: Datagram bytes or a memoryview over them.
+        :param source: Name of the input the datagram arrived on.
+        :return: The decoded telemetry item (buffered unless the dead-band filter
+                 suppressed it), or None if the datagram was rejected.
+        """
+        try:
+            if is_detection_datagram(data):
+                # Binary vision results (detection_codec) are expanded to JSON for the uplink
+                telemetry = {"detection_frames": decode_datagram(data)}
+            elif self.passthrough:
+                payload = bytes(data)
+                if not payload:
+                    raise ValueError("empty datagram")
+                if self.framing == FRAMING_NEWLINE and b"\n" in payload:
+                    # Raw newlines can only be JSON whitespace, so blank them to keep framing intact
+                    payload = payload.replace(b"\n", b" ")
+                telemetry = RawTelemetry(payload)
+                self.passthrough_count += 1
+                if self.buffer_backend == "columnar" or \
+                        (self.validate_every and self.passthrough_count % self.validate_every == 0):
+                    # Sampled JSON check; the columnar buffer needs every packet decoded anyway
+                    telemetry.fields
+            else:
+                telemetry = json.loads(bytes(data))
+        except (UnicodeDecodeError, ValueError) as e:
+            print(f"Error decoding telemetry: {e}")
+            self.ingest_stats["decode_errors"] += 1
+            return None
+
+        if self.tag_sources:
+            telemetry = tag_source(telemetry, source)
+        if self.deadband is None or self.deadband_allows(telemetry, len(data), source):
+            self.enqueue(telemetry, source)
+        if self.telemetry_log is not None:
+            self.telemetry_log.record("rx", telemetry)
+        return telemetry
+
+    def deadband_allows(self, telemetry, nbytes, source):
+        """Run a packet through the dead-band filter, adjusting adaptive dead-bands to the current backlog."""
+        if self.deadband.adaptive:
+            if self.spill is not None and not self.spill.empty():
+                fill = 1.0
+            else:
+                fill = self.telemetry_buffer.qsize() / self.buffer_size
+            self.deadband.update_pressure(fill)
+        return self.deadband.allow(telemetry, nbytes, source)
+
+    def enqueue(self, telemetry, source="rover"):
+        """
+        Add telemetry to the buffer.
+
+        Without a spill queue, a full buffer discards its oldest item. With one,
+        telemetry goes to disk once the buffer is full and keeps going there
+        until the spilled backlog has been replayed, so order is preserved.
+        With priority lanes, each lane applies its own drop policy and only
+        lanes using the "spill" policy overflow to disk. Spilled records are
+        prefixed with their lane name so replay_spill() can return them to it.
+        """
+        if self.buffer_backend == "priority":
+            lane = self.telemetry_buffer.classify(telemetry, source)
+            try:
+                self.telemetry_buffer.put_lane(lane, telemetry)
+            except Full:
+                with self.spill_lock:
+                    self.spill.append(lane.name.encode('utf-8') + b"\n" + encode_telemetry(telemetry))
+            return
+
+        if self.spill is None:
+            if self.telemetry_buffer.full():
+                try:
+                    self.telemetry_buffer.get_nowait()  # Discard the oldest telemetry
+                    self.enqueue_times.popleft()
+                    self.ingest_stats["dropped"] += 1
+                except (Empty, IndexError):
+                    pass
+            self.enqueue_times.append(time.perf_counter())
+            self.telemetry_buffer.put(telemetry)
+            return
+
+        with self.spill_lock:
+            if self.spill.empty():
+                self.enqueue_times.append(time.perf_counter())
+                try:
+                    self.telemetry_buffer.put_nowait(telemetry)
+                    return
+                except Full:
+                    self.enqueue_times.pop()
+            self.spill.append(encode_telemetry(telemetry))
+
+    def has_pending(self):
+        """Return True if telemetry is waiting in memory, in the spill queue or to be resent."""
+        if self.resend or not self.telemetry_buffer.empty():
+            return True
+        if self.spill is None or self.spill.empty():
+            return False
+        # Spilled lane telemetry only counts once its lane can take it back
+        return self.buffer_backend != "priority" or self.telemetry_buffer.spill_room()
+
+    def replay_spill(self):
+        """
+        Move spilled priority-lane telemetry back into the lanes it overflowed from.
+
+        Records are replayed in order while spill lanes have room, stopping
+        once a lane is full again, so they go out under their lane's priority
+        and rate limit instead of bypassing the scheduler.
+        """
+        with self.spill_lock:
+            while not self.spill.empty() and self.telemetry_buffer.spill_room():
+                records = self.spill.pop_batch(1)
+                if not records:
+                    break
+                name, separator, payload = bytes(records[0]).partition(b"\n")
+                if not separator:
+                    name, payload = b"", bytes(records[0])  # Spilled without lanes; use the default lane
+                lane = self.telemetry_buffer.lane_named(name.decode('utf-8', 'replace'))
+                if not self.telemetry_buffer.requeue(lane, payload):
+                    break
+
+    def window_full(self):
+        """Return True if sending must wait for acknowledgements."""
+        return self.uplink is not None and self.uplink.acks and not self.resend and \
+            len(self.unacked) >= self.ack_window
 
     def retransmit_telemetry(self):
         """Retransmit telemetry data to Earth."""
         print("Retransmitting telemetry to Earth...")
-        try:
-            self.earth_socket.connect((self.earth_ip, self.earth_port))
-            while not self.stop_event.is_set():
-                if not self.telemetry_buffer.empty():
-                    telemetry = self.telemetry_buffer.get()
+        batch = []
+        while not self.stop_event.is_set():
+            if self.earth_socket is None:
+                self.earth_socket = self.earth_link.connect(self.stop_event)
+                if self.earth_socket is None:
+                    break
+                if self.uplink is not None:
                     try:
-                        self.earth_socket.sendall(json.dumps(telemetry).encode('utf-8'))
-                        logging.info(f"Sent telemetry to Earth: {telemetry}")
-                        self.link_status["to_earth"] = True
+                        self.negotiate_uplink()
                     except socket.error as e:
-                        print(f"Error sending telemetry to Earth: {e}")
-                        self.link_status["to_earth"] = False
+                        print(f"Error negotiating with Earth: {e}")
+                        self.handle_earth_failure(e)
+                        continue
+                self.link_status["to_earth"] = True
+                self.last_earth_send = time.monotonic()
 
-                        # Retry logic
-                        time.sleep(self.resend_interval)
-                        self.telemetry_buffer.put(telemetry)  # Requeue telemetry for retry
-                else:
-                    time.sleep(0.1)  # Prevent busy waiting
-        except socket.error as e:
-            print(f"Error connecting to Earth socket: {e}")
-            self.link_status["to_earth"] = False
+            acking = self.uplink is not None and self.uplink.acks
+            try:
+                if not batch:
+                    batch = self.next_window_batch() if acking else self.take_resend() or self.next_batch()
+                    if not batch:
+                        self.check_earth_idle()
+                        continue
+                nbytes = self.send_batch(batch)
+                self.log_sent(batch, nbytes)
+                batch = []
+                self.last_earth_send = time.monotonic()
+            except socket.error as e:
+                # Keep the batch and resend it first after reconnecting, so
+                # ordering is preserved across the outage. With acknowledgements
+                # the batch is already in the window, which is resent instead.
+                print(f"Error sending telemetry to Earth: {e}")
+                self.send_retries.inc()
+                self.handle_earth_failure(e)
+                if acking:
+                    batch = []
+
+    def negotiate_uplink(self):
+        """Offer uplink encodings to Earth, wait for the answer and confirm the choice."""
+        send_buffers(self.earth_socket, self.uplink.hello())
+        answer, buffer = None, b""
+        deadline = time.monotonic() + self.negotiate_timeout
+        try:
+            while answer is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.earth_socket.settimeout(remaining)
+                data = self.earth_socket.recv(4096)
+                if not data:
+                    raise ConnectionResetError("closed by peer during negotiation")
+                answer, buffer = read_first_frame(buffer + data, self.framing)
+        except socket.timeout:
+            pass
+        finally:
+            self.earth_socket.settimeout(None)
+        send_buffers(self.earth_socket, self.uplink.accept(answer))
+        print(f"Earth uplink: encoding={self.uplink.encoding}, compression={self.uplink.compression}")
+        self.start_window(buffer)
+
+    def start_window(self, buffered):
+        """
+        Prepare the acknowledgement window for a freshly negotiated connection.
+
+        Drops whatever Mission Control reported as already received and queues
+        the rest of the window to be resent before any new telemetry.
+
+        :param buffered: Bytes read after the answer frame (the start of the ACK stream).
+        """
+        self.resend = collections.deque(self.unacked)
+        if not self.uplink.acks:
+            self.unacked.clear()
+            return
+        self.ack_frames = TelemetryFrameDecoder(self.framing)
+        self.handle_ack({"ack": self.uplink.peer_ack, "sack": self.uplink.peer_sack})
+        self.resend = collections.deque(self.unacked)
+        self.ack_stats["resent"] += len(self.resend)
+        if self.resend:
+            print(f"Resending {len(self.resend)} unacknowledged messages")
+        self.read_ack_data(bytes(buffered))
+
+    def take_resend(self):
+        """Return leftover window messages as a plain batch when the new connection has no acknowledgements."""
+        batch = [telemetry for _, telemetry in self.resend]
+        self.resend.clear()
+        return batch
+
+    def next_window_batch(self, timeout=0.5):
+        """
+        Return the next batch of (seq, telemetry) entries when acknowledgements are on.
+
+        Messages left unacknowledged by the previous connection go first. New
+        telemetry is stamped with the next sequence number as it enters the
+        window; when ack_window messages are outstanding, waits for ACKs instead.
+        """
+        self.read_acks(0)
+        batch = []
+        while self.resend and len(batch) < self.send_batch_size:
+            entry = self.resend.popleft()
+            if entry[0] > self.acked_seq:
+                batch.append(entry)
+        if batch:
+            return batch
+
+        room = self.ack_window - len(self.unacked)
+        if room <= 0:
+            self.read_acks(timeout)
+            return batch
+        for telemetry in self.next_batch(timeout, limit=min(room, self.send_batch_size)):
+            entry = (self.next_seq, telemetry)
+            self.next_seq += 1
+            self.unacked.append(entry)
+            batch.append(entry)
+        return batch
+
+    def read_acks(self, timeout):
+        """
+        Read and apply acknowledgements from Earth.
+
+        :param timeout: Seconds to wait for data; 0 only takes what has already arrived.
+        """
+        sock = self.earth_socket
+        try:
+            if timeout:
+                sock.settimeout(timeout)
+                data = sock.recv(65536)
+            else:
+                data = sock.recv(65536, MSG_DONTWAIT)
+        except (socket.timeout, BlockingIOError, InterruptedError):
+            return
+        finally:
+            if timeout:
+                sock.settimeout(None)
+        if not data:
+            raise ConnectionResetError("closed by peer")
+        self.read_ack_data(data)
+
+    def read_ack_data(self, data):
+        for payload in self.ack_frames.feed(data):
+            try:
+                self.handle_ack(json.loads(payload))
+            except (ValueError, AttributeError):
+                print(f"Ignoring malformed acknowledgement: {payload[:100]!r}")
+
+    def handle_ack(self, message):
+        """Remove acknowledged messages (cumulative ACK plus selective ACK ranges) from the window."""
+        ack = message.get("ack", 0)
+        sack = message.get("sack") or []
+        acked = 0
+        while self.unacked and self.unacked[0][0] <= ack:
+            self.unacked.popleft()
+            acked += 1
+        if sack:
+            remaining = collections.deque(entry for entry in self.unacked if not is_acked(entry[0], ack, sack))
+            self.ack_stats["sacked"] += len(self.unacked) - len(remaining)
+            acked += len(self.unacked) - len(remaining)
+            self.unacked = remaining
+        self.acked_seq = max(self.acked_seq, ack)
+        self.ack_stats["acked"] += acked
+
+    def heartbeat_buffers(self):
+        """Return the buffers for an empty heartbeat frame on the current uplink."""
+        if self.uplink is not None:
+            return self.uplink.encode_batch([b""])
+        return frame_message(b"", self.framing)
+
+    def log_sent(self, batch, nbytes):
+        """Count a sent batch and hand it to the telemetry log writer."""
+        if self.uplink is not None and self.uplink.acks:
+            batch = [telemetry for _, telemetry in batch]  # (seq, telemetry) window entries
+        self.sent_packets.inc(len(batch))
+        self.sent_bytes.inc(nbytes)
+        if self.telemetry_log is not None:
+            for telemetry in batch:
+                self.telemetry_log.record("tx", telemetry)
+
+    def check_earth_idle(self):
+        """Detect a closed peer and send a heartbeat when the uplink has been idle."""
+        if self.earth_socket is None:
+            return
+        if self.earth_link.peer_closed(self.earth_socket):
+            print("Earth closed the connection")
+            self.handle_earth_failure(ConnectionResetError("closed by peer"))
+            return
+        if self.heartbeat_interval and time.monotonic() - self.last_earth_send >= self.heartbeat_interval:
+            try:
+                send_buffers(self.earth_socket, self.heartbeat_buffers())
+                self.last_earth_send = time.monotonic()
+            except socket.error as e:
+                print(f"Error sending heartbeat to Earth: {e}")
+                self.handle_earth_failure(e)
+
+    def handle_earth_failure(self, error):
+        """Drop the broken Earth connection so the sender reconnects."""
+        self.link_status["to_earth"] = False
+        self.earth_link.mark_disconnected(error)
+        self.close_earth_socket()
+
+    def close_earth_socket(self):
+        if self.earth_socket is not None:
+            self.earth_socket.close()
+            self.earth_socket = None
+
+    def next_batch(self, timeout=0.5, limit=None):
+        """
+        Block until telemetry is available, then drain up to send_batch_size items.
+
+        :param timeout: Seconds to wait for the first item before returning so
+                        the stop event can be checked.
+        :param limit: Take at most this many items (default send_batch_size).
+        :return: List of telemetry items, empty if none arrived in time.
+        """
+        limit = limit or self.send_batch_size
+        if self.spill is not None and self.buffer_backend == "priority":
+            self.replay_spill()
+        # Spilled telemetry is always newer than what is in memory, so drain
+        # memory first and only block when there is no spilled backlog either.
+        # Priority lanes take their spilled telemetry back instead.
+        block = self.spill is None or self.spill.empty() or self.buffer_backend == "priority"
+        try:
+            batch = [self.telemetry_buffer.get(block=block, timeout=timeout)]
+        except Empty:
+            batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.telemetry_buffer.get_nowait())
+            except Empty:
+                break
+        if batch and self.buffer_backend != "priority":
+            now = time.perf_counter()
+            for _ in batch:
+                try:
+                    self.enqueue_send_seconds.observe(now - self.enqueue_times.popleft())
+                except IndexError:
+                    break
+        if self.spill is not None and self.buffer_backend != "priority" and len(batch) < limit and \
+                self.telemetry_buffer.empty():
+            batch.extend(self.spill.pop_batch(limit - len(batch)))
+        return batch
+
+    def encode_batch(self, batch):
+        """Return the list of framed buffers for a batch of telemetry (or of (seq, telemetry) window entries)."""
+        if self.uplink is not None:
+            if self.uplink.acks:
+                seqs = [seq for seq, _ in batch]
+                return self.uplink.encode_items([telemetry for _, telemetry in batch], encode_telemetry, seqs)
+            return self.uplink.encode_items(batch, encode_telemetry)
+        buffers = []
+        for telemetry in batch:
+            buffers.extend(frame_message(encode_telemetry(telemetry), self.framing))
+        return buffers
+
+    def send_batch(self, batch):
+        """
+        Frame a batch of telemetry and write it to Earth in a single vectored send.
+
+        :return: Number of bytes written.
+        """
+        buffers = self.encode_batch(batch)
+        send_buffers(self.earth_socket, buffers)
+        return sum(len(buffer) for buffer in buffers)
 
     def get_link_status(self):
-        """Return the current link statuses."""
-        return self.link_status
+        """Return the current link statuses, with Earth connection uptime and reconnect counts."""
+        return dict(self.link_status, **self.earth_link.status())
+
+    def get_ingest_stats(self):
+        """Return a snapshot of the ingest counters (packets, batches, truncated, decode errors)."""
+        return dict(self.ingest_stats)
+
+    def get_log_stats(self):
+        """Return telemetry log writer counters (records written, dropped), or None when disabled."""
+        return self.telemetry_log.get_stats() if self.telemetry_log is not None else None
+
+    def get_ack_stats(self):
+        """Return acknowledgement window counters: last sequence number sent, highest ACK, window size and resends."""
+        return dict(self.ack_stats, sent_seq=self.next_seq - 1, acked_seq=self.acked_seq, unacked=len(self.unacked))
+
+    def get_deadband_stats(self):
+        """Return dead-band filter counters including bytes saved, or None when filtering is disabled."""
+        return self.deadband.get_stats() if self.deadband is not None else None
+
+    def get_priority_stats(self):
+        """Return per-lane counters, or None when priority lanes are not configured."""
+        return self.telemetry_buffer.get_stats() if self.buffer_backend == "priority" else None
+
+    def get_subscriber_stats(self):
+        """Return per-subscriber counters, or None when fan-out is disabled."""
+        return self.subscriber_hub.get_stats() if self.subscriber_hub is not None else None
+
+    def get_spill_stats(self):
+        """Return spill queue counters, or None when spilling is disabled."""
+        return self.spill.get_stats() if self.spill is not None else None
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Relay rover telemetry to Mission Control.")
+    parser.add_argument("--backend", choices=["threaded", "asyncio"], default="threaded",
+                        help="Relay engine: two worker threads or a single asyncio event loop, which sustains a lower "
+                             "ingest rate (default: threaded).")
+    args = parser.parse_args()
+
     # Define configuration
     ROVER_IP = "127.0.0.1"
     ROVER_PORT = 50055
     EARTH_IP = "127.0.0.1"  # Replace with the actual mission control IP
     EARTH_PORT = 60066
 
-    telemetry_retransmission = TelemetryRetransmission(
+    relay_class = TelemetryRetransmission
+    if args.backend == "asyncio":
+        from async_relay import AsyncTelemetryRetransmission
+        relay_class = AsyncTelemetryRetransmission
+
+    telemetry_retransmission = relay_class(
         rover_ip=ROVER_IP,
         rover_port=ROVER_PORT,
         earth_ip=EARTH_IP,
@@ -0,0 +1,173 @@
+import collections
+import glob
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+from metrics import REGISTRY
+
+SNAPSHOTS_WRITTEN = REGISTRY.counter("coralcom_vision_snapshots", "Debug snapshots written to disk.")
+SNAPSHOTS_DROPPED = REGISTRY.counter("coralcom_vision_snapshots_dropped",
+                                     "Snapshots skipped because the writer was still busy.")
+
+
+class SnapshotWriter:
+    """
+    Saves a sample of vision frames to a capped directory from a background thread.
+
+    offer() only decides whether a frame is wanted and hands it over; JPEG
+    encoding, annotation and disk writes happen on the writer thread. A frame
+    is saved when any enabled rule picks it:
+
+    - every_frames / every_seconds: periodic sampling;
+    - detections: every frame that has at least one detection;
+    - event_labels: an event starts on a frame where a label in the set
+      (or any label if it is empty) is detected and was not in the previous
+      frame; that frame is saved with the pre_event frames before it and the
+      post_event frames after it. An object that stays in view does not
+      trigger again until it has left the frame.
+
+    Only the newest max_files snapshots are kept, like the old
+    model_test_edgetpu.py output_images/ directory.
+    """
+
+    def __init__(self, output_dir="output_images", every_frames=None, every_seconds=None, detections=False,
+                 event_labels=None, pre_event=5, post_event=5, max_files=200, annotate=None, queue_size=16,
+                 labels=None):
+        """
+        Args:
+            output_dir (str): Directory the snapshots are written to.
+            every_frames (int): Save one frame in this many, or None.
+            every_seconds (float): Save one frame this often, or None.
+            detections (bool): Save every frame that has detections.
+            event_labels: Labels or class IDs that make a frame an event (empty means any detection), or None to disable.
+            pre_event (int): Frames before an event to save with it.
+            post_event (int): Frames after an event to save with it.
+            max_files (int): Oldest snapshots are deleted beyond this many.
+            annotate: Optional callable(image, detections) drawing the detections on a copy before saving.
+            queue_size (int): Frames waiting to be written before new snapshots are skipped.
+            labels (dict): Class ID -> label, to match event_labels given as names.
+
+        Raises:
+            ValueError: If no rule is enabled, since nothing would ever be saved.
+        """
+        if not (every_frames or every_seconds is not None or detections or event_labels is not None):
+            raise ValueError("SnapshotWriter needs every_frames, every_seconds, detections or event_labels")
+        self.output_dir = output_dir
+        self.every_frames = every_frames
+        self.every_seconds = every_seconds
+        self.detections = detections
+        # Event labels as class IDs, since detections arrive as DETECTION_DTYPE arrays
+        self.event_classes = None
+        if event_labels is not None:
+            names = {name: class_id for class_id, name in (labels or {}).items()}
+            self.event_classes = {names[label] if label in names else int(label) for label in event_labels}
+        self.post_event = post_event
+        self.max_files = max_files
+        self.annotate = annotate
+
+        self.recent = collections.deque(maxlen=pre_event)  # Frames kept for the next event
+        self.present = set()  # Event classes detected in the previous frame
+        self.post_remaining = 0
+        self.frames_seen = 0
+        self.last_saved_at = None
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.files = collections.deque(sorted(glob.glob(os.path.join(output_dir, "frame_*.jpg"))))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {"written": 0, "dropped": 0, "deleted": 0, "errors": 0}
+        self.thread = threading.Thread(target=self.run, name="vision-snapshots", daemon=True)
+        self.thread.start()
+
+    def offer(self, frame):
+        """
+        Consider a published frame for saving. Cheap enough to call for every frame.
+
+        Args:
+            frame: Pipeline Frame with frame_id, captured_at, image and detections.
+        """
+        self.frames_seen += 1
+        if self.is_event(frame):
+            while self.recent:
+                self.submit(self.recent.popleft())
+            self.post_remaining = self.post_event
+            self.submit(frame)
+        elif self.post_remaining > 0:
+            self.post_remaining -= 1
+            self.submit(frame)
+        elif self.is_sampled(frame):
+            self.submit(frame)
+        elif self.event_classes is not None:
+            self.recent.append(frame)
+
+    def is_event(self, frame):
+        """Return True if an event label appears that was absent from the previous frame."""
+        if self.event_classes is None:
+            return False
+        present = set(frame.detections["class_id"].tolist())
+        if self.event_classes:
+            present &= self.event_classes
+        onset = bool(present - self.present)
+        self.present = present
+        return onset
+
+    def is_sampled(self, frame):
+        if self.detections and len(frame.detections):
+            return True
+        if self.every_frames and self.frames_seen % self.every_frames == 0:
+            return True
+        if self.every_seconds is not None:
+            now = time.monotonic()
+            if self.last_saved_at is None or now - self.last_saved_at >= self.every_seconds:
+                self.last_saved_at = now
+                return True
+        return False
+
+    def submit(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            SNAPSHOTS_DROPPED.inc()
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            try:
+                self.write(frame)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Failed to save snapshot: {e}")
+
+    def write(self, frame):
+        image = frame.image
+        if self.annotate is not None and len(frame.detections):
+            image = self.annotate(image.copy(), frame.detections)
+        captured = datetime.fromtimestamp(frame.captured_at)
+        path = os.path.join(self.output_dir, f"frame_{captured:%Y%m%d_%H%M%S}_{frame.frame_id:06d}.jpg")
+        if not cv2.imwrite(path, image):
+            raise OSError(f"cv2.imwrite could not write {path}")
+        self.files.append(path)
+        self.stats["written"] += 1
+        SNAPSHOTS_WRITTEN.inc()
+        while len(self.files) > self.max_files:
+            try:
+                os.remove(self.files.popleft())
+                self.stats["deleted"] += 1
+            except OSError:
+                pass
+
+    def close(self):
+        """Write the snapshots still queued, then stop the writer thread."""
+        self.queue.put(None)
+        self.thread.join(timeout=10)
+
+    def get_stats(self):
+        """Return counts of snapshots written, skipped while busy, rotated out and failed."""
+        return dict(self.stats, queued=self.queue.qsize())
@@ -0,0 +1,240 @@
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Record layout: payload length, enqueue timestamp, payload bytes.
+# A zero length marks the end of the written part of a segment.
+RECORD_HEADER = struct.Struct("!Id")
+LENGTH_FIELD = struct.Struct("!I")
+# Read cursor layout: segment id, offset within that segment
+CURSOR = struct.Struct("!QQ")
+
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor"
+
+
+class SpillQueue:
+    """
+    Persistent FIFO of telemetry payloads backed by memory-mapped segment files.
+
+    Records are appended to fixed-size segments in a directory and read back in
+    order. At most two segments (the one being written and the one being read)
+    are mapped at any time, so memory use does not grow with the backlog. The
+    read position lives in a small memory-mapped cursor file, which lets a
+    restarted relay resume replay where it stopped.
+    """
+
+    def __init__(self, directory, segment_size=4 * 1024 * 1024, max_bytes=256 * 1024 * 1024, max_age=None):
+        """
+        Open or create a spill queue.
+
+        :param directory: Directory holding the segment files and cursor.
+        :param segment_size: Size of each segment file in bytes.
+        :param max_bytes: Disk budget. The oldest segments are dropped once it is exceeded.
+        :param max_age: Seconds after which spilled records are discarded instead of replayed, or None to keep them.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max(2, max_bytes // segment_size)
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.stats = {"spilled": 0, "replayed": 0, "dropped": 0, "expired": 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        self.segment_last_ts = {}
+        self.maps = {}
+
+        cursor_path = os.path.join(self.directory, CURSOR_FILE)
+        with open(cursor_path, "ab") as f:
+            if f.tell() < CURSOR.size:
+                f.truncate(CURSOR.size)
+        self.cursor_file = open(cursor_path, "r+b")
+        self.cursor_map = mmap.mmap(self.cursor_file.fileno(), CURSOR.size)
+        self.read_segment, self.read_offset = CURSOR.unpack_from(self.cursor_map)
+
+        if not self.segments:
+            self.segments.append(0)
+        for seg in [seg for seg in self.segments if seg < self.read_segment]:
+            os.remove(self.segment_path(seg))  # Fully replayed before a restart
+        self.segments = [seg for seg in self.segments if seg >= self.read_segment] or [self.read_segment]
+        if self.read_segment not in self.segments:
+            self.read_segment, self.read_offset = self.segments[0], 0
+
+        # Recover write position and pending count by walking record headers
+        self.pending = 0
+        for seg in self.segments:
+            start = self.read_offset if seg == self.read_segment else 0
+            count, end, last_ts = self.scan_segment(seg, start)
+            self.pending += count
+            self.segment_last_ts[seg] = last_ts
+        self.write_segment = self.segments[-1]
+        self.write_offset = end
+        self.save_cursor()
+
+    def segment_path(self, seg):
+        return os.path.join(self.directory, f"{seg:012d}{SEGMENT_SUFFIX}")
+
+    def map_segment(self, seg):
+        """Return the mmap for a segment, creating the file if needed."""
+        if seg not in self.maps:
+            path = self.segment_path(seg)
+            with open(path, "ab") as f:
+                if f.tell() < self.segment_size:
+                    f.truncate(self.segment_size)
+            with open(path, "r+b") as f:
+                self.maps[seg] = mmap.mmap(f.fileno(), self.segment_size)
+        return self.maps[seg]
+
+    def unmap_segment(self, seg):
+        m = self.maps.pop(seg, None)
+        if m is not None:
+            m.close()
+
+    def scan_segment(self, seg, offset):
+        """
+        Walk record headers in a segment.
+
+        :return: Tuple of (record count from offset, end offset, last record timestamp).
+        """
+        m = self.map_segment(seg)
+        count, last_ts = 0, 0.0
+        while offset + RECORD_HEADER.size <= self.segment_size:
+            length, ts = RECORD_HEADER.unpack_from(m, offset)
+            if length == 0 or offset + RECORD_HEADER.size + length > self.segment_size:
+                break
+            count += 1
+            last_ts = ts
+            offset += RECORD_HEADER.size + length
+        if seg not in (self.read_segment, self.segments[-1]):
+            self.unmap_segment(seg)
+        return count, offset, last_ts
+
+    def save_cursor(self):
+        CURSOR.pack_into(self.cursor_map, 0, self.read_segment, self.read_offset)
+
+    def append(self, payload):
+        """
+        Append one payload to the end of the queue.
+
+        :param payload: Non-empty bytes to store.
+        """
+        size = RECORD_HEADER.size + len(payload)
+        if not payload or size > self.segment_size:
+            raise ValueError(f"Payload of {len(payload)} bytes does not fit a {self.segment_size} byte segment")
+
+        now = time.time()
+        with self.lock:
+            if self.write_offset + size > self.segment_size:
+                self.roll_segment()
+            m = self.map_segment(self.write_segment)
+            # Write timestamp and payload first and the length last, so a torn
+            # write leaves a zero length that recovery treats as end of data.
+            start = self.write_offset
+            struct.pack_into("!d", m, start + LENGTH_FIELD.size, now)
+            m[start + RECORD_HEADER.size:start + size] = payload
+            LENGTH_FIELD.pack_into(m, start, len(payload))
+            self.write_offset += size
+            self.segment_last_ts[self.write_segment] = now
+            self.pending += 1
+            self.stats["spilled"] += 1
+
+    def roll_segment(self):
+        """Seal the current write segment and start a new one, enforcing the size cap."""
+        if self.write_segment != self.read_segment:
+            self.maps[self.write_segment].flush()
+            self.unmap_segment(self.write_segment)
+        self.write_segment += 1
+        self.write_offset = 0
+        self.segments.append(self.write_segment)
+        while len(self.segments) > self.max_segments:
+            self.drop_oldest_segment("dropped")
+
+    def drop_oldest_segment(self, reason):
+        """Delete the oldest segment, counting its unread records under reason."""
+        seg = self.segments[0]
+        start = self.read_offset if seg == self.read_segment else 0
+        count, _, _ = self.scan_segment(seg, start)
+        self.unmap_segment(seg)
+        os.remove(self.segment_path(seg))
+        self.segments.pop(0)
+        self.segment_last_ts.pop(seg, None)
+        self.pending -= count
+        self.stats[reason] += count
+        self.read_segment, self.read_offset = self.segments[0], 0
+        self.save_cursor()
+
+    def expire(self):
+        """Drop sealed segments whose newest record is older than max_age."""
+        if self.max_age is None:
+            return
+        cutoff = time.time() - self.max_age
+        while len(self.segments) > 1 and self.segment_last_ts.get(self.segments[0], 0.0) < cutoff:
+            self.drop_oldest_segment("expired")
+
+    def pop_batch(self, max_items):
+        """
+        Remove and return up to max_items payloads in FIFO order.
+
+        :param max_items: Maximum number of payloads to return.
+        :return: List of payload bytes, empty if the queue is empty.
+        """
+        batch = []
+        with self.lock:
+            self.expire()
+            cutoff = time.time() - self.max_age if self.max_age is not None else None
+            while len(batch) < max_items and self.pending:
+                m = self.map_segment(self.read_segment)
+                length, ts = (0, 0.0)
+                if self.read_offset + RECORD_HEADER.size <= self.segment_size:
+                    length, ts = RECORD_HEADER.unpack_from(m, self.read_offset)
+                if length == 0 or self.read_offset + RECORD_HEADER.size + length > self.segment_size:
+                    # End of a sealed segment: move on to the next one
+                    self.advance_segment()
+                    continue
+
+                start = self.read_offset + RECORD_HEADER.size
+                self.read_offset = start + length
+                self.pending -= 1
+                if cutoff is not None and ts < cutoff:
+                    self.stats["expired"] += 1
+                    continue
+                batch.append(m[start:self.read_offset])
+            self.stats["replayed"] += len(batch)
+            while not self.pending and self.read_segment != self.write_segment:
+                self.advance_segment()
+            self.save_cursor()
+        return batch
+
+    def advance_segment(self):
+        """Delete the fully read segment and point the cursor at the next one."""
+        seg = self.segments.pop(0)
+        self.unmap_segment(seg)
+        os.remove(self.segment_path(seg))
+        self.segment_last_ts.pop(seg, None)
+        self.read_segment, self.read_offset = self.segments[0], 0
+
+    def empty(self):
+        return self.pending == 0
+
+    def __len__(self):
+        return self.pending
+
+    def get_stats(self):
+        """Return counters for spilled, replayed, dropped (size cap) and expired (age cap) records."""
+        with self.lock:
+            return dict(self.stats, pending=self.pending, segments=len(self.segments))
+
+    def close(self):
+        """Flush and unmap all segments."""
+        with self.lock:
+            self.save_cursor()
+            self.cursor_map.flush()
+            for seg in list(self.maps):
+                self.maps[seg].flush()
+                self.unmap_segment(seg)
+            self.cursor_map.close()
+            self.cursor_file.close()
@@ -0,0 +1,262 @@
+import argparse
+import array
+import csv
+import glob
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+
+from telemetry_filter import OPERATORS, conditions_match, parse_where
+from telemetry_log import COMPRESSION_SUFFIXES, INDEX_SUFFIX
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def parse_time(value):
+    """Parse a Unix timestamp or an ISO 8601 date/time (local time if no offset is given)."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def block_may_match(entry, start, end, conditions):
+    """Return False if an index entry proves that none of its records can match."""
+    if start is not None and entry["last_ts"] < start:
+        return False
+    if end is not None and entry["first_ts"] > end:
+        return False
+    ranges = entry.get("fields")
+    if ranges is None:
+        return True
+    for field, op, value in conditions:
+        if field not in ranges:
+            continue  # Not indexed
+        if ranges[field] is None:
+            return False  # No record in the block has a numeric value to compare
+        low, high = ranges[field]
+        if op in ("<", "<=") and not OPERATORS[op](low, value):
+            return False
+        if op in (">", ">=") and not OPERATORS[op](high, value):
+            return False
+        if op == "==" and not low <= value <= high:
+            return False
+    return True
+
+
+def record_matches(record, start, end, event, conditions):
+    ts = record["ts"]
+    if (start is not None and ts < start) or (end is not None and ts > end):
+        return False
+    if event is not None and record["event"] != event:
+        return False
+    return conditions_match(record["telemetry"], conditions)
+
+
+def flatten(telemetry, prefix=""):
+    """
+    Flatten nested telemetry dicts into dotted column names.
+
+    Records that are not objects (e.g. the vision system's list of detections)
+    go to a single "value" column.
+    """
+    if not isinstance(telemetry, dict):
+        return {f"{prefix}value": telemetry}
+    columns = {}
+    for key, value in telemetry.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            columns.update(flatten(value, name + "."))
+        else:
+            columns[name] = value
+    return columns
+
+
+class TelemetryArchive:
+    """
+    Read-side access to the telemetry log segments written by TelemetryLogWriter.
+
+    Queries use each segment's sidecar index to skip blocks whose time range or
+    field min/max cannot match, and only decompress the blocks that remain.
+    Segments without an index are scanned in full.
+    """
+
+    def __init__(self, log_dir="logs"):
+        """
+        :param log_dir: Directory containing the telemetry log segments.
+        """
+        self.log_dir = log_dir
+        self.stats = {"blocks_read": 0, "blocks_skipped": 0, "bad_lines": 0}
+
+    def segments(self):
+        """Return the segment paths in the archive, oldest first."""
+        paths = []
+        for suffix in COMPRESSION_SUFFIXES.values():
+            paths.extend(glob.glob(os.path.join(self.log_dir, f"telemetry_*{suffix}")))
+        return sorted(paths, key=os.path.getmtime)
+
+    def read_index(self, path):
+        """Return the index entries for a segment, or None if it has no index."""
+        index_path = path + INDEX_SUFFIX
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    @staticmethod
+    def decompress(path, data):
+        if path.endswith(COMPRESSION_SUFFIXES["gzip"]):
+            return gzip.decompress(data)
+        if path.endswith(COMPRESSION_SUFFIXES["zstd"]):
+            if zstandard is None:
+                raise RuntimeError("Reading zstd segments requires the zstandard package")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return data
+
+    def read_blocks(self, path, start=None, end=None, conditions=()):
+        """Yield the decompressed JSONL blocks of a segment that may contain matching records."""
+        entries = self.read_index(path)
+        with open(path, "rb") as f:
+            if entries is None:
+                yield self.decompress(path, f.read())
+                return
+            for entry in entries:
+                if not block_may_match(entry, start, end, conditions):
+                    self.stats["blocks_skipped"] += 1
+                    continue
+                f.seek(entry["offset"])
+                self.stats["blocks_read"] += 1
+                yield self.decompress(path, f.read(entry["length"]))
+
+    def query(self, start=None, end=None, where=None, event=None):
+        """
+        Yield logged records matching a time window and field conditions.
+
+        :param start: Earliest timestamp (Unix seconds), or None.
+        :param end: Latest timestamp (Unix seconds), or None.
+        :param where: Filter expression, e.g. "battery_level < 20".
+        :param event: Only return "rx" or "tx" records, or None for both.
+        :return: Iterator of record dicts with "ts", "event" and "telemetry" keys.
+        """
+        conditions = parse_where(where)
+        for path in self.segments():
+            for block in self.read_blocks(path, start, end, conditions):
+                for line in block.splitlines():
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        self.stats["bad_lines"] += 1  # Corrupt or truncated line; skip it like a partial index line
+                        continue
+                    if record_matches(record, start, end, event, conditions):
+                        yield record
+
+    def export_csv(self, output, records):
+        """
+        Write records to a CSV file with one column per flattened telemetry field.
+
+        Lists (such as vision detections) are written as JSON.
+        """
+        rows = []
+        for record in records:
+            row = {name: json.dumps(value) if isinstance(value, list) else value
+                   for name, value in flatten(record["telemetry"]).items()}
+            rows.append(dict(row, ts=record["ts"], event=record["event"]))
+        fieldnames = ["ts", "event"]
+        for row in rows:
+            fieldnames.extend(name for name in row if name not in fieldnames)
+        with open(output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def export_columnar(self, output, records):
+        """
+        Write records as columns.
+
+        Uses Parquet when pyarrow is installed. Otherwise writes a directory with
+        one little-endian float64 file per numeric column (NaN for missing
+        values), a JSON file per text column and a schema.json describing them.
+        """
+        columns = {"ts": [], "event": []}
+        count = 0
+        for record in records:
+            row = dict(flatten(record["telemetry"]), ts=record["ts"], event=record["event"])
+            for name in row:
+                columns.setdefault(name, [None] * count)
+            for name, values in columns.items():
+                values.append(row.get(name))
+            count += 1
+
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            pyarrow = None
+        if pyarrow is not None:
+            pyarrow.parquet.write_table(pyarrow.table(columns), output)
+            return count
+
+        os.makedirs(output, exist_ok=True)
+        schema = {"rows": count, "columns": []}
+        for name, values in columns.items():
+            numeric = all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values)
+            if numeric:
+                column = array.array("d", (float("nan") if v is None else float(v) for v in values))
+                if sys.byteorder != "little":
+                    column.byteswap()
+                filename = f"{name}.f64"
+                with open(os.path.join(output, filename), "wb") as f:
+                    column.tofile(f)
+                schema["columns"].append({"name": name, "type": "float64", "file": filename})
+            else:
+                filename = f"{name}.json"
+                with open(os.path.join(output, filename), "w") as f:
+                    json.dump(values, f)
+                schema["columns"].append({"name": name, "type": "json", "file": filename})
+        with open(os.path.join(output, "schema.json"), "w") as f:
+            json.dump(schema, f, indent=2)
+        return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and export the CoralCom telemetry archive.")
+    parser.add_argument("command", choices=["query", "export"], help="Print matching records as JSONL, or export them.")
+    parser.add_argument("--log-dir", default="logs", help="Directory containing telemetry log segments (default: logs).")
+    parser.add_argument("--start", help="Start of the time window (Unix seconds or ISO 8601).")
+    parser.add_argument("--end", help="End of the time window (Unix seconds or ISO 8601).")
+    parser.add_argument("--where", help='Field filter, e.g. "battery_level < 20 and heading > 90".')
+    parser.add_argument("--event", choices=["rx", "tx"], help="Only records received from the rover (rx) or sent to Earth (tx).")
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv", help="Export format (default: csv).")
+    parser.add_argument("--output", help="Export destination (file for csv, file or directory for columnar).")
+    args = parser.parse_args(argv)
+
+    archive = TelemetryArchive(args.log_dir)
+    records = archive.query(parse_time(args.start), parse_time(args.end), args.where, args.event)
+
+    if args.command == "query":
+        for record in records:
+            print(json.dumps(record))
+    else:
+        if not args.output:
+            parser.error("export requires --output")
+        if args.format == "csv":
+            count = archive.export_csv(args.output, records)
+        else:
+            count = archive.export_columnar(args.output, records)
+        print(f"Exported {count} records to {args.output}")
+    print(f"Blocks read: {archive.stats['blocks_read']}, skipped: {archive.stats['blocks_skipped']}, "
+          f"bad lines: {archive.stats['bad_lines']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
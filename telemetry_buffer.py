@@ -0,0 +1,272 @@
+import array
+import json
+import threading
+import time
+from queue import Empty, Full
+
+# Known telemetry fields (dotted paths into the README schema) stored in typed columns
+TELEMETRY_SCHEMA = (
+    ("timestamp", "str"),
+    ("position.x", "float"),
+    ("position.y", "float"),
+    ("heading", "float"),
+    ("battery_level", "float"),
+    ("ultrasound_distance", "float"),
+    ("system_state.cpu_usage", "float"),
+    ("system_state.memory_available", "float"),
+    ("system_state.disk_usage", "float"),
+)
+TIMESTAMP_WIDTH = 32
+# Integers above this cannot round-trip through a float64 column
+MAX_EXACT_INT = 2 ** 53
+
+
+class RawTelemetry:
+    """
+    A telemetry datagram forwarded exactly as received.
+
+    The JSON is only parsed the first time a field is needed (for filtering or
+    inspection); forwarding and logging use the original bytes.
+    """
+
+    __slots__ = ("data", "_fields")
+
+    def __init__(self, data):
+        self.data = data
+        self._fields = None
+
+    @property
+    def fields(self):
+        """The decoded telemetry dict, parsed on first access."""
+        if self._fields is None:
+            self._fields = json.loads(self.data)
+        return self._fields
+
+    def get(self, key, default=None):
+        fields = self.fields
+        return fields.get(key, default) if isinstance(fields, dict) else default
+
+    def __str__(self):
+        return self.data.decode('utf-8', 'replace')
+
+
+class ColumnarTelemetryBuffer:
+    """
+    Bounded FIFO of telemetry records stored as preallocated typed columns.
+
+    A drop-in replacement for the relay's Queue: records go in and come out as
+    dicts, but in between each known field lives in its own array column
+    (float64, or a fixed-width byte column for the timestamp), with two
+    per-row bitmasks recording which fields are present and which were
+    integers. Fields outside TELEMETRY_SCHEMA, and values that do not fit a
+    column, go to a per-row overflow dict. A record then costs roughly 100
+    bytes instead of several hundred for nested dicts, and the buffer allocates
+    nothing per record beyond that overflow. Payloads that are not JSON
+    objects (e.g. the vision system's list of detections) are kept whole in a
+    per-row payload dict and come out unchanged.
+
+    Rows stay in the ring after being consumed until they are overwritten, so
+    last() can return the most recent readings of a field as a contiguous array.
+    """
+
+    def __init__(self, capacity, schema=TELEMETRY_SCHEMA):
+        """
+        :param capacity: Maximum number of buffered records.
+        :param schema: Tuple of (dotted field path, "float" or "str") pairs stored in columns.
+        """
+        if len(schema) > 32:
+            raise ValueError("At most 32 columns are supported")
+        self.capacity = capacity
+        self.schema = schema
+        self.column_index = {path: i for i, (path, _) in enumerate(schema)}
+        self.parents = {path.split(".")[0] for path, _ in schema if "." in path}
+
+        self.columns = []
+        for _, kind in schema:
+            if kind == "str":
+                self.columns.append(bytearray(capacity * TIMESTAMP_WIDTH))
+            else:
+                self.columns.append(array.array("d", bytes(8 * capacity)))
+        self.present = array.array("L", bytes(array.array("L").itemsize * capacity))
+        self.is_int = array.array("L", bytes(array.array("L").itemsize * capacity))
+        self.overflow = {}
+        self.payloads = {}  # Rows holding a non-object payload, stored as is
+
+        self.head = 0  # Total records written
+        self.tail = 0  # Total records read
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def qsize(self):
+        return self.head - self.tail
+
+    def empty(self):
+        return self.head == self.tail
+
+    def full(self):
+        return self.head - self.tail >= self.capacity
+
+    def put(self, telemetry, block=True, timeout=None):
+        """
+        Add a record, waiting for space like Queue.put.
+
+        :param telemetry: Decoded telemetry (normally a dict, but any JSON value is accepted) or a RawTelemetry.
+        """
+        if isinstance(telemetry, RawTelemetry):
+            telemetry = telemetry.fields
+        with self.not_full:
+            if self.full():
+                if not block:
+                    raise Full
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self.full():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Full
+                    self.not_full.wait(remaining)
+            self.store(self.head % self.capacity, telemetry)
+            self.head += 1
+            self.not_empty.notify()
+
+    def put_nowait(self, telemetry):
+        self.put(telemetry, block=False)
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the oldest record as a dict, waiting for one like Queue.get."""
+        with self.not_empty:
+            if self.empty():
+                if not block:
+                    raise Empty
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self.empty():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+            telemetry = self.load(self.tail % self.capacity)
+            self.tail += 1
+            self.not_full.notify()
+            return telemetry
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def store(self, slot, telemetry):
+        """Write one record into the columns at a ring slot."""
+        if not isinstance(telemetry, dict):
+            self.present[slot] = self.is_int[slot] = 0
+            self.overflow.pop(slot, None)
+            self.payloads[slot] = telemetry
+            return
+        self.payloads.pop(slot, None)
+        present = is_int = 0
+        extra = {}
+        for key, value in telemetry.items():
+            if key in self.parents and isinstance(value, dict) and value:
+                for subkey, subvalue in value.items():
+                    if not self.store_value(slot, f"{key}.{subkey}", subvalue):
+                        extra.setdefault(key, {})[subkey] = subvalue
+                        continue
+                    bit = 1 << self.column_index[f"{key}.{subkey}"]
+                    present |= bit
+                    if isinstance(subvalue, int):
+                        is_int |= bit
+            elif self.store_value(slot, key, value):
+                bit = 1 << self.column_index[key]
+                present |= bit
+                if isinstance(value, int):
+                    is_int |= bit
+            else:
+                extra[key] = value
+
+        self.present[slot] = present
+        self.is_int[slot] = is_int
+        if extra:
+            self.overflow[slot] = extra
+        else:
+            self.overflow.pop(slot, None)
+
+    def store_value(self, slot, path, value):
+        """Store a value in its column; return False if it belongs in the overflow store."""
+        index = self.column_index.get(path)
+        if index is None:
+            return False
+        if self.schema[index][1] == "str":
+            if not isinstance(value, str):
+                return False
+            encoded = value.encode("utf-8")
+            if len(encoded) >= TIMESTAMP_WIDTH or b"\0" in encoded:
+                return False
+            start = slot * TIMESTAMP_WIDTH
+            self.columns[index][start:start + TIMESTAMP_WIDTH] = encoded.ljust(TIMESTAMP_WIDTH, b"\0")
+            return True
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        if isinstance(value, int) and abs(value) > MAX_EXACT_INT:
+            return False
+        self.columns[index][slot] = value
+        return True
+
+    def load(self, slot):
+        """Rebuild the record dict stored at a ring slot."""
+        if slot in self.payloads:
+            return self.payloads[slot]
+        telemetry = {}
+        present = self.present[slot]
+        is_int = self.is_int[slot]
+        for index, (path, kind) in enumerate(self.schema):
+            bit = 1 << index
+            if not present & bit:
+                continue
+            if kind == "str":
+                start = slot * TIMESTAMP_WIDTH
+                value = bytes(self.columns[index][start:start + TIMESTAMP_WIDTH]).rstrip(b"\0").decode("utf-8")
+            else:
+                value = self.columns[index][slot]
+                if is_int & bit:
+                    value = int(value)
+            if "." in path:
+                parent, key = path.split(".", 1)
+                telemetry.setdefault(parent, {})[key] = value
+            else:
+                telemetry[path] = value
+
+        extra = self.overflow.get(slot)
+        if extra:
+            for key, value in extra.items():
+                if isinstance(value, dict) and isinstance(telemetry.get(key), dict):
+                    telemetry[key].update(value)
+                else:
+                    telemetry[key] = value
+        return telemetry
+
+    def last(self, path, n):
+        """
+        Return the most recent values of a numeric field, oldest first.
+
+        Includes records already consumed by the sender as long as they have
+        not been overwritten. Missing values are NaN.
+
+        :param path: Dotted field path, e.g. "battery_level" or "system_state.cpu_usage".
+        :param n: Number of readings to return (at most the buffer capacity).
+        :return: array.array("d") of length min(n, records written, capacity).
+        """
+        index = self.column_index[path]
+        if self.schema[index][1] != "float":
+            raise ValueError(f"{path} is not a numeric column")
+        with self.lock:
+            n = min(n, self.head, self.capacity)
+            start = (self.head - n) % self.capacity
+            column = self.columns[index]
+            if start + n <= self.capacity:
+                values = column[start:start + n]
+                present = self.present[start:start + n]
+            else:
+                values = column[start:] + column[:start + n - self.capacity]
+                present = self.present[start:] + self.present[:start + n - self.capacity]
+        bit = 1 << index
+        for i, mask in enumerate(present):
+            if not mask & bit:
+                values[i] = float("nan")
+        return values
@@ -0,0 +1,465 @@
+import json
+import os
+import zlib
+
+from framing import FRAMING_LENGTH, FRAMING_NEWLINE, LENGTH_PREFIX, TelemetryFrameDecoder, frame_message
+from telemetry_buffer import RawTelemetry
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PROTOCOL_VERSION = 1
+ENCODING_JSON = "json"
+ENCODING_DELTA = "delta"
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+
+# Placeholder for keys missing from the previous record
+MISSING = object()
+# Most selective-ACK ranges reported in one acknowledgement
+MAX_SACK_RANGES = 32
+
+
+def available_compressions():
+    """Return the stream compressions supported by this install, best first."""
+    if zstandard is not None:
+        return [COMPRESSION_ZSTD, COMPRESSION_ZLIB, COMPRESSION_NONE]
+    return [COMPRESSION_ZLIB, COMPRESSION_NONE]
+
+
+def as_dict(telemetry):
+    """Return the decoded record for a telemetry item (a dict, JSON bytes or a RawTelemetry); usually a dict."""
+    if isinstance(telemetry, dict):
+        return telemetry
+    if isinstance(telemetry, (bytes, bytearray)):
+        return json.loads(telemetry)
+    if isinstance(telemetry, RawTelemetry):
+        return telemetry.fields
+    return telemetry
+
+
+def diff(previous, current):
+    """
+    Return (changed, removed) between two telemetry dicts.
+
+    changed holds the new value of every changed key; keys whose old and new
+    values are both dicts are diffed recursively. removed lists the key paths
+    that disappeared.
+    """
+    changed = {}
+    removed = [[key] for key in previous if key not in current]
+    for key, value in current.items():
+        old = previous.get(key, MISSING)
+        if isinstance(value, dict) and isinstance(old, dict):
+            sub_changed, sub_removed = diff(old, value)
+            if sub_changed:
+                changed[key] = sub_changed
+            removed.extend([key] + path for path in sub_removed)
+        elif old is MISSING or old != value or type(old) is not type(value):
+            changed[key] = value
+    return changed, removed
+
+
+def apply_delta(previous, changed, removed):
+    """Return a new dict with a delta from diff() applied to previous."""
+    result = dict(previous)
+    for key, value in changed.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = apply_delta(result[key], value, [])
+        else:
+            result[key] = value
+    for path in removed:
+        target = result
+        for key in path[:-1]:
+            target[key] = dict(target[key])
+            target = target[key]
+        target.pop(path[-1], None)
+    return result
+
+
+class DeltaEncoder:
+    """Encodes telemetry as periodic keyframes followed by changed-field deltas."""
+
+    def __init__(self, keyframe_interval=50):
+        """
+        :param keyframe_interval: Send a full record every this many messages so a
+                                  receiver joining mid-stream resynchronizes quickly.
+        """
+        self.keyframe_interval = keyframe_interval
+        self.reset()
+
+    def reset(self):
+        """Forget the previous record so the next message is a keyframe."""
+        self.previous = None
+        self.since_keyframe = 0
+
+    def encode(self, telemetry):
+        """
+        Return the JSON payload for one telemetry item.
+
+        Records that are not objects (e.g. a list of vision detections) cannot
+        be diffed; they are sent whole as a keyframe and the next object
+        starts a new delta chain.
+        """
+        telemetry = as_dict(telemetry)
+        if not isinstance(telemetry, dict):
+            self.reset()
+            return json.dumps({"k": telemetry}, separators=(",", ":")).encode('utf-8')
+        if self.previous is None or self.since_keyframe >= self.keyframe_interval:
+            message = {"k": telemetry}
+            self.since_keyframe = 0
+        else:
+            changed, removed = diff(self.previous, telemetry)
+            message = {"d": changed}
+            if removed:
+                message["r"] = removed
+        self.previous = telemetry
+        self.since_keyframe += 1
+        return json.dumps(message, separators=(",", ":")).encode('utf-8')
+
+
+class DeltaDecoder:
+    """Rebuilds full telemetry records from DeltaEncoder payloads."""
+
+    def __init__(self):
+        self.previous = None
+
+    def decode(self, payload):
+        """
+        Return the full record for one payload, or None if a delta arrives before any keyframe.
+        """
+        message = json.loads(payload)
+        if "k" in message:
+            self.previous = message["k"]
+        elif self.previous is not None:
+            self.previous = apply_delta(self.previous, message.get("d", {}), message.get("r", []))
+        else:
+            return None
+        return self.previous
+
+
+class StreamCompressor:
+    """Compresses the uplink byte stream, flushing at every batch boundary."""
+
+    def __init__(self, compression):
+        self.compression = compression
+        if compression == COMPRESSION_ZLIB:
+            self.compressor = zlib.compressobj(6)
+        elif compression == COMPRESSION_ZSTD:
+            self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self.compressor = None
+
+    def compress(self, data):
+        """Return compressed bytes for data, decodable as soon as they arrive."""
+        if self.compressor is None:
+            return data
+        if self.compression == COMPRESSION_ZLIB:
+            return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+class StreamDecompressor:
+    def __init__(self, compression):
+        if compression == COMPRESSION_ZLIB:
+            self.decompressor = zlib.decompressobj()
+        elif compression == COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise ValueError("zstd compression requires the zstandard package")
+            self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            self.decompressor = None
+
+    def decompress(self, data):
+        if self.decompressor is None:
+            return data
+        return self.decompressor.decompress(data)
+
+
+class SequenceTracker:
+    """
+    Mission Control's record of which messages of a relay session it has delivered.
+
+    Keep one tracker per relay across reconnects and pass it to each
+    connection's TelemetryStreamDecoder, so resent messages are recognized as
+    duplicates and the relay learns exactly which ones are still missing.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.cumulative = 0  # Every sequence number up to this one has been delivered
+        self.ahead = set()  # Delivered sequence numbers beyond a gap
+
+    def begin(self, session):
+        """Start tracking a relay session, forgetting the previous one if it differs."""
+        if session != self.session:
+            self.session = session
+            self.cumulative = 0
+            self.ahead = set()
+
+    def accept(self, seq):
+        """Record a received sequence number; return False if it was already delivered."""
+        if seq <= self.cumulative or seq in self.ahead:
+            return False
+        if seq == self.cumulative + 1:
+            self.cumulative = seq
+            while self.cumulative + 1 in self.ahead:
+                self.cumulative += 1
+                self.ahead.discard(self.cumulative)
+        else:
+            self.ahead.add(seq)
+        return True
+
+    def ack_message(self):
+        """Return the acknowledgement: the cumulative ACK plus selective ACK ranges beyond it."""
+        message = {"ack": self.cumulative}
+        ranges = []
+        for seq in sorted(self.ahead):
+            if ranges and seq == ranges[-1][1] + 1:
+                ranges[-1][1] = seq
+            elif len(ranges) < MAX_SACK_RANGES:
+                ranges.append([seq, seq])
+            else:
+                break
+        if ranges:
+            message["sack"] = ranges
+        return message
+
+
+def is_acked(seq, ack, sack):
+    """Return True if an acknowledgement (cumulative ack plus sack ranges) covers seq."""
+    return seq <= ack or any(low <= seq <= high for low, high in sack)
+
+
+class UplinkEncoder:
+    """
+    Per-connection encoder for the negotiated Earth uplink.
+
+    Negotiation: after connecting, the relay sends a hello frame offering its
+    encodings and compressions; Mission Control answers with a frame naming its
+    choice; the relay then sends a start frame confirming the settings in use
+    (plain JSON without compression if no answer arrived in time). Hello,
+    answer and start frames are always uncompressed JSON. Everything after the
+    start frame is framed, encoded and compressed as agreed.
+
+    With acknowledgements, the hello also names the relay's session. Mission
+    Control's answer then reports what it already has from that session (a
+    cumulative "ack" and optional "sack" ranges), every message carries its
+    sequence number ("<seq> <payload>"), and Mission Control keeps sending
+    uncompressed JSON acknowledgement frames back on the same connection.
+    """
+
+    def __init__(self, framing, encodings, compressions, keyframe_interval=50, acks=False, session=None):
+        """
+        :param framing: FRAMING_NEWLINE or FRAMING_LENGTH.
+        :param encodings: Encodings to offer, in order of preference.
+        :param compressions: Compressions to offer, in order of preference.
+        :param keyframe_interval: Keyframe interval for the delta encoding.
+        :param acks: Offer sequence numbers and acknowledgements.
+        :param session: Session id sent with the offer (random by default). Sequence numbers restart with each session.
+        """
+        self.framing = framing
+        self.encodings = list(encodings)
+        self.compressions = [c for c in compressions if c in available_compressions()]
+        self.keyframe_interval = keyframe_interval
+        self.offer_acks = acks
+        self.session = session or os.urandom(8).hex()
+        self.configure(ENCODING_JSON, COMPRESSION_NONE)
+
+    def hello(self):
+        """Return the framed hello offer."""
+        offer = {"coralcom": PROTOCOL_VERSION, "encodings": self.encodings, "compressions": self.compressions}
+        if self.offer_acks:
+            offer["acks"] = True
+            offer["session"] = self.session
+        return frame_message(json.dumps(offer).encode('utf-8'), self.framing)
+
+    def accept(self, answer):
+        """
+        Configure from Mission Control's answer payload (None if it never came).
+
+        :return: The framed start message to send before any telemetry.
+        """
+        encoding, compression = ENCODING_JSON, COMPRESSION_NONE
+        choice = {}
+        if answer is not None:
+            try:
+                choice = json.loads(answer)
+            except ValueError:
+                choice = {}
+            if choice.get("encoding") in self.encodings:
+                encoding = choice["encoding"]
+            if choice.get("compression") in self.compressions:
+                compression = choice["compression"]
+        self.configure(encoding, compression)
+        start = {"encoding": encoding, "compression": compression}
+        if self.offer_acks and choice.get("acks") is True:
+            self.acks = True
+            self.peer_ack = choice.get("ack", 0)
+            self.peer_sack = choice.get("sack", [])
+            start["acks"] = True
+        return frame_message(json.dumps(start).encode('utf-8'), self.framing)
+
+    def configure(self, encoding, compression):
+        self.encoding = encoding
+        self.compression = compression
+        self.delta = DeltaEncoder(self.keyframe_interval) if encoding == ENCODING_DELTA else None
+        self.compressor = StreamCompressor(compression)
+        self.acks = False
+        self.peer_ack = 0
+        self.peer_sack = []
+
+    def encode_batch(self, payloads):
+        """
+        Frame a batch of encoded payloads and compress it as one block.
+
+        :param payloads: Encoded message payloads (an empty payload is a heartbeat).
+        """
+        buffers = []
+        for payload in payloads:
+            buffers.extend(frame_message(payload, self.framing))
+        if self.compressor.compressor is None:
+            return buffers
+        return [self.compressor.compress(b"".join(buffers))]
+
+    def encode_items(self, telemetry_items, encode, seqs=None):
+        """
+        Encode a batch of telemetry items for the wire.
+
+        :param telemetry_items: Telemetry items from the relay buffer.
+        :param encode: Plain JSON encoder for items, used unless the delta encoding was negotiated.
+        :param seqs: Sequence numbers of the items, sent when acknowledgements were negotiated.
+        """
+        if self.delta is not None:
+            payloads = [self.delta.encode(item) for item in telemetry_items]
+        else:
+            payloads = [encode(item) for item in telemetry_items]
+        if self.acks and seqs is not None:
+            payloads = [b"%d %s" % (seq, payload) for seq, payload in zip(seqs, payloads)]
+        return self.encode_batch(payloads)
+
+
+def read_first_frame(buffer, framing):
+    """
+    Split one frame off the front of a raw buffer.
+
+    :return: Tuple of (payload or None if incomplete, remaining bytes).
+    """
+    if framing == FRAMING_LENGTH:
+        if len(buffer) < LENGTH_PREFIX.size:
+            return None, buffer
+        (length,) = LENGTH_PREFIX.unpack_from(buffer)
+        end = LENGTH_PREFIX.size + length
+        if len(buffer) < end:
+            return None, buffer
+        return bytes(buffer[LENGTH_PREFIX.size:end]), buffer[end:]
+    newline = buffer.find(b"\n")
+    if newline < 0:
+        return None, buffer
+    return bytes(buffer[:newline]), buffer[newline + 1:]
+
+
+class TelemetryStreamDecoder:
+    """
+    Mission Control side of the Earth uplink.
+
+    Feed it the bytes read from a relay connection; it answers the relay's
+    hello, follows the start frame's settings and returns fully decoded
+    telemetry dicts. Streams from relays that do not negotiate (no hello) are
+    decoded as plain framed JSON.
+
+    If the relay offers acknowledgements, messages resent after a reconnect
+    are delivered only once and the decoder's replies carry ACK frames the
+    caller must send back. Pass the same SequenceTracker to the decoder of
+    every connection from that relay.
+    """
+
+    def __init__(self, framing=FRAMING_NEWLINE, encodings=(ENCODING_DELTA, ENCODING_JSON), compressions=None,
+                 tracker=None):
+        """
+        :param framing: Framing used by the relay.
+        :param encodings: Encodings this receiver accepts, in order of preference.
+        :param compressions: Compressions accepted, in order of preference (default: all available).
+        :param tracker: SequenceTracker shared across connections, or None to decline acknowledgements.
+        """
+        self.framing = framing
+        self.encodings = list(encodings)
+        self.compressions = list(compressions) if compressions is not None else available_compressions()
+        self.tracker = tracker
+        self.raw = bytearray()
+        self.negotiating = True
+        self.frames = None
+        self.decompressor = None
+        self.delta = None
+        self.acks = False
+
+    def answer(self, offer):
+        """Return the framed answer to a hello offer."""
+        encoding = next((e for e in self.encodings if e in offer.get("encodings", [])), ENCODING_JSON)
+        compression = next((c for c in self.compressions if c in offer.get("compressions", [])), COMPRESSION_NONE)
+        reply = {"encoding": encoding, "compression": compression}
+        if offer.get("acks") and self.tracker is not None:
+            self.tracker.begin(offer.get("session"))
+            reply["acks"] = True
+            reply.update(self.tracker.ack_message())
+        return self.frame(reply)
+
+    def frame(self, message):
+        return b"".join(frame_message(json.dumps(message).encode('utf-8'), self.framing))
+
+    def start(self, encoding, compression, acks=False):
+        self.negotiating = False
+        self.frames = TelemetryFrameDecoder(self.framing)
+        self.decompressor = StreamDecompressor(compression)
+        self.delta = DeltaDecoder() if encoding == ENCODING_DELTA else None
+        self.acks = acks and self.tracker is not None
+
+    def feed(self, data):
+        """
+        Add bytes read from the relay.
+
+        :return: Tuple of (list of telemetry dicts, bytes to send back to the relay).
+        """
+        reply = b""
+        self.raw += data
+        while self.negotiating:
+            payload, rest = read_first_frame(self.raw, self.framing)
+            if payload is None:
+                return [], reply
+            if not payload:
+                self.raw = bytearray(rest)  # Heartbeat
+                continue
+            message = json.loads(payload)
+            if not isinstance(message, dict):
+                # Legacy relay forwarding a non-object record (e.g. vision detections)
+                self.start(ENCODING_JSON, COMPRESSION_NONE)
+            elif "coralcom" in message:
+                reply += self.answer(message)
+                self.raw = bytearray(rest)
+            elif set(message) in ({"encoding", "compression"}, {"encoding", "compression", "acks"}):
+                self.start(message["encoding"], message["compression"], message.get("acks") is True)
+                self.raw = bytearray(rest)
+            else:
+                # Legacy relay: no negotiation, the stream is plain framed JSON
+                self.start(ENCODING_JSON, COMPRESSION_NONE)
+
+        data, self.raw = bytes(self.raw), bytearray()
+        records = []
+        sequenced = False
+        for payload in self.frames.feed(self.decompressor.decompress(data)):
+            seq = None
+            if self.acks:
+                seq, _, payload = payload.partition(b" ")
+                seq = int(seq)
+                sequenced = True
+            # Duplicates are still decoded so the delta chain stays intact
+            record = self.delta.decode(payload) if self.delta is not None else json.loads(payload)
+            if record is None or (seq is not None and not self.tracker.accept(seq)):
+                continue
+            records.append(record)
+        if sequenced:
+            reply += self.frame(self.tracker.ack_message())
+        return records, reply
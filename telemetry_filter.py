@@ -0,0 +1,41 @@
+import operator
+import re
+
+from telemetry_log import lookup_field
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+CONDITION_PATTERN = re.compile(r"^\s*([\w.]+)\s*(<=|>=|==|!=|<|>)\s*(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*$")
+
+
+def parse_where(where):
+    """
+    Parse a filter expression such as "battery_level < 20 and heading >= 90".
+
+    :return: List of (field, operator symbol, value) conditions, all of which must hold.
+    """
+    if not where:
+        return []
+    conditions = []
+    for part in re.split(r"\s+and\s+", where.strip(), flags=re.IGNORECASE):
+        match = CONDITION_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"Cannot parse condition: {part!r}")
+        field, op, value = match.groups()
+        conditions.append((field, op, float(value)))
+    return conditions
+
+
+def conditions_match(telemetry, conditions):
+    """Return True if every (field, operator symbol, value) condition holds for a telemetry record."""
+    for field, op, value in conditions:
+        actual = lookup_field(telemetry, field)
+        if not isinstance(actual, (int, float)) or not OPERATORS[op](actual, value):
+            return False
+    return True
@@ -0,0 +1,233 @@
+import collections
+import gzip
+import json
+import os
+import threading
+import time
+
+from telemetry_buffer import RawTelemetry
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}
+INDEX_SUFFIX = ".idx"
+
+# Numeric fields whose per-block min/max is stored in the index (dotted paths for nested fields)
+DEFAULT_INDEX_FIELDS = ("battery_level", "heading", "ultrasound_distance", "system_state.cpu_usage")
+
+
+def lookup_field(telemetry, path):
+    """Return the value at a dotted field path, or None if any part is missing."""
+    value = telemetry
+    for key in path.split("."):
+        if not hasattr(value, "get"):
+            return None
+        value = value.get(key)
+    return value
+
+
+class TelemetryLogWriter:
+    """
+    Writes telemetry records to rotated, compressed JSONL segments on a background thread.
+
+    Relay threads hand records over with record(), which only appends to a
+    deque (atomic under the GIL, so no lock is taken on the hot path). The
+    writer thread drains the deque in batches, formats each record as one JSON
+    line and appends every batch as an independent gzip member or zstd frame,
+    so segments stay readable with standard tools even while being written.
+    When the handoff is full, records are dropped and counted rather than
+    blocking ingest.
+
+    Each segment gets a sidecar index with one JSON line per block: its byte
+    offset and length, first/last timestamp, record count and the min/max of
+    the configured index fields. TelemetryArchive uses it to seek straight to
+    the blocks a query can match.
+
+    Pre-encoded payloads that are not valid JSON (a malformed passthrough
+    datagram) are logged as {"telemetry": null, "raw": "<payload as text>"}.
+    """
+
+    def __init__(self, log_dir="logs", compression="gzip", compresslevel=5, max_segment_bytes=64 * 1024 * 1024,
+                 max_segment_age=3600, queue_size=100000, flush_interval=0.5, encoder=None,
+                 block_records=4096, index_fields=DEFAULT_INDEX_FIELDS):
+        """
+        Initialize the log writer.
+
+        :param log_dir: Directory for log segments.
+        :param compression: "gzip", "zstd" (requires the zstandard package) or "none".
+        :param compresslevel: Compression level passed to the compressor.
+        :param max_segment_bytes: Rotate to a new segment once this many bytes have been written.
+        :param max_segment_age: Rotate to a new segment after this many seconds.
+        :param queue_size: Maximum number of records waiting for the writer before new ones are dropped.
+        :param flush_interval: Seconds between writer wakeups.
+        :param encoder: Callable turning a telemetry item into JSON bytes. Defaults to json.dumps.
+        :param block_records: Maximum number of records per compressed block (the unit of seeking).
+        :param index_fields: Numeric telemetry fields whose per-block min/max is written to the index.
+        """
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+
+        self.log_dir = log_dir
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.encoder = encoder or (lambda telemetry: json.dumps(telemetry).encode('utf-8'))
+        self.block_records = block_records
+        self.index_fields = tuple(index_fields)
+
+        self.pending = collections.deque()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.segment = None
+        self.segment_path = None
+        self.index = None
+        self.segment_opened = 0.0
+        self.segment_bytes = 0
+        self.stats = {"records": 0, "dropped": 0, "batches": 0, "bytes_written": 0, "segments": 0}
+
+        if self.compression == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=self.compresslevel)
+
+    def record(self, event, telemetry):
+        """
+        Queue a telemetry record for logging without blocking.
+
+        :param event: Short event name, e.g. "rx" or "tx".
+        :param telemetry: Telemetry item accepted by the encoder.
+        """
+        if len(self.pending) >= self.queue_size:
+            self.stats["dropped"] += 1
+            return
+        self.pending.append((time.time(), event, telemetry))
+
+    def start(self):
+        """Start the writer thread."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Flush remaining records and stop the writer thread."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        self.close_segment()
+
+    def run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.write_pending()
+        self.write_pending()
+
+    def write_pending(self):
+        """Drain the handoff queue and append it to the current segment in compressed, indexed blocks."""
+        records = []
+        pending = self.pending
+        while pending:
+            records.append(pending.popleft())
+        for start in range(0, len(records), self.block_records):
+            self.write_records(records[start:start + self.block_records])
+
+    def write_records(self, records):
+        """Format one block of records as JSON lines and write it with its index entry."""
+        lines = []
+        ranges = {}
+        complete = True
+        for ts, event, telemetry in records:
+            try:
+                payload = self.encoder(telemetry)
+            except (TypeError, ValueError):
+                self.stats["dropped"] += 1
+                continue
+            if isinstance(telemetry, (RawTelemetry, bytes, bytearray)):
+                # Pre-encoded bytes (e.g. passthrough datagrams) have not been checked yet
+                try:
+                    json.loads(payload)
+                except ValueError:
+                    # Keep a malformed datagram as an escaped string so the line stays valid JSON
+                    raw = json.dumps(payload.decode('utf-8', 'replace')).encode('utf-8')
+                    lines.append(b'{"ts":%.6f,"event":"%s","telemetry":null,"raw":%s}\n' % (ts, event.encode(), raw))
+                    complete = False
+                    continue
+                payload = payload.replace(b"\n", b" ")  # Newlines in valid JSON are only whitespace
+            lines.append(b'{"ts":%.6f,"event":"%s","telemetry":%s}\n' % (ts, event.encode(), payload))
+
+            if not hasattr(telemetry, "get"):
+                complete = False  # Pre-encoded bytes: field ranges for this block are unknown
+                continue
+            for field in self.index_fields:
+                try:
+                    value = lookup_field(telemetry, field)
+                except ValueError:
+                    complete = False
+                    break
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    low, high = ranges.get(field, (value, value))
+                    ranges[field] = (min(low, value), max(high, value))
+        if not lines:
+            return
+
+        entry = {"first_ts": records[0][0], "last_ts": records[-1][0], "count": len(lines)}
+        if complete:
+            # null marks an indexed field with no numeric value anywhere in the block
+            entry["fields"] = {field: ranges.get(field) for field in self.index_fields}
+        self.write_block(b"".join(lines), entry)
+        self.stats["records"] += len(lines)
+
+    def write_block(self, data, entry):
+        """Compress and append one block of JSON lines and its index entry, rotating the segment first if needed."""
+        if self.segment is None or self.segment_bytes >= self.max_segment_bytes or \
+                time.time() - self.segment_opened >= self.max_segment_age:
+            self.rotate()
+
+        if self.compression == "gzip":
+            data = gzip.compress(data, compresslevel=self.compresslevel)
+        elif self.compression == "zstd":
+            data = self.compressor.compress(data)
+        self.segment.write(data)
+        self.segment.flush()
+
+        entry["offset"] = self.segment_bytes
+        entry["length"] = len(data)
+        self.index.write(json.dumps(entry) + "\n")
+        self.index.flush()
+
+        self.segment_bytes += len(data)
+        self.stats["bytes_written"] += len(data)
+        self.stats["batches"] += 1
+
+    def rotate(self):
+        """Close the current segment and open a new one named after the current date and time."""
+        self.close_segment()
+        now = time.time()
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        path = os.path.join(self.log_dir, f"telemetry_{stamp}{suffix}")
+        counter = 1
+        while os.path.exists(path):
+            path = os.path.join(self.log_dir, f"telemetry_{stamp}_{counter}{suffix}")
+            counter += 1
+        self.segment = open(path, "ab")
+        self.index = open(path + INDEX_SUFFIX, "a")
+        self.segment_path = path
+        self.segment_opened = now
+        self.segment_bytes = 0
+        self.stats["segments"] += 1
+
+    def close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.index.close()
+            self.segment = None
+            self.index = None
+
+    def get_stats(self):
+        """Return counters for written and dropped records, plus the current queue depth."""
+        return dict(self.stats, queued=len(self.pending))
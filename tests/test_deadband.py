@@ -0,0 +1,66 @@
+from deadband import DeadbandFilter
+from retransmission import tag_source
+from telemetry_buffer import RawTelemetry
+
+DEADBANDS = {"heading": 1.0, "battery_level": 0.5, "position": 0.05}
+DETECTIONS = [{"class_id": 0, "label": "person", "score": 0.9, "bbox": [0.1, 0.1, 0.5, 0.5]}]
+
+
+def make_filter():
+    return DeadbandFilter(DEADBANDS, max_interval=None)
+
+
+def test_unchanged_fields_are_suppressed():
+    deadband = make_filter()
+    packet = {"heading": 90.0, "battery_level": 80.0, "position": {"x": 1.0, "y": 2.0}}
+    assert deadband.allow(packet)
+    assert not deadband.allow(dict(packet, heading=90.5))
+    assert deadband.allow(dict(packet, heading=92.0))
+
+
+def test_vision_detection_lists_are_forwarded():
+    deadband = make_filter()
+    assert all(deadband.allow(DETECTIONS, source="vision") for _ in range(5))
+    assert deadband.get_stats()["suppressed"] == 0
+
+
+def test_tagged_vision_lists_are_forwarded():
+    deadband = make_filter()
+    tagged = tag_source(DETECTIONS, "vision")
+    assert all(deadband.allow(tagged, source="vision") for _ in range(5))
+
+
+def test_binary_detection_frames_are_forwarded():
+    deadband = make_filter()
+    packet = {"detection_frames": [{"frame_id": 1, "detections": DETECTIONS}]}
+    assert all(deadband.allow(packet, source="vision") for _ in range(5))
+
+
+def test_passthrough_lists_are_forwarded():
+    deadband = make_filter()
+    raw = b'[{"class_id": 0, "score": 0.9}]'
+    assert all(deadband.allow(RawTelemetry(raw), len(raw), source="rover") for _ in range(5))
+    tagged = tag_source(RawTelemetry(raw), "vision")
+    assert all(deadband.allow(tagged, len(raw), source="vision") for _ in range(5))
+
+
+def test_detections_do_not_reset_rover_baseline():
+    deadband = make_filter()
+    assert deadband.allow({"heading": 10.0})
+    assert deadband.allow(DETECTIONS)
+    assert not deadband.allow({"heading": 10.2})
+
+
+def test_missing_field_is_not_a_change():
+    deadband = make_filter()
+    assert deadband.allow({"heading": 10.0, "battery_level": 50.0})
+    assert not deadband.allow({"heading": 10.1})
+    assert not deadband.allow({"battery_level": 50.1})
+    assert deadband.allow({"battery_level": 49.0})
+
+
+def test_new_field_is_forwarded():
+    deadband = make_filter()
+    assert deadband.allow({"heading": 10.0})
+    assert deadband.allow({"heading": 10.0, "battery_level": 50.0})
+    assert not deadband.allow({"heading": 10.0, "battery_level": 50.0})
@@ -0,0 +1,49 @@
+import gc
+import weakref
+
+from metrics import REGISTRY
+from retransmission import TelemetryRetransmission
+
+
+def make_relay(name):
+    return TelemetryRetransmission("127.0.0.1", 0, "127.0.0.1", 9, log_dir=None, metrics_instance=name)
+
+
+def test_relays_report_separately_and_unregister_on_stop():
+    first, second = make_relay("test-first"), make_relay("test-second")
+    first.sent_packets.inc(3)
+    second.sent_packets.inc(5)
+    second.ingest_stats["packets"] = 7
+
+    text = REGISTRY.render()
+    assert 'coralcom_relay_packets_sent_total{relay="test-first"} 3' in text
+    assert 'coralcom_relay_packets_sent_total{relay="test-second"} 5' in text
+    assert 'coralcom_relay_packets_received_total{relay="test-second"} 7' in text
+
+    first.stop()
+    text = REGISTRY.render()
+    assert 'relay="test-first"' not in text
+    assert 'coralcom_relay_packets_sent_total{relay="test-second"} 5' in text
+    second.stop()
+    assert 'relay="test-second"' not in REGISTRY.render()
+
+
+def test_default_instance_is_the_rover_address():
+    relay = make_relay(None)
+    try:
+        assert relay.metrics_instance == "127.0.0.1:%d" % relay.rover_socket.getsockname()[1]
+    finally:
+        relay.stop()
+
+
+def test_registry_does_not_keep_relay_alive():
+    relay = make_relay("test-gone")
+    for _, sock in relay.input_sockets:
+        sock.close()
+    ref = weakref.ref(relay)
+    del relay
+    gc.collect()
+    try:
+        assert ref() is None
+    finally:
+        REGISTRY.unregister(relay="test-gone")
@@ -0,0 +1,53 @@
+import csv
+import gzip
+import json
+import os
+
+from telemetry_archive import TelemetryArchive
+from telemetry_log import TelemetryLogWriter
+
+DETECTIONS = [{"class_id": 0, "label": "person", "score": 0.9, "bbox": [0.1, 0.1, 0.5, 0.5]}]
+
+
+def write_log(log_dir, records):
+    writer = TelemetryLogWriter(str(log_dir))
+    writer.start()
+    for telemetry in records:
+        writer.record("rx", telemetry)
+    writer.stop()
+    return writer.segment_path
+
+
+def test_export_csv_with_list_telemetry(tmp_path):
+    write_log(tmp_path, [{"heading": 90.0, "position": {"x": 1.0}}, DETECTIONS])
+    archive = TelemetryArchive(str(tmp_path))
+    output = str(tmp_path / "out.csv")
+    assert archive.export_csv(output, archive.query()) == 2
+    with open(output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["heading"] == "90.0"
+    assert rows[0]["position.x"] == "1.0"
+    assert json.loads(rows[1]["value"]) == DETECTIONS
+
+
+def test_export_columnar_with_list_telemetry(tmp_path):
+    write_log(tmp_path, [{"heading": 90.0}, DETECTIONS])
+    archive = TelemetryArchive(str(tmp_path))
+    output = str(tmp_path / "columns")
+    assert archive.export_columnar(output, archive.query()) == 2
+    if os.path.isdir(output):
+        with open(os.path.join(output, "value.json")) as f:
+            assert json.load(f) == [None, DETECTIONS]
+
+
+def test_query_skips_corrupt_lines(tmp_path):
+    path = tmp_path / "telemetry_20250126_120000.jsonl.gz"
+    lines = [
+        b'{"ts":1.0,"event":"rx","telemetry":{"heading":1}}\n',
+        b'{"ts":2.0,"event":"rx","telemetry":{heading\n',
+        b'{"ts":3.0,"event":"rx","telemetry":{"heading":3}}\n',
+    ]
+    path.write_bytes(gzip.compress(b"".join(lines)))
+    archive = TelemetryArchive(str(tmp_path))
+    assert [record["ts"] for record in archive.query()] == [1.0, 3.0]
+    assert archive.stats["bad_lines"] == 1
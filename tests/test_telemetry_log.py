@@ -0,0 +1,40 @@
+import gzip
+import json
+
+from telemetry_archive import TelemetryArchive
+from telemetry_buffer import RawTelemetry
+from telemetry_log import TelemetryLogWriter
+from retransmission import encode_telemetry
+
+
+def write_log(log_dir, records):
+    writer = TelemetryLogWriter(str(log_dir), encoder=encode_telemetry)
+    writer.start()
+    for telemetry in records:
+        writer.record("rx", telemetry)
+    writer.stop()
+    return writer.segment_path
+
+
+def test_garbage_datagram_is_logged_as_raw_string(tmp_path):
+    garbage = b'{"heading": 9\x00\xff"oops'
+    path = write_log(tmp_path, [RawTelemetry(b'{"heading": 90}'), RawTelemetry(garbage)])
+
+    with open(path, "rb") as f:
+        lines = gzip.decompress(f.read()).splitlines()
+    records = [json.loads(line) for line in lines]
+    assert records[0]["telemetry"] == {"heading": 90}
+    assert records[1]["telemetry"] is None
+    assert records[1]["raw"] == garbage.decode("utf-8", "replace")
+
+    archive = TelemetryArchive(str(tmp_path))
+    assert len(list(archive.query())) == 2
+    assert archive.stats["bad_lines"] == 0
+
+
+def test_multiline_raw_json_stays_on_one_line(tmp_path):
+    path = write_log(tmp_path, [RawTelemetry(b'{"heading":\n 90}')])
+    with open(path, "rb") as f:
+        lines = gzip.decompress(f.read()).splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["telemetry"] == {"heading": 90}
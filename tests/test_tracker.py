@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")  # tracker uses inference_edgetpu's detection dtype
+
+from inference_edgetpu import DETECTION_DTYPE
+from tracker import ObjectTracker
+
+# Camera frames the detector actually saw; the gaps are frames dropped while it was busy
+FRAME_IDS = [0, 1, 2, 5, 6, 10, 13, 14, 19]
+VELOCITY = np.array([0.004, 0.006, 0.004, 0.006], np.float32)  # Per camera frame
+
+
+def box_at(frame_id):
+    return np.array([0.1, 0.1, 0.3, 0.3], np.float32) + VELOCITY * frame_id
+
+
+def detection_at(frame_id):
+    detections = np.zeros(1, DETECTION_DTYPE)
+    detections[0] = (0, 0.9, box_at(frame_id))
+    return detections
+
+
+@pytest.mark.parametrize("kalman", [False, True])
+def test_prediction_follows_uneven_frame_gaps(kalman):
+    tracker = ObjectTracker(detect_every=100, kalman=kalman)
+    for frame_id in FRAME_IDS:
+        tracked = tracker.update(detection_at(frame_id), frame_id)
+    assert tracked["track_id"][0] == 1
+
+    predicted = tracker.predict(26)
+    assert len(predicted) == 1
+    assert np.allclose(predicted["bbox"][0], box_at(26), atol=0.01)
+
+
+def test_without_frame_ids_each_call_is_one_frame():
+    tracker = ObjectTracker(detect_every=100)
+    for frame_id in range(5):
+        tracker.update(detection_at(frame_id))
+    assert np.allclose(tracker.predict()["bbox"][0], box_at(5), atol=0.01)
+
+
+def test_frame_gaps_count_towards_detect_every():
+    tracker = ObjectTracker(detect_every=5)
+    tracker.update(detection_at(0), 0)
+    tracker.predict(4)
+    assert tracker.needs_detection()
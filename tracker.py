@@ -0,0 +1,248 @@
+import numpy as np
+
+from inference_edgetpu import DETECTION_DTYPE
+
+# Detections with a stable track_id, as returned by ObjectTracker
+TRACK_DTYPE = np.dtype(DETECTION_DTYPE.descr + [("track_id", np.int32)])
+
+
+def box_iou(boxes, others):
+    """
+    Pairwise IoU between two sets of [ymin, xmin, ymax, xmax] boxes.
+
+    Returns:
+        [len(boxes), len(others)] matrix.
+    """
+    top_left = np.maximum(boxes[:, None, :2], others[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], others[None, :, 2:])
+    overlap = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    other_areas = np.prod(others[:, 2:] - others[:, :2], axis=1)
+    return overlap / np.maximum(areas[:, None] + other_areas[None, :] - overlap, 1e-9)
+
+
+class KalmanBoxFilter:
+    """
+    Constant-velocity Kalman filter over a box's centre, width and height.
+
+    State is [cy, cx, h, w] and their per-frame velocities; measurements are
+    the detected [cy, cx, h, w]. A prediction can span several frames, e.g.
+    when camera frames were dropped while the detector was busy.
+    """
+
+    # Shared model matrices: 8-d state, 4-d measurement, one-frame time step
+    F = np.eye(8)
+    F[:4, 4:] = np.eye(4)
+    H = np.eye(4, 8)
+
+    def __init__(self, bbox, process_noise=1e-4, measurement_noise=1e-3):
+        self.x = np.zeros(8)
+        self.x[:4] = self.to_measurement(bbox)
+        self.P = np.diag([1e-2] * 4 + [1e-1] * 4)
+        self.Q = np.eye(8) * process_noise
+        self.R = np.eye(4) * measurement_noise
+
+    @staticmethod
+    def to_measurement(bbox):
+        ymin, xmin, ymax, xmax = bbox
+        return np.array([(ymin + ymax) / 2, (xmin + xmax) / 2, ymax - ymin, xmax - xmin])
+
+    def bbox(self):
+        cy, cx, h, w = self.x[:4]
+        return np.array([cy - h / 2, cx - w / 2, cy + h / 2, cx + w / 2], np.float32)
+
+    def predict(self, frames=1):
+        F = self.F
+        if frames != 1:
+            F = np.eye(8)
+            F[:4, 4:] = np.eye(4) * frames
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + self.Q * frames
+
+    def update(self, bbox):
+        residual = self.to_measurement(bbox) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ residual
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+
+class Track:
+    """One tracked object: its last box, motion estimate and bookkeeping."""
+
+    def __init__(self, track_id, detection, kalman):
+        self.track_id = track_id
+        self.class_id = int(detection["class_id"])
+        self.score = float(detection["score"])
+        self.bbox = np.array(detection["bbox"], np.float32)
+        self.velocity = np.zeros(4, np.float32)  # Per-frame bbox change, without Kalman
+        self.filter = KalmanBoxFilter(self.bbox) if kalman else None
+        self.frames_since_seen = 0
+        self.misses = 0  # Detector runs in a row that did not find this object
+        self.hits = 1
+
+    def predict(self, frames=1):
+        """Advance the box by a number of camera frames."""
+        if self.filter is not None:
+            self.filter.predict(frames)
+            self.bbox = self.filter.bbox()
+        else:
+            self.bbox = self.bbox + self.velocity * frames
+        self.frames_since_seen += frames
+
+    def update(self, detection, smoothing=0.5):
+        bbox = np.array(detection["bbox"], np.float32)
+        if self.filter is not None:
+            self.filter.update(bbox)
+            self.bbox = self.filter.bbox()
+        else:
+            # The box was already advanced by velocity for each frame since the last detection
+            frames = max(self.frames_since_seen, 1)
+            error = (bbox - self.bbox) / frames
+            self.velocity = self.velocity + smoothing * error
+            self.bbox = bbox
+        self.score = float(detection["score"])
+        self.frames_since_seen = 0
+        self.misses = 0
+        self.hits += 1
+
+
+class ObjectTracker:
+    """
+    Lightweight multi-object tracker that lets the detector skip frames.
+
+    Detections are matched to existing tracks by IoU (greedy, highest overlap
+    first, same class only), so every object keeps a stable track_id. Between
+    detector runs the tracks are moved forward by their estimated velocity,
+    or by a constant-velocity Kalman filter, and reported as the frame's
+    detections.
+
+    needs_detection() asks for a real detector run every detect_every frames,
+    and sooner when a track was missed on the last run, so new and vanishing
+    objects are picked up quickly.
+
+    Motion is measured in camera frames. When frames are dropped between calls
+    (the vision pipeline only hands the detector the latest frame), pass each
+    frame's frame_id so the tracks move by the real number of frames elapsed.
+    """
+
+    def __init__(self, detect_every=3, iou_threshold=0.3, max_misses=2, kalman=False):
+        """
+        Args:
+            detect_every (int): Run the detector at least once every this many frames (1 = every frame).
+            iou_threshold (float): Minimum IoU between a track's predicted box and a detection to match them.
+            max_misses (int): Detector runs a track may go unmatched before it is dropped.
+            kalman (bool): Predict with a constant-velocity Kalman filter instead of a smoothed velocity.
+        """
+        self.detect_every = detect_every
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.kalman = kalman
+        self.tracks = []
+        self.next_id = 1
+        self.frames_since_detection = 0
+        self.last_frame_id = None
+        self.stats = {"frames": 0, "detector_runs": 0, "predicted": 0, "tracks_created": 0, "tracks_dropped": 0}
+
+    def needs_detection(self):
+        """Return True if the next frame should go through the detector."""
+        if self.frames_since_detection + 1 >= self.detect_every:
+            return True
+        return any(track.misses for track in self.tracks)
+
+    def frames_elapsed(self, frame_id):
+        """Return the number of camera frames since the last call (1 if frame IDs are not known)."""
+        if frame_id is None:
+            return 1
+        frames = 1 if self.last_frame_id is None else max(frame_id - self.last_frame_id, 1)
+        self.last_frame_id = frame_id
+        return frames
+
+    def predict(self, frame_id=None):
+        """
+        Advance all tracks to a frame without running the detector.
+
+        Args:
+            frame_id (int): Camera frame number, or None to advance by one frame.
+
+        Returns:
+            TRACK_DTYPE array of the predicted boxes.
+        """
+        frames = self.frames_elapsed(frame_id)
+        for track in self.tracks:
+            track.predict(frames)
+        self.frames_since_detection += frames
+        self.stats["frames"] += 1
+        self.stats["predicted"] += 1
+        return self.current()
+
+    def update(self, detections, frame_id=None):
+        """
+        Match a detector run to the tracks.
+
+        Args:
+            detections: DETECTION_DTYPE array for the current frame.
+            frame_id (int): Camera frame number, or None if it directly follows the last call.
+
+        Returns:
+            TRACK_DTYPE array of the detections with their track IDs.
+        """
+        frames = self.frames_elapsed(frame_id)
+        for track in self.tracks:
+            track.predict(frames)
+        self.frames_since_detection = 0
+        self.stats["frames"] += 1
+        self.stats["detector_runs"] += 1
+
+        matched_tracks = set()
+        track_ids = np.zeros(len(detections), np.int32)
+        if self.tracks and len(detections):
+            predicted = np.array([track.bbox for track in self.tracks], np.float32)
+            iou = box_iou(predicted, detections["bbox"])
+            track_classes = np.array([track.class_id for track in self.tracks])
+            iou[track_classes[:, None] != detections["class_id"][None, :]] = 0.0
+            # Greedy assignment, best overlaps first
+            for flat in np.argsort(-iou, axis=None):
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or track_ids[d]:
+                    continue
+                self.tracks[t].update(detections[d])
+                matched_tracks.add(t)
+                track_ids[d] = self.tracks[t].track_id
+
+        survivors = []
+        for index, track in enumerate(self.tracks):
+            if index not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    self.stats["tracks_dropped"] += 1
+                    continue
+            survivors.append(track)
+        self.tracks = survivors
+
+        for d in np.flatnonzero(track_ids == 0):
+            track = Track(self.next_id, detections[d], self.kalman)
+            self.next_id += 1
+            self.tracks.append(track)
+            track_ids[d] = track.track_id
+            self.stats["tracks_created"] += 1
+
+        tracked = np.empty(len(detections), TRACK_DTYPE)
+        for name in DETECTION_DTYPE.names:
+            tracked[name] = detections[name]
+        tracked["track_id"] = track_ids
+        return tracked
+
+    def current(self):
+        """Return the tracks confirmed on the last detector run as a TRACK_DTYPE array."""
+        tracks = [track for track in self.tracks if not track.misses]
+        tracked = np.empty(len(tracks), TRACK_DTYPE)
+        for i, track in enumerate(tracks):
+            tracked[i] = (track.class_id, track.score, np.clip(track.bbox, 0.0, 1.0), track.track_id)
+        return tracked
+
+    def get_stats(self):
+        """Return frame, detector-run and prediction counts and the number of live tracks."""
+        return dict(self.stats, active_tracks=len(self.tracks))
@@ -1,38 +1,102 @@
 import cv2
 import socket
 import json
+import time
 import argparse
-from inference_edgetpu import (
-    load_labels,
-    initialize_interpreter,
-    run_inference_on_frame,
-)
-from pycoral.adapters.common import input_size
-from pycoral.adapters.detect import get_objects
-from pycoral.utils.dataset import read_label_file
-from pycoral.utils.edgetpu import make_interpreter, run_inference
+import numpy as np
+from inference_backends import BACKEND_AUTO, BACKENDS, InferenceBackend, create_backend
+from detection_codec import DEFAULT_MTU, DetectionEncoder
+from inference_edgetpu import detections_to_dicts, load_labels
 
 from flask_streamer import FlaskMJPEGStreamer
+from metrics import REGISTRY, MetricsServer, stage_histogram
+from snapshots import SnapshotWriter
+from tracker import ObjectTracker
+from vision_pipeline import VisionPipeline
 
 VIDEO_SOURCE = "http://192.168.0.169:8080/stream"
 
+WIRE_JSON = "json"
+WIRE_BINARY = "binary"
+
+# Use generated frames instead of a camera (for CI and load tests)
+SYNTHETIC_SOURCE = "synthetic"
+
+CAPTURE_SECONDS = stage_histogram("capture")
+FRAMES_PROCESSED = REGISTRY.counter("coralcom_vision_frames", "Frames run through the detector.")
+DETECTIONS_SENT = REGISTRY.counter("coralcom_vision_detections_sent", "Detections sent to the relay.")
+RESULT_BYTES_SENT = REGISTRY.counter("coralcom_vision_bytes_sent", "Bytes of detection results sent over UDP.")
+
+class SyntheticCamera:
+    """Stand-in for cv2.VideoCapture that generates frames at a fixed rate, for hosts without a camera."""
+
+    def __init__(self, width=640, height=480, fps=30):
+        self.frame = np.zeros((height, width, 3), np.uint8)
+        self.frame[:, :, 1] = np.linspace(0, 255, width, dtype=np.uint8)  # Gradient so encoders have work to do
+        self.interval = 1.0 / fps
+        self.next_frame = time.monotonic()
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        delay = self.next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame = max(self.next_frame, time.monotonic() - self.interval) + self.interval
+        return True, self.frame.copy()
+
+    def release(self):
+        pass
+
+
 class VisionSystem:
-    def __init__(self, model_path, label_path, udp_ip, udp_port, enable_stream=False, stream_host="192.168.0.169", stream_port=5000):
+    def __init__(self, model_path, label_path, udp_ip, udp_port, enable_stream=False, stream_host="192.168.0.169", stream_port=5000,
+                 metrics_port=None, stats_interval=None, snapshots=None, threshold=0.5, classes=None, nms_iou=None,
+                 backend=BACKEND_AUTO, cpu_threads=4, cpu_model_path=None, fake_options=None, video_source=VIDEO_SOURCE,
+                 tracking=None, wire_format=WIRE_JSON, mtu=DEFAULT_MTU, batch_frames=1):
         self.labels = load_labels(label_path)
-        self.interpreter = initialize_interpreter(model_path)
-        #self.inference_size = (300, 300) 
-        self.inference_size = (640, 480)
+        # classes may be label names or class IDs
+        class_ids = None
+        if classes is not None:
+            names = {name: class_id for class_id, name in self.labels.items()}
+            class_ids = [names[c] if c in names else int(c) for c in classes]
+        # Edge TPU, CPU tflite or fake detector; "auto" falls back to the CPU without a TPU
+        if isinstance(backend, InferenceBackend):
+            self.backend = backend
+        else:
+            self.backend = create_backend(backend, model_path, cpu_model_path, cpu_threads, threshold, class_ids,
+                                          nms_iou, fake_options)
+        print(f"Inference backend: {self.backend.name}")
+        self.inference_size = self.backend.input_size
+        # ObjectTracker options (e.g. {"detect_every": 5, "kalman": True}): between detector runs, boxes are
+        # predicted from the tracks so results go out at camera rate; None runs the detector on every frame
+        self.tracker = ObjectTracker(**tracking) if tracking is not None else None
 
         # UDP settings
         self.udp_ip = udp_ip
         self.udp_port = udp_port
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # "json" sends one JSON list per frame; "binary" packs detections with detection_codec, batching up to
+        # batch_frames frames per datagram of at most mtu bytes
+        self.wire_format = wire_format
+        self.encoder = DetectionEncoder(mtu, batch_frames) if wire_format == WIRE_BINARY else None
 
         # Camera setup
-        self.camera = cv2.VideoCapture("http://192.168.0.169:8080/stream")  # Adjust to your video source
+        if video_source == SYNTHETIC_SOURCE:
+            self.camera = SyntheticCamera()
+        else:
+            self.camera = cv2.VideoCapture(video_source)  # Adjust VIDEO_SOURCE to your camera
         if not self.camera.isOpened():
             raise Exception("Failed to open camera.")
 
+        # Prometheus metrics endpoint (capture/preprocess/inference/postprocess latency, frame counters)
+        self.metrics_server = MetricsServer(port=metrics_port) if metrics_port is not None else None
+        # Print per-stage FPS and latency this often (seconds), or never if None
+        self.stats_interval = stats_interval
+        # SnapshotWriter options (e.g. {"every_seconds": 5, "detections": True}), or None to save no frames
+        self.snapshot_options = snapshots
+
         # Streaming setup
         self.enable_stream = enable_stream
         self.stream_writer = None
@@ -48,26 +112,58 @@ class VisionSystem:
             if not self.stream_writer.isOpened():
                 raise Exception("Failed to initialize GStreamer stream.")
 
-    def run_inference(self):
-        ret, frame = self.camera.read()
+    def capture_frame(self):
+        """Read the next frame from the camera."""
+        with CAPTURE_SECONDS.time():
+            ret, frame = self.camera.read()
         if not ret:
             raise Exception("Failed to read frame from camera.")
+        return frame
 
-        # Resize frame to model input size
-        input_frame = cv2.resize(frame, self.inference_size)
-        input_frame = cv2.cvtColor(input_frame, cv2.COLOR_BGR2RGB)
+    def detect(self, frame, frame_id=None):
+        """
+        Run the detector on a camera frame, or predict it from the tracks (returns a DETECTION_DTYPE array).
+
+        frame_id lets the tracker account for camera frames dropped since the last call.
+        """
+        if self.tracker is not None and not self.tracker.needs_detection():
+            return self.tracker.predict(frame_id)
+        detections = self.backend.detect(frame)
+        FRAMES_PROCESSED.inc()
+        if self.tracker is not None:
+            detections = self.tracker.update(detections, frame_id)
+        return detections
 
-        # Run inference
-        detections = run_inference_on_frame(self.interpreter, input_frame, self.labels)
-        return frame, detections
+    def run_inference(self):
+        frame = self.capture_frame()
+        return frame, self.detect(frame)
 
-    def send_results(self, detections):
-        payload = json.dumps(detections)
-        self.sock.sendto(payload.encode(), (self.udp_ip, self.udp_port))
-        print(f"Sent: {payload}")
+    def send_results(self, detections, frame_id=0, captured_at=None):
+        """
+        Send one frame's detections to the relay over UDP.
+
+        Args:
+            detections: DETECTION_DTYPE array for the frame.
+            frame_id (int): Frame number (binary wire format only).
+            captured_at (float): Capture time in Unix seconds (binary wire format only; default now).
+        """
+        if self.encoder is not None:
+            timestamp = captured_at if captured_at is not None else time.time()
+            datagrams = self.encoder.encode_frame(frame_id, timestamp, detections)
+        else:
+            datagrams = [json.dumps(detections_to_dicts(detections, self.labels)).encode()]
+        for datagram in datagrams:
+            RESULT_BYTES_SENT.inc(self.sock.sendto(datagram, (self.udp_ip, self.udp_port)))
+        DETECTIONS_SENT.inc(len(detections))
+
+    def flush_results(self):
+        """Send any frames still batched in the binary encoder."""
+        if self.encoder is not None:
+            for datagram in self.encoder.flush():
+                RESULT_BYTES_SENT.inc(self.sock.sendto(datagram, (self.udp_ip, self.udp_port)))
 
     def annotate_frame(self, frame, detections):
-        for detection in detections:
+        for detection in detections_to_dicts(detections, self.labels):
             bbox = detection["bbox"]
             class_id = detection["class_id"]
             score = detection["score"]
@@ -80,10 +176,17 @@ class VisionSystem:
 
             cv2.rectangle(frame, start_point, end_point, color, thickness)
             label = f"{detection['label']}: {score:.2f}"
+            if "track_id" in detection:
+                label = f"#{detection['track_id']} {label}"
             cv2.putText(frame, label, (start_point[0], start_point[1] - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, thickness)
         return frame
 
+    def stream_frame(self, streamer, frame):
+        """Annotate a published frame once and hand it to every stream viewer."""
+        annotated = self.annotate_frame(frame.image.copy(), frame.detections)
+        streamer.publish(annotated, frame.detections, frame.frame_id)
+
     def start(self, enable_stream=False, stream_port=8081):
         """ 
         Run inference and optionally start an MJPEG stream.
@@ -93,30 +196,71 @@ class VisionSystem:
             stream_port (int): The port for the MJPEG stream (if enabled).
         """
         streamer = None
+        snapshots = None
         try:
+            if self.metrics_server is not None:
+                self.metrics_server.start()
             if enable_stream:
                 streamer = FlaskMJPEGStreamer(self, port=stream_port)
                 streamer.start_stream()
                 print(f"Flask MJPEG stream available at http://{streamer.host}:{stream_port}/stream")
 
-            while True:
-                frame, detections = self.run_inference()
-                self.send_results(detections)
-
-                # Save frame to disk for debugging
-                output_path = f"output_frame.jpg"
-                cv2.imwrite(output_path, frame)
+            # Capture, inference and publishing run on their own threads so the
+            # TPU is not idle while the camera, network or disk is busy
+            hooks = []
+            if self.snapshot_options is not None:
+                # Frames are encoded and written on the snapshot thread, never on the pipeline
+                snapshots = SnapshotWriter(annotate=self.annotate_frame, labels=self.labels, **self.snapshot_options)
+                hooks.append(snapshots.offer)
+            if streamer:
+                hooks.append(lambda frame: self.stream_frame(streamer, frame))
+            pipeline = VisionPipeline(self, on_publish=hooks)
+            pipeline.start()
+            try:
+                while not pipeline.stop_event.is_set():
+                    pipeline.wait(timeout=self.stats_interval)
+                    if self.stats_interval:
+                        print(f"Vision pipeline: {pipeline.get_stats()}")
+            finally:
+                pipeline.stop()
+                self.flush_results()
         except KeyboardInterrupt:
             print("Shutting down VisionSystem...")
         finally:
             self.camera.release()
             if streamer:    
                 streamer.stop()
+            if snapshots is not None:
+                snapshots.close()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+            self.backend.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run vision system with optional MJPEG streaming.")
     parser.add_argument("--stream", action="store_true", help="Enable MJPEG streaming of annotated frames.")
     parser.add_argument("--stream_port", type=int, default=8081, help="Port for MJPEG stream (default: 8081).")
+    parser.add_argument("--metrics_port", type=int, default=None, help="Serve Prometheus metrics on this port (default: off).")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND_AUTO, help="Inference backend; auto uses the Edge TPU and falls back to the CPU (default: auto).")
+    parser.add_argument("--cpu_threads", type=int, default=4, help="Threads for the CPU backend (default: 4).")
+    parser.add_argument("--cpu_model", default=None, help="CPU .tflite model (default: the Edge TPU model without _edgetpu).")
+    parser.add_argument("--fake_latency", type=float, default=0.02, help="Seconds per inference for the fake backend (default: 0.02).")
+    parser.add_argument("--video_source", default=VIDEO_SOURCE, help=f"Camera URL or device, or '{SYNTHETIC_SOURCE}' for generated frames.")
+    parser.add_argument("--detect_every", type=int, default=None, help="Track objects and run the detector only every N frames (default: every frame).")
+    parser.add_argument("--kalman", action="store_true", help="Predict tracked boxes with a Kalman filter (with --detect_every).")
+    parser.add_argument("--wire_format", choices=(WIRE_JSON, WIRE_BINARY), default=WIRE_JSON, help="Encoding of the UDP results (default: json).")
+    parser.add_argument("--mtu", type=int, default=DEFAULT_MTU, help=f"Maximum binary datagram size (default: {DEFAULT_MTU}).")
+    parser.add_argument("--batch_frames", type=int, default=1, help="Frames batched per binary datagram (default: 1).")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Minimum detection score (default: 0.5).")
+    parser.add_argument("--classes", nargs="+", default=None, help="Only report these labels or class IDs (default: all).")
+    parser.add_argument("--nms_iou", type=float, default=None, help="Suppress same-class boxes overlapping more than this IoU (default: off).")
+    parser.add_argument("--snapshot_dir", default=None, help="Save sampled debug frames to this directory (default: off).")
+    parser.add_argument("--snapshot_every", type=int, default=None, help="Save one frame in every N.")
+    parser.add_argument("--snapshot_seconds", type=float, default=None, help="Save one frame every N seconds (default: 10 if no other snapshot rule is given).")
+    parser.add_argument("--snapshot_detections", action="store_true", help="Save every frame with detections.")
+    parser.add_argument("--snapshot_events", nargs="*", default=None, help="Save frames around detections of these labels (no labels: any detection).")
+    parser.add_argument("--snapshot_max", type=int, default=200, help="Maximum snapshots kept in the directory (default: 200).")
+    parser.add_argument("--stats_interval", type=float, default=None, help="Print per-stage FPS and latency every N seconds (default: off).")
     args = parser.parse_args()
 
     MODEL_PATH = "Lan_test_3/tf2_ssd_mobilenet_v2_coco17_ptq_edgetpu.tflite"
@@ -125,5 +269,25 @@ if __name__ == "__main__":
     #UDP_PORT = 5005
     UDP_PORT = 60010
     
-    vision_system = VisionSystem(MODEL_PATH, LABEL_PATH, UDP_IP, UDP_PORT)
+    snapshots = None
+    if args.snapshot_dir:
+        snapshot_seconds = args.snapshot_seconds
+        if not (args.snapshot_every or snapshot_seconds is not None or args.snapshot_detections or
+                args.snapshot_events is not None):
+            snapshot_seconds = 10.0
+        snapshots = {
+            "output_dir": args.snapshot_dir,
+            "every_frames": args.snapshot_every,
+            "every_seconds": snapshot_seconds,
+            "detections": args.snapshot_detections,
+            "event_labels": args.snapshot_events,
+            "max_files": args.snapshot_max,
+        }
+    vision_system = VisionSystem(MODEL_PATH, LABEL_PATH, UDP_IP, UDP_PORT, metrics_port=args.metrics_port,
+                                 stats_interval=args.stats_interval, snapshots=snapshots,
+                                 threshold=args.threshold, classes=args.classes, nms_iou=args.nms_iou,
+                                 backend=args.backend, cpu_threads=args.cpu_threads, cpu_model_path=args.cpu_model,
+                                 fake_options={"latency": args.fake_latency}, video_source=args.video_source,
+                                 tracking={"detect_every": args.detect_every, "kalman": args.kalman} if args.detect_every else None,
+                                 wire_format=args.wire_format, mtu=args.mtu, batch_frames=args.batch_frames)
     vision_system.start(enable_stream=args.stream, stream_port=args.stream_port)
\ No newline at end of file
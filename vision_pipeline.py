@@ -0,0 +1,215 @@
+import collections
+import queue
+import threading
+import time
+
+from metrics import REGISTRY, Histogram
+
+
+class StageStats:
+    """Frame rate and latency of one pipeline stage."""
+
+    def __init__(self, name, window=30):
+        """
+        Args:
+            name (str): Stage name used in stats and metric labels.
+            window (int): Number of recent frames the FPS is averaged over.
+        """
+        self.name = name
+        self.latency = Histogram()
+        self.finished = collections.deque(maxlen=window)
+        self.frames = 0
+        self.dropped = 0
+        REGISTRY.gauge("coralcom_vision_stage_fps", "Frames per second completed by each vision pipeline stage.",
+                       fn=self.fps, stage=name)
+        REGISTRY.counter("coralcom_vision_stage_dropped", "Frames a vision pipeline stage discarded unprocessed.",
+                         fn=lambda: self.dropped, stage=name)
+
+    def record(self, started):
+        """Count a frame the stage finished; started is its time.perf_counter() start time."""
+        now = time.perf_counter()
+        self.latency.observe(now - started)
+        self.finished.append(now)
+        self.frames += 1
+
+    def fps(self):
+        if len(self.finished) < 2:
+            return 0.0
+        elapsed = self.finished[-1] - self.finished[0]
+        return (len(self.finished) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def get_stats(self):
+        p50 = self.latency.percentile(0.5)
+        p99 = self.latency.percentile(0.99)
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "fps": round(self.fps(), 2),
+            "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+        }
+
+
+class LatestFrameSlot:
+    """
+    Single-frame hand-off where the newest frame wins.
+
+    The producer never blocks: putting a frame replaces any frame the
+    consumer has not taken yet, so the consumer always works on the most
+    recent image instead of a growing backlog.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.closed = False
+        self.replaced = 0
+
+    def put(self, item):
+        """Store item, replacing the previous one. Returns True if an unconsumed item was replaced."""
+        with self.condition:
+            replaced = self.item is not None
+            if replaced:
+                self.replaced += 1
+            self.item = item
+            self.condition.notify()
+            return replaced
+
+    def get(self, timeout=None):
+        """Take the latest item, waiting up to timeout seconds. Returns None on timeout or once closed."""
+        with self.condition:
+            if self.item is None and not self.closed:
+                self.condition.wait(timeout)
+            item, self.item = self.item, None
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class Frame:
+    """A camera frame moving through the pipeline."""
+
+    __slots__ = ("frame_id", "captured_at", "image", "detections")
+
+    def __init__(self, frame_id, captured_at, image):
+        self.frame_id = frame_id
+        self.captured_at = captured_at
+        self.image = image
+        self.detections = None
+
+
+class VisionPipeline:
+    """
+    Runs the vision loop as three concurrent stages.
+
+    - capture: reads the camera as fast as it delivers frames into a
+      LatestFrameSlot, so a slow camera read never stalls the TPU and a
+      fast camera never builds up a backlog;
+    - detect: preprocesses and runs inference on the latest frame, back to
+      back;
+    - publish: sends the results and runs any publish hooks (snapshots,
+      streaming) without holding up the next inference.
+
+    Detect hands frames to publish through a bounded queue. If publishing
+    falls behind, the oldest waiting result is dropped so the detector is
+    never blocked by the network or the disk.
+    """
+
+    def __init__(self, vision_system, publish_queue_size=4, on_publish=None):
+        """
+        Args:
+            vision_system: VisionSystem providing capture_frame, detect and send_results.
+            publish_queue_size (int): Results waiting to be published before the oldest is dropped.
+            on_publish: Optional callables run for every published Frame after its results are sent.
+        """
+        self.vision_system = vision_system
+        self.slot = LatestFrameSlot()
+        self.results = queue.Queue(maxsize=publish_queue_size)
+        self.on_publish = list(on_publish or [])
+        self.stop_event = threading.Event()
+        self.error = None
+        self.stages = {name: StageStats(name) for name in ("capture", "detect", "publish")}
+        self.threads = [
+            threading.Thread(target=self.run_stage, args=(self.capture_once,), name="vision-capture", daemon=True),
+            threading.Thread(target=self.run_stage, args=(self.detect_once,), name="vision-detect", daemon=True),
+            threading.Thread(target=self.run_stage, args=(self.publish_once,), name="vision-publish", daemon=True),
+        ]
+        self.next_frame_id = 0
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.slot.close()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=5)
+
+    def wait(self, timeout=None):
+        """
+        Block until the pipeline stops, either through stop() or because a stage failed.
+
+        Raises:
+            Exception: The error that stopped a stage, if any.
+        """
+        self.stop_event.wait(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def run_stage(self, step):
+        try:
+            while not self.stop_event.is_set():
+                step()
+        except Exception as e:
+            print(f"Vision pipeline stage {threading.current_thread().name} failed: {e}")
+            self.error = e
+            self.stop_event.set()
+            self.slot.close()
+
+    def capture_once(self):
+        started = time.perf_counter()
+        image = self.vision_system.capture_frame()
+        frame = Frame(self.next_frame_id, time.time(), image)
+        self.next_frame_id += 1
+        stats = self.stages["capture"]
+        stats.record(started)
+        if self.slot.put(frame):
+            stats.dropped += 1  # Detector was still busy with an older frame
+
+    def detect_once(self):
+        frame = self.slot.get(timeout=0.5)
+        if frame is None:
+            return
+        started = time.perf_counter()
+        frame.detections = self.vision_system.detect(frame.image, frame.frame_id)
+        self.stages["detect"].record(started)
+        while True:
+            try:
+                self.results.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                    self.stages["publish"].dropped += 1
+                except queue.Empty:
+                    pass
+
+    def publish_once(self):
+        try:
+            frame = self.results.get(timeout=0.5)
+        except queue.Empty:
+            return
+        started = time.perf_counter()
+        self.vision_system.send_results(frame.detections, frame.frame_id, frame.captured_at)
+        for hook in self.on_publish:
+            hook(frame)
+        self.stages["publish"].record(started)
+
+    def get_stats(self):
+        """Return frames, drops, FPS and p50/p99 latency (ms) for each stage."""
+        return {name: stats.get_stats() for name, stats in self.stages.items()}